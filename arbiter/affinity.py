@@ -0,0 +1,339 @@
+"""
+Pinning process workers to CPUs, and NUMA-aware process pools.
+"""
+from collections import Counter
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import re
+from threading import Lock
+
+from arbiter.compat import require_pool_initializers
+
+
+__all__ = ('Affinity', 'NodeExecutor', 'numa_nodes', 'worker_cpus')
+
+
+STRATEGIES = ('compact', 'spread', 'numa')
+
+_WORKER_CPUS = []  # the CPUs the current worker was pinned to
+
+
+def worker_cpus():
+    """
+    Get the set of CPUs the current worker was pinned to (empty if it
+    wasn't pinned).
+    """
+    return frozenset(_WORKER_CPUS)
+
+
+def _parse_cpulist(text):
+    """
+    Parse a Linux CPU list (e.g., '0-3,8,10-11') into a list of CPUs.
+    """
+    cpus = []
+
+    for part in text.strip().split(','):
+        if not part:
+            continue
+
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+
+    return cpus
+
+
+def _available_cpus():
+    """
+    The CPUs this process may run on.
+    """
+    get_affinity = getattr(os, 'sched_getaffinity', None)
+
+    if get_affinity is not None:
+        return frozenset(get_affinity(0))
+
+    return frozenset(range(multiprocessing.cpu_count()))
+
+
+def numa_nodes(root='/sys/devices/system/node'):
+    """
+    Get the NUMA nodes this process can use, as a dict of node numbers
+    to sorted lists of CPUs. Read from /sys, so on other platforms (or
+    without NUMA) all available CPUs are treated as a single node 0.
+
+    root: (optional, '/sys/devices/system/node') Where to find nodes.
+    """
+    available = _available_cpus()
+    nodes = {}
+
+    for path in glob.glob(os.path.join(root, 'node[0-9]*', 'cpulist')):
+        node = int(re.search(r'node(\d+)', path).group(1))
+
+        try:
+            with open(path) as handle:
+                cpus = _parse_cpulist(handle.read())
+        except (IOError, OSError, ValueError):
+            continue
+
+        cpus = sorted(available.intersection(cpus))
+
+        if cpus:
+            nodes[node] = cpus
+
+    if not nodes:
+        nodes[0] = sorted(available)
+
+    return nodes
+
+
+def _pin(counter, plan, initializer, initargs):
+    """
+    Pin a freshly started worker to the next CPU set in a plan, then
+    run the pool's own initializer.
+    """
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+
+    cpus = plan[slot % len(plan)]
+    set_affinity = getattr(os, 'sched_setaffinity', None)
+
+    if set_affinity is not None:
+        set_affinity(0, cpus)
+
+    _WORKER_CPUS[:] = sorted(cpus)
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+class Affinity(object):
+    """
+    A strategy for pinning process workers to CPUs:
+
+        compact: Each worker gets its own CPU, filling up one NUMA node
+            before moving on to the next (keeps workers close together,
+            sharing caches).
+        spread: Each worker gets its own CPU, taking turns between NUMA
+            nodes (spreads workers out, for memory bandwidth).
+        numa: Each worker is pinned to all of the CPUs of one NUMA node,
+            taking turns between nodes (workers stay near their memory
+            but the OS balances them within the node).
+
+    Workers beyond the number of CPUs (or nodes) wrap around.
+
+    NOTE: Pinning uses os.sched_setaffinity, so only happens on Linux.
+    """
+
+    def __init__(self, strategy='compact', nodes=None):
+        """
+        strategy: (optional, 'compact') One of 'compact', 'spread' or
+            'numa'.
+        nodes: (optional, None) A dict of NUMA node numbers to lists of
+            CPUs. Defaults to the nodes read from /sys (see numa_nodes).
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(strategy)
+
+        if nodes is None:
+            nodes = numa_nodes()
+
+        if not nodes or not all(nodes.values()):
+            raise ValueError(nodes)
+
+        self.strategy = strategy
+        self.nodes = dict(
+            (node, sorted(cpus)) for node, cpus in nodes.items()
+        )
+
+    def plan(self, workers):
+        """
+        Get the set of CPUs to pin each of a number of workers to.
+        """
+        order = sorted(self.nodes)
+
+        if self.strategy == 'numa':
+            cpus = [frozenset(self.nodes[node]) for node in order]
+        elif self.strategy == 'compact':
+            cpus = [
+                frozenset((cpu,))
+                for node in order for cpu in self.nodes[node]
+            ]
+        else:  # spread: the first CPU of each node, then the second...
+            cpus = []
+            depth = max(len(self.nodes[node]) for node in order)
+
+            for index in range(depth):
+                for node in order:
+                    if index < len(self.nodes[node]):
+                        cpus.append(frozenset((self.nodes[node][index],)))
+
+        return [cpus[index % len(cpus)] for index in range(workers)]
+
+    def pool_kwargs(self, workers, mp_context=None, initializer=None,
+                    initargs=()):
+        """
+        Get the initializer and initargs for a new process pool of a
+        number of workers, so that each worker pins itself as it starts
+        (and then runs initializer). Each pool needs its own.
+
+        Raises a RuntimeError before Python 3.7, whose pools can't run
+        initializers.
+        """
+        require_pool_initializers("Pinning workers to CPUs")
+
+        counter = (mp_context or multiprocessing).Value('i', 0)
+
+        return {
+            'initializer': _pin,
+            'initargs': (
+                counter, self.plan(workers), initializer, tuple(initargs)
+            ),
+        }
+
+
+class NodeExecutor(object):
+    """
+    A process pool per NUMA node, with each pool's workers pinned to
+    its node's CPUs. Tasks can be sent to a particular node (e.g., the
+    one where the results they depend on were produced, so they are
+    still in that node's memory and caches); otherwise they go to the
+    least busy node.
+    """
+
+    def __init__(self, max_workers=None, nodes=None, mp_context=None,
+                 initializer=None, initargs=(), executor=None, **kwargs):
+        """
+        max_workers: (optional, None) The total number of workers, split
+            between the nodes in proportion to their CPUs (at least one
+            each). Defaults to the number of available CPUs.
+        nodes: (optional, None) A dict of NUMA node numbers to lists of
+            CPUs. Defaults to the nodes read from /sys.
+        mp_context: (optional, None) The multiprocessing context to
+            start workers with.
+        initializer: (optional, None) A function to call in each worker
+            when it starts.
+        initargs: (optional, ()) Arguments to pass to initializer.
+        executor: (optional, None) The class of each node's pool.
+            Defaults to ProcessPoolExecutor. Other keyword arguments are
+            passed to it.
+        """
+        if nodes is None:
+            nodes = numa_nodes()
+
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor
+
+        total = sum(len(cpus) for cpus in nodes.values())
+
+        if max_workers is None:
+            max_workers = total
+
+        self._pools = {}
+        self._load = {}
+        self._lock = Lock()
+
+        for node in sorted(nodes):
+            workers = max(1, max_workers * len(nodes[node]) // total)
+            affinity = Affinity('numa', {node: nodes[node]})
+            options = dict(kwargs)
+            options.update(
+                affinity.pool_kwargs(
+                    workers, mp_context, initializer, initargs
+                )
+            )
+
+            if mp_context is not None:
+                options['mp_context'] = mp_context
+
+            self._pools[node] = executor(workers, **options)
+            self._load[node] = 0
+
+    @property
+    def nodes(self):
+        """
+        The node numbers.
+        """
+        return frozenset(self._pools)
+
+    def least_loaded(self, nodes=None):
+        """
+        Get the node (out of the given nodes, or all of them) with the
+        fewest tasks outstanding.
+        """
+        with self._lock:
+            return min(
+                sorted(self._pools if nodes is None else nodes),
+                key=lambda node: self._load[node],
+            )
+
+    def place(self, nodes):
+        """
+        Choose a node for a task given the nodes its dependencies ran
+        on: the most common one, or the least loaded if there are none.
+        """
+        counts = Counter(node for node in nodes if node in self._pools)
+
+        if not counts:
+            return self.least_loaded()
+
+        best = max(counts.values())
+
+        return self.least_loaded(
+            [node for node in counts if counts[node] == best]
+        )
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Submit a function to the least loaded node.
+        """
+        return self.submit_to(self.least_loaded(), function, *args, **kwargs)
+
+    def submit_to(self, node, function, *args, **kwargs):
+        """
+        Submit a function to a particular node's pool. The returned
+        future is tagged with the node.
+        """
+        with self._lock:
+            self._load[node] += 1
+
+        try:
+            future = self._pools[node].submit(function, *args, **kwargs)
+        except BaseException:
+            self._done(node)
+            raise
+
+        future.node = node
+        future.add_done_callback(lambda _: self._done(node))
+
+        return future
+
+    def _done(self, node):
+        """
+        Record that a node has finished a task.
+        """
+        with self._lock:
+            self._load[node] -= 1
+
+    def shutdown(self, wait=True):
+        """
+        Shut down every node's pool.
+        """
+        for pool in self._pools.values():
+            pool.shutdown(wait)
+
+    def __enter__(self):
+        """
+        Enter a context manager. The executor is shut down on exit.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exit the context manager, shutting down the executor.
+        """
+        self.shutdown(True)
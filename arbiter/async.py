@@ -1,15 +1,36 @@
 """
 Asynchronous task runner using concurrent futures
 """
+try:
+    from collections.abc import Hashable
+except ImportError:  # Python 2
+    from collections import Hashable
 import concurrent.futures
+from multiprocessing import cpu_count
 
-from arbiter.base import task_loop, TaskResult
+from arbiter.affinity import Affinity
+from arbiter.base import task_loop, wait_for
+from arbiter.broadcast import broadcast_shared
+from arbiter.resilient import ResilientExecutor
+from arbiter.serialize import dump_task
+from arbiter.shared import fork_context, register, unregister
+from arbiter.store import FileStore
+from arbiter.task import origin, TaskStore
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:  # Python < 3.14
+    InterpreterPoolExecutor = None
 
 
 __all__ = ('run_tasks',)
 
 
-def run_tasks(tasks, max_workers=None, use_processes=False):
+def run_tasks(tasks, max_workers=None, use_processes=False, profiler=None,
+              hooks=None, store=None, lazy=False, serializer=None,
+              resume=False, targets=None, auto_broadcast=None,
+              shared=None, resilient=False, max_tasks_per_worker=None,
+              max_worker_memory=None, affinity=None, use_interpreters=False):
     """
     Run an iterable of tasks.
 
@@ -21,21 +42,134 @@ def run_tasks(tasks, max_workers=None, use_processes=False):
         older version, consider this a non-optional value.
     use_processes: (optional, False) use a process pool instead of a
         thread pool.
+    profiler: (optional, None) A Profiler to record task timings with.
+    hooks: (optional, None) An iterable of task loop hooks (see
+        arbiter.base.task_loop).
+    store: (optional, None) The store to keep results in.
+    lazy: (optional, False) Pass results between tasks by reference
+        through the store (see arbiter.base.task_loop), so process
+        workers load their arguments themselves instead of having them
+        pickled by the scheduling thread. If no store is given, a
+        temporary FileStore is used.
+    serializer: (optional, None) The Serializer (see arbiter.serialize)
+        to send tasks to, and results back from, process workers with.
+        Tasks can override it with their own. Ignored for threads.
+    resume: (optional, False) Skip tasks whose results are already in
+        the store (see arbiter.base.task_loop).
+    targets: (optional, None) The names of the tasks to run. Only they
+        and the tasks they depend on are run.
+    auto_broadcast: (optional, None) A size in bytes. If given (and
+        using processes), arguments at least this big (when pickled)
+        which are shared by several tasks are sent to each worker once
+        instead of with every task (see
+        arbiter.broadcast.broadcast_shared).
+    shared: (optional, None) A dict of large read-only objects to share
+        with workers without serializing them, accessible from tasks
+        through arbiter.shared.shared. With processes, workers are
+        forked (with the fork start method, so not on Windows) after
+        the objects are registered, and inherit them copy-on-write.
+    resilient: (optional, False) Recover from process workers crashing
+        (see arbiter.resilient.ResilientExecutor): only the task which
+        crashed its worker fails, and the rest of the run carries on.
+    max_tasks_per_worker: (optional, None) Recycle process workers once
+        one has run this many tasks. Implies resilient.
+    max_worker_memory: (optional, None) Recycle process workers once
+        one's resident set size (read from /proc, so only on Linux)
+        reaches this many bytes. Implies resilient.
+    affinity: (optional, None) Pin process workers to CPUs, with an
+        arbiter.affinity.Affinity or the name of a strategy ('compact',
+        'spread' or 'numa'). Requires Python 3.7 or later.
+    use_interpreters: (optional, False) Use a pool of subinterpreters
+        (concurrent.futures.InterpreterPoolExecutor), each with its own
+        GIL, instead of threads or processes. CPU-bound tasks run in
+        parallel without the startup time and memory of processes.
+        Tasks are pickled as for processes (so serializer and
+        auto_broadcast apply, but shared, resilient, recycling and
+        affinity don't), and their functions' modules must be
+        importable in a subinterpreter. Before Python 3.14, processes
+        are used instead.
     """
+    if store is None:
+        if lazy:
+            with FileStore() as store:
+                return run_tasks(
+                    tasks, max_workers, use_processes, profiler, hooks,
+                    store, lazy, serializer, resume, targets,
+                    auto_broadcast, shared, resilient, max_tasks_per_worker,
+                    max_worker_memory, affinity, use_interpreters,
+                )
+
+        store = TaskStore()
+
+    tasks = tuple(tasks)
+    hooks = tuple(hooks or ())
     futures = set()
+    serializers = {}
+    broadcasts = ()
+
+    if use_interpreters and InterpreterPoolExecutor is None:
+        # the next best thing for CPU-bound tasks
+        use_interpreters, use_processes = False, True
+
+    if (use_processes or use_interpreters) and auto_broadcast is not None:
+        tasks, broadcasts = broadcast_shared(tasks, auto_broadcast)
+
+    kwargs = {}
+
+    if use_interpreters:
+        get_executor = InterpreterPoolExecutor
+
+        for task in tasks:
+            if isinstance(task.name, Hashable):
+                serializers[task.name] = task.serializer or serializer
+    elif use_processes:
+        if max_tasks_per_worker is not None:
+            kwargs['max_tasks'] = max_tasks_per_worker
+
+        if max_worker_memory is not None:
+            kwargs['max_memory'] = max_worker_memory
 
-    if use_processes:
-        get_executor = concurrent.futures.ProcessPoolExecutor
+        if resilient or kwargs:
+            get_executor = ResilientExecutor
+        else:
+            get_executor = concurrent.futures.ProcessPoolExecutor
+
+        context = fork_context() if shared else None
+
+        if context is not None:
+            kwargs['mp_context'] = context
+
+        if affinity is not None:
+            if isinstance(affinity, str):
+                affinity = Affinity(affinity)
+
+            kwargs.update(
+                affinity.pool_kwargs(max_workers or cpu_count(), context)
+            )
+
+        for task in tasks:
+            if isinstance(task.name, Hashable):
+                serializers[task.name] = task.serializer or serializer
     else:
         get_executor = concurrent.futures.ThreadPoolExecutor
 
-    with get_executor(max_workers) as executor:
+    if shared:
+        # registered before any workers are forked
+        register(shared)
+
+    with get_executor(max_workers, **kwargs) as executor:
         def execute(function, name):
             """
             Submit a task to the pool
             """
+            task_serializer = serializers.get(origin(name))
+
+            if task_serializer is not None:
+                function = dump_task(task_serializer, function, name, hooks)
+
             future = executor.submit(function)
             future.name = name
+            future.serialized = task_serializer is not None
 
             futures.add(future)
 
@@ -43,28 +177,16 @@ def run_tasks(tasks, max_workers=None, use_processes=False):
             """
             Wait for at least one task to complete
             """
-            results = []
+            return wait_for(futures, hooks)
 
-            waited = concurrent.futures.wait(
-                futures, return_when=concurrent.futures.FIRST_COMPLETED
+        try:
+            return task_loop(
+                tasks, execute, wait, store=store, profiler=profiler,
+                hooks=hooks, lazy=lazy, resume=resume, targets=targets,
             )
+        finally:
+            for broadcast in broadcasts:
+                broadcast.close()
 
-            for future in waited.done:
-                exc = future.exception()
-                if exc is None:
-                    results.append(
-                        TaskResult(
-                            future.name,
-                            True,
-                            None,
-                            future.result()
-                        )
-                    )
-                else:
-                    results.append(TaskResult(future.name, False, exc, None))
-
-                futures.remove(future)
-
-            return results
-
-        return task_loop(tasks, execute, wait)
+            if shared:
+                unregister(shared)
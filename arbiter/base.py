@@ -2,9 +2,24 @@
 The base task runner.
 """
 from collections import namedtuple
+try:
+    from collections.abc import Hashable
+except ImportError:  # Python 2
+    from collections import Hashable
+import concurrent.futures
 from functools import partial
+from time import time
+
+from arbiter.broadcast import Broadcast
+from arbiter.profiler import Timed, timed_call
 from arbiter.scheduler import Scheduler
-from arbiter.task import Task, TaskStore
+from arbiter.serialize import load_result
+from arbiter.store import (
+    References, resolve_call, store_batch_call, store_call,
+)
+from arbiter.task import (
+    Batch, batch_results, batch_size, Element, Task, TaskArray, TaskStore,
+)
 
 
 Results = namedtuple('Results', ('completed', 'failed', 'exceptions'))
@@ -14,7 +29,183 @@ TaskResult = namedtuple(
 )
 
 
-def task_loop(tasks, execute, wait=None, store=TaskStore()):
+def wait_for(futures, hooks=()):
+    """
+    Wait for at least one future to complete. Completed futures are
+    removed from the set, and their outcomes returned as TaskResults.
+
+    futures: A set of futures, each tagged with the name of the task it
+        is running. Futures also tagged as serialized (running a task
+        from arbiter.serialize.dump_task) have their results rebuilt.
+    hooks: (optional, ()) Task loop hooks to report deserialization to.
+    """
+    results = []
+
+    waited = concurrent.futures.wait(
+        futures, return_when=concurrent.futures.FIRST_COMPLETED
+    )
+
+    for future in waited.done:
+        exc = future.exception()
+
+        if exc is None:
+            data = future.result()
+
+            if getattr(future, 'serialized', False):
+                try:
+                    data = load_result(data, future.name, hooks)
+                except Exception as error:
+                    exc = error
+
+        if exc is None:
+            results.append(TaskResult(future.name, True, None, data))
+        else:
+            results.append(TaskResult(future.name, False, exc, None))
+
+        futures.remove(future)
+
+    return results
+
+
+def fetch(store, task, lazy=False):
+    """
+    Fetch the result of a task (or, for a task array, the list of its
+    elements' results) from a store.
+
+    lazy: (optional, False) Fetch References instead of results.
+    """
+    fetch_one = store.reference if lazy else store.get
+
+    if isinstance(task, Task):
+        return fetch_one(task.name)
+
+    # task arrays pass a list of their elements' results
+    values = [
+        fetch_one(Element(task.name, index))
+        for index in range(len(task.items))
+    ]
+
+    return References(values) if lazy else values
+
+
+def collect(store, task, lazy=False):
+    """
+    Collect the arguments to call a task's function with, replacing any
+    tasks it depends on with their results. Returns the args, the
+    kwargs, and whether any of them are Broadcasts (which need resolving
+    where the task runs).
+
+    lazy: (optional, False) Collect References instead of results.
+    """
+    args = []
+    kwargs = {}
+    broadcast = False  # whether any arguments need resolving
+
+    for arg in task.args:
+        if isinstance(arg, (Task, TaskArray)):
+            args.append(fetch(store, arg, lazy))
+        else:
+            broadcast = broadcast or isinstance(arg, Broadcast)
+            args.append(arg)
+
+    for key in task.kwargs:
+        value = task.kwargs[key]
+
+        if isinstance(value, (Task, TaskArray)):
+            kwargs[key] = fetch(store, value, lazy)
+        else:
+            broadcast = broadcast or isinstance(value, Broadcast)
+            kwargs[key] = value
+
+    return args, kwargs, broadcast
+
+
+def resume_tasks(tasks, store, completed):
+    """
+    Pick out the tasks whose results are already in a store, adding
+    their names to a set of completed tasks. Returns a list of the
+    remaining tasks. A task array counts as completed once every one
+    of its elements' results is in the store.
+    """
+    remaining = []
+
+    for task in tasks:
+        if not isinstance(task.name, Hashable):
+            remaining.append(task)
+        elif isinstance(task, TaskArray):
+            if all(
+                Element(task.name, index) in store
+                for index in range(len(task.items))
+            ):
+                completed.add(task.name)
+            else:
+                remaining.append(task)
+        elif task.name in store:
+            completed.add(task.name)
+        else:
+            remaining.append(task)
+
+    return remaining
+
+
+def finish_task(scheduler, store, result, profiler=None, hooks=(),
+                keep=True):
+    """
+    Store a task's result (if it succeeded) and end it.
+
+    scheduler: The scheduler the task was started by.
+    store: The store to put the result into.
+    result: The task's TaskResult. Its data may be Timed.
+    profiler: (optional, None) A Profiler to record the task with.
+    hooks: (optional, ()) Task loop hooks to report the task, store,
+        end_task and finished events to (see task_loop).
+    keep: (optional, True) Whether to store a successful result (lazy
+        results have already been stored by the worker).
+    """
+    keep = keep and result.successful
+
+    if profiler is None and not hooks:
+        if keep:
+            store.put(result.name, result.data)
+
+        scheduler.end_task(result.name, result.successful)
+        return
+
+    def emit(event, value):
+        for hook in hooks:
+            hook(event, result.name, value)
+
+    timed = None
+
+    if isinstance(result.data, Timed):
+        timed = result.data
+        result = result._replace(data=timed.data)
+        emit('task', timed.finished - timed.started)
+
+    if profiler is not None:
+        profiler.finish(result, timed)
+
+    started = time()
+
+    if keep:
+        store.put(result.name, result.data)
+
+    stored = time() - started
+
+    if profiler is not None:
+        profiler.stored(result.name, stored)
+
+    emit('store', stored)
+
+    started = time()
+    scheduler.end_task(result.name, result.successful)
+    emit('end_task', time() - started)
+    emit('finished', result.successful)
+
+
+def task_loop(tasks, execute, wait=None, store=TaskStore(), profiler=None,
+              hooks=None, frozen=False, lazy=False, resume=False,
+              targets=None):
     """
     The inner task loop for a task runner.
 
@@ -24,57 +215,249 @@ def task_loop(tasks, execute, wait=None, store=TaskStore()):
         runnable tasks (but there are still tasks listed as running).
         If given, this function should take no arguments, and should
         return an iterable of TaskResults.
+    store: (optional, TaskStore()) Where task results are kept.
+    profiler: (optional, None) A Profiler to record task timings with.
+    hooks: (optional, None) An iterable of functions to call as the
+        loop runs. Each hook is called with an event, the name of the
+        task involved (or None) and a value:
+
+            start_task: seconds spent in Scheduler.start_task.
+            end_task: seconds spent in Scheduler.end_task.
+            graph_remove: seconds spent in Graph.remove.
+            collect: seconds spent collecting a task's arguments.
+            store: seconds spent storing a task's result.
+            task: seconds a (successful) task spent running.
+            finished: whether a task succeeded.
+            serialize: seconds spent serializing a task for a worker.
+            task_bytes: the size of a serialized task.
+            deserialize: seconds spent rebuilding a task's result.
+            result_bytes: the size of a task's serialized result.
+            wait: seconds spent waiting for tasks to finish.
+            runnable: the number of tasks waiting to be started.
+            running: the number of tasks currently running.
+    frozen: (optional, False) Freeze the dependency graph once all tasks
+        have been added, tracking remaining dependencies with counters
+        (see Scheduler).
+    lazy: (optional, False) Send tasks References to the results they
+        depend on instead of the results themselves. References are
+        resolved where the task runs, and each task's result is put
+        into the store there too, so results never pass through the
+        scheduling thread. The store must support reference and be
+        usable from the workers (e.g., arbiter.store.FileStore).
+    resume: (optional, False) Treat tasks whose results are already in
+        the store (e.g., from an earlier, interrupted run with an
+        arbiter.store.SQLiteStore) as completed instead of running
+        them again.
+    targets: (optional, None) If given, an iterable of task names to
+        run. Only those tasks (and the tasks they depend on) are run;
+        the rest are ignored (see Scheduler.restrict).
+
+    Only successful tasks have their results stored. Stores which
+    buffer writes (i.e., have a flush method) are flushed when the
+    loop ends.
+
+    Runnable tasks with the same batchable function (see
+    arbiter.task.batchable) are coalesced into batches, which are
+    executed under a Batch name as soon as they are full or no more
+    tasks are runnable. If a batch fails, all of its tasks fail.
     """
     completed = set()
     failed = set()
     exceptions = []
 
-    def collect(task):
-        args = []
-        kwargs = {}
+    hooks = tuple(hooks or ())
+    instrumented = profiler is not None or bool(hooks)
 
-        for arg in task.args:
-            if isinstance(arg, Task):
-                args.append(store.get(arg.name))
-            else:
-                args.append(arg)
+    def emit(event, name, value):
+        for hook in hooks:
+            hook(event, name, value)
+
+    def start(scheduler):
+        if not hooks:
+            return scheduler.start_task()
+
+        started = time()
+        task = scheduler.start_task()
+        emit(
+            'start_task',
+            None if task is None else task.name,
+            time() - started,
+        )
+
+        return task
+
+    def split(result):
+        names = result.name.names
+
+        if result.successful:
+            timed = None
+            values = result.data
+
+            if isinstance(values, Timed):
+                timed = values
+                values = timed.data
 
-        for key in task.kwargs:
-            if isinstance(task.kwargs[key], Task):
-                kwargs[key] = store.get(task.kwargs[key].name)
+            try:
+                values = batch_results(values, len(names))
+            except (TypeError, ValueError) as exc:
+                result = result._replace(successful=False, exception=exc)
             else:
-                kwargs[key] = task.kwargs[key]
+                if timed is not None:
+                    values = [timed._replace(data=value) for value in values]
 
-        return args, kwargs
+                return [
+                    TaskResult(name, True, None, value)
+                    for name, value in zip(names, values)
+                ]
+
+        # only report the exception once
+        return [TaskResult(names[0], False, result.exception, None)] + [
+            TaskResult(name, False, None, None) for name in names[1:]
+        ]
 
     def complete(scheduler, result):
-        store.put(result.name, result.data)
-        scheduler.end_task(result.name, result.successful)
+        if isinstance(result.name, Batch):
+            for member in split(result):
+                complete(scheduler, member)
+
+            return
+
+        # lazy results were stored by the worker
+        finish_task(scheduler, store, result, profiler, hooks, not lazy)
+
         if result.exception:
             exceptions.append(result.exception)
 
-    with Scheduler(tasks, completed=completed, failed=failed) as scheduler:
+    def submit(scheduler, task):
+        # Collect any dependent results
+        if instrumented:
+            started = time()
+
+        args, kwargs, broadcast = collect(store, task, lazy)
+
+        if lazy or broadcast:
+            func = partial(resolve_call, task.function, args, kwargs)
+        else:
+            func = partial(task.function, *args, **kwargs)
+
+        if task.handler:
+            func = partial(task.handler, func)
+
+        if lazy:
+            func = partial(store_call, store, task.name, func)
+
+        if instrumented:
+            collected = time() - started
+
+            if profiler is not None:
+                profiler.queue(task, collected)
+
+            emit('collect', task.name, collected)
+            func = partial(timed_call, func)
+
+        result = execute(func, task.name)
+
+        # result exists iff execute is synchroous
+        if result:
+            complete(scheduler, result)
+
+    def submit_batch(scheduler, tasks):
+        first = tasks[0]
+        name = Batch(tuple(task.name for task in tasks))
+
+        if instrumented:
+            started = time()
+
+        inputs = [collect(store, task, lazy)[0][0] for task in tasks]
+
+        if lazy or any(isinstance(value, Broadcast) for value in inputs):
+            func = partial(
+                resolve_call, first.function, [References(inputs)], {}
+            )
+        else:
+            func = partial(first.function, inputs)
+
+        if first.handler:
+            func = partial(first.handler, func)
+
+        if lazy:
+            func = partial(store_batch_call, store, name.names, func)
+
+        if instrumented:
+            collected = (time() - started) / len(tasks)
+
+            for task in tasks:
+                if profiler is not None:
+                    profiler.queue(task, collected)
+
+                emit('collect', task.name, collected)
+
+            func = partial(timed_call, func)
+
+        result = execute(func, name)
+
+        if result:
+            complete(scheduler, result)
+
+    batches = {}  # (function, handler, backend, serializer) -> tasks
+
+    if resume:
+        tasks = resume_tasks(tasks, store, completed)
+
+    scheduler = Scheduler(
+        tasks, completed=completed, failed=failed, hooks=hooks,
+        frozen=frozen,
+    )
+
+    if targets is not None:
+        scheduler.restrict(targets)
+
+    with scheduler:
         while not scheduler.is_finished():
-            task = scheduler.start_task()
+            if hooks:
+                emit('runnable', None, len(scheduler.runnable))
+
+            task = start(scheduler)
 
             while task is not None:
-                # Collect any dependent results
-                args, kwargs = collect(task)
-                func = partial(task.function, *args, **kwargs)
-                if task.handler:
-                    func = partial(task.handler, func)
+                size = batch_size(task)
 
-                result = execute(func, task.name)
+                if size:
+                    key = (
+                        task.function, task.handler, task.backend,
+                        task.serializer,
+                    )
+                    batch = batches.setdefault(key, [])
+                    batch.append(task)
 
-                # result exists iff execute is synchroous
-                if result:
-                    complete(scheduler, result)
+                    if len(batch) >= size:
+                        submit_batch(scheduler, batches.pop(key))
+                else:
+                    submit(scheduler, task)
 
-                task = scheduler.start_task()
+                task = start(scheduler)
+
+            # nothing else can join a batch until something finishes
+            for key in tuple(batches):
+                submit_batch(scheduler, batches.pop(key))
 
             if wait:
-                for result in wait():
+                if hooks:
+                    emit('running', None, len(scheduler.running))
+                    started = time()
+
+                results = wait()
+
+                if hooks:
+                    emit('wait', None, time() - started)
+
+                for result in results:
                     complete(scheduler, result)
 
+    flush = getattr(store, 'flush', None)
+
+    if flush is not None:
+        flush()
+
     # TODO: if in debug mode print out all failed tasks?
     return Results(completed, failed, exceptions)
@@ -0,0 +1,260 @@
+"""
+Broadcast variables: large constant arguments sent to each worker
+process once, instead of with every task.
+"""
+from numbers import Number
+import os
+import pickle
+from tempfile import mkstemp
+from threading import Lock
+from uuid import uuid4
+
+from arbiter.task import Task, TaskArray
+
+
+__all__ = ('Broadcast', 'broadcast_shared')
+
+
+_VALUES = {}  # key -> (path, value), for broadcasts loaded by this process
+_VALUES_LOCK = Lock()
+
+_SCALARS = (Number, type(None))
+
+
+class Broadcast(object):
+    """
+    A handle to a large value shared by many tasks. Passing the handle
+    as a task argument (instead of the value) means only the handle is
+    pickled with each task: the value is written to a temporary file
+    the first time the handle is pickled, and each worker process loads
+    it from there once and caches it. Tasks run in the process which
+    created the handle (inline or in threads) use the value directly.
+
+    Task functions receive the value, not the handle.
+
+    The temporary file is removed when the broadcast is closed (or the
+    handle garbage collected). Workers forget values whose broadcasts
+    have been closed.
+    """
+    __slots__ = (
+        'key', 'path', '_value', '_protocol', '_data', '_lock', '_owner',
+    )
+
+    def __init__(self, value, protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        value: The value to broadcast.
+        protocol: (optional, HIGHEST_PROTOCOL) The pickle protocol to
+            write the value with.
+        """
+        self.key = uuid4().hex
+        self.path = None
+        self._value = value
+        self._protocol = protocol
+        self._data = None
+        self._lock = Lock()
+        self._owner = True
+
+    @classmethod
+    def _pickled(cls, value, data):
+        """
+        Create a broadcast for a value which has already been pickled.
+        """
+        broadcast = cls(value)
+        broadcast._data = data
+
+        return broadcast
+
+    @property
+    def value(self):
+        """
+        The broadcast value, loaded (once per process) if necessary.
+        """
+        if self._owner:
+            return self._value
+
+        with _VALUES_LOCK:
+            entry = _VALUES.get(self.key)
+
+            if entry is None:
+                # forget broadcasts which have been closed since
+                for key in [
+                    key for key, (path, _) in _VALUES.items()
+                    if not os.path.exists(path)
+                ]:
+                    del _VALUES[key]
+
+                with open(self.path, 'rb') as handle:
+                    entry = (self.path, pickle.load(handle))
+
+                _VALUES[self.key] = entry
+
+        return entry[1]
+
+    def close(self):
+        """
+        Remove the broadcast's temporary file. Workers which have
+        already loaded the value keep it until they next load another
+        broadcast.
+        """
+        if not self._owner:
+            return
+
+        with self._lock:
+            path, self.path = self.path, None
+
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _dump(self):
+        """
+        Write the value to a temporary file, if it hasn't been already.
+        """
+        with self._lock:
+            if self.path is not None:
+                return
+
+            data = self._data
+
+            if data is None:
+                data = pickle.dumps(self._value, self._protocol)
+
+            # workers only read the file once the handle is pickled
+            descriptor, path = mkstemp(
+                prefix='arbiter-broadcast-', suffix='.pkl'
+            )
+
+            try:
+                with os.fdopen(descriptor, 'wb') as handle:
+                    handle.write(data)
+            except BaseException:
+                os.remove(path)
+                raise
+
+            self.path = path
+            self._data = None
+
+    def __getstate__(self):
+        """
+        Pickle the handle (not the value), writing the value out first.
+        """
+        if self._owner:
+            self._dump()
+
+        return (self.key, self.path)
+
+    def __setstate__(self, state):
+        self.key, self.path = state
+        self._value = None
+        self._protocol = None
+        self._data = None
+        self._lock = None
+        self._owner = False
+
+    def __eq__(self, other):
+        return isinstance(other, Broadcast) and other.key == self.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'Broadcast({!r})'.format(self.key)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:  # e.g., during interpreter shutdown
+            pass
+
+    def __enter__(self):
+        """
+        Enter a context manager. The broadcast is closed on exit.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exit the context manager, closing the broadcast.
+        """
+        self.close()
+
+
+def broadcast_shared(tasks, min_size=65536):
+    """
+    Broadcast large arguments which are shared (by identity) between
+    tasks. An argument counts as shared if it is passed to more than
+    one task, or to a task array with more than one item. Shared
+    arguments are pickled once to measure them, and those at least
+    min_size bytes long are replaced by Broadcast handles.
+
+    Returns the (possibly replaced) tasks and a list of the broadcasts
+    created, which should be closed once the tasks have run.
+
+    tasks: An iterable of tasks.
+    min_size: (optional, 65536) The smallest pickled size (in bytes) to
+        broadcast.
+    """
+    tasks = list(tasks)
+    counts = {}  # id -> [value, uses]
+
+    def candidates(task):
+        for value in task.args:
+            yield value
+
+        for key in task.kwargs:
+            yield task.kwargs[key]
+
+    for task in tasks:
+        uses = 1
+
+        if isinstance(task, TaskArray):
+            uses = len(task.items)
+
+        for value in candidates(task):
+            if isinstance(value, _SCALARS + (Task, TaskArray, Broadcast)):
+                continue
+
+            entry = counts.get(id(value))
+
+            if entry is None:
+                counts[id(value)] = [value, uses]
+            else:
+                entry[1] += uses
+
+    replacements = {}
+
+    for identity, (value, uses) in counts.items():
+        if uses < 2:
+            continue
+
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:  # not picklable: leave it to the executor
+            continue
+
+        if len(data) >= min_size:
+            replacements[identity] = Broadcast._pickled(value, data)
+
+    if not replacements:
+        return tasks, []
+
+    for index, task in enumerate(tasks):
+        if not any(id(value) in replacements for value in candidates(task)):
+            continue
+
+        tasks[index] = task._replace(
+            args=tuple(
+                replacements.get(id(value), value) for value in task.args
+            ),
+            kwargs=dict(
+                (key, replacements.get(id(value), value))
+                for key, value in task.kwargs.items()
+            ),
+        )
+
+    return tasks, list(replacements.values())
@@ -0,0 +1,532 @@
+"""
+A compact, immutable implementation of an acyclic directed graph.
+"""
+from array import array
+from collections import deque
+
+from arbiter.graph import SetView, Strategy
+
+
+__all__ = ('CompactGraph', 'CountingGraph')
+
+
+INDEX = 'i'  # the array typecode for node ids (4 bytes on most platforms)
+
+
+class CompactGraph(object):
+    """
+    An immutable acyclic directed graph with the same name-based
+    interface as Graph (minus add/remove).
+
+    Names are interned to dense integer ids, and edges are kept in
+    compressed sparse row arrays (one for parents, one for children),
+    so each edge costs a few bytes instead of two set entries. Node
+    names are still stored once (in a list and a dict for lookup).
+    """
+    __slots__ = (
+        '_names', '_ids', '_stubs', '_parent_offsets', '_parent_ids',
+        '_child_offsets', '_child_ids', '_node_view',
+    )
+
+    def __init__(self, edges=()):
+        """
+        Build a graph.
+
+        Raises an exception if a node is given twice, or if the graph
+        would contain a cycle.
+
+        NOTE: As with Graph, parents don't need to be given as nodes
+            themselves. Any that aren't are kept as stubs.
+
+        edges: (optional, ()) An iterable of (name, parents) pairs, one
+            per node.
+        """
+        names = []
+        ids = {}
+        node_parents = []
+        ordered = True  # every node given after its parents, so no cycles
+
+        for name, parents in edges:
+            index = ids.get(name)  # raises a TypeError if unhashable
+
+            if index is None:
+                index = ids[name] = len(names)
+                names.append(name)
+                node_parents.append(None)
+            elif node_parents[index] is not None:
+                raise ValueError(name)
+            else:  # already given as a parent
+                ordered = False
+
+            unique = set()
+
+            for parent in parents or ():
+                parent_index = ids.get(parent)
+
+                if parent_index is None:
+                    parent_index = ids[parent] = len(names)
+                    names.append(parent)
+                    node_parents.append(None)
+
+                unique.add(parent_index)
+
+            if index in unique:
+                raise ValueError(name)
+
+            node_parents[index] = tuple(unique)
+
+        size = len(names)
+
+        stubs = bytearray(size)
+        parent_offsets = array(INDEX, [0])
+        parent_ids = array(INDEX)
+        child_counts = array(INDEX, [0]) * size
+
+        for index, parents in enumerate(node_parents):
+            if parents is None:
+                stubs[index] = 1
+            else:
+                parent_ids.extend(parents)
+
+                for parent in parents:
+                    child_counts[parent] += 1
+
+            parent_offsets.append(len(parent_ids))
+
+        child_offsets = array(INDEX, [0])
+        total = 0
+
+        for count in child_counts:
+            total += count
+            child_offsets.append(total)
+
+        child_ids = array(INDEX, [0]) * total
+        filled = child_offsets[:-1]  # where each node's next child goes
+
+        for index, parents in enumerate(node_parents):
+            if parents:
+                for parent in parents:
+                    child_ids[filled[parent]] = index
+                    filled[parent] += 1
+
+        self._names = names
+        self._ids = ids
+        self._stubs = stubs
+        self._parent_offsets = parent_offsets
+        self._parent_ids = parent_ids
+        self._child_offsets = child_offsets
+        self._child_ids = child_ids
+        self._node_view = SetView(ids)
+
+        if not ordered:
+            self._check_acyclic()
+
+    def _check_acyclic(self):
+        """
+        Raise a ValueError naming a node on a cycle, if there is one
+        (using Kahn's algorithm).
+        """
+        offsets = self._child_offsets
+        children = self._child_ids
+        indegrees = self.indegrees()
+        stack = [index for index in range(len(self)) if not indegrees[index]]
+        visited = 0
+
+        while stack:
+            current = stack.pop()
+            visited += 1
+
+            for position in range(offsets[current], offsets[current + 1]):
+                child = children[position]
+                indegrees[child] -= 1
+
+                if not indegrees[child]:
+                    stack.append(child)
+
+        if visited != len(self):
+            for index in range(len(self)):
+                if indegrees[index]:
+                    raise ValueError(self._names[index])
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Build a compact copy of a Graph.
+        """
+        roots = graph.roots
+
+        return cls(
+            (name, graph.parents(name))
+            for name in graph.nodes
+            if name in roots or graph.parents(name)
+        )
+
+    @property
+    def nodes(self):
+        """
+        A view of the set of nodes in the graph.
+        """
+        return self._node_view
+
+    @property
+    def roots(self):
+        """
+        The set of nodes in the graph which have no parents.
+        """
+        return frozenset(
+            self._names[index] for index in range(len(self._names))
+            if not self._stubs[index] and
+            self._parent_offsets[index] == self._parent_offsets[index + 1]
+        )
+
+    def children(self, name):
+        """
+        Get the set of children a node has.
+
+        name: The name of the node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        names = self._names
+
+        return frozenset(
+            names[child] for child in self._child_range(self._ids[name])
+        )
+
+    def parents(self, name):
+        """
+        Get the set of parents a node has.
+
+        name: The name of the node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        names = self._names
+
+        return frozenset(
+            names[parent] for parent in self._parent_range(self._ids[name])
+        )
+
+    def ancestor_of(self, name, ancestor, visited=None):
+        """
+        Check whether a node has another node as an ancestor.
+
+        name: The name of the node being checked.
+        ancestor: The name of the (possible) ancestor node.
+        visited: (optional, None) If given, a set of nodes that have
+            already been traversed. NOTE: The set will be updated with
+            any new nodes that are visited.
+
+        NOTE: If either node doesn't exist, the method will return
+            False.
+        """
+        index = self._ids.get(name)
+        target = self._ids.get(ancestor)
+
+        if index is None or target is None:
+            return False
+
+        seen = bytearray(len(self._names))
+
+        if visited is not None:
+            for node in visited:
+                if node in self._ids:
+                    seen[self._ids[node]] = 1
+
+        stack = list(self._parent_range(index))
+
+        while stack:
+            current = stack.pop()
+
+            if current == target:
+                return True
+
+            if not seen[current]:
+                seen[current] = 1
+
+                if visited is not None:
+                    visited.add(self._names[current])
+
+                stack.extend(self._parent_range(current))
+
+        return False
+
+    def is_stub(self, name):
+        """
+        Check whether a node is a stub (a parent which was never given
+        as a node itself).
+
+        An exception will be raised if the node doesn't exist.
+        """
+        return bool(self._stubs[self._ids[name]])
+
+    def index(self, name):
+        """
+        Get the integer id of a node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        return self._ids[name]
+
+    def name(self, index):
+        """
+        Get the name of a node from its integer id.
+        """
+        return self._names[index]
+
+    def indegrees(self):
+        """
+        Get a new array of the number of parents each node has, indexed
+        by node id.
+        """
+        offsets = self._parent_offsets
+
+        return array(
+            INDEX,
+            (offsets[index + 1] - offsets[index] for index in range(len(self)))
+        )
+
+    def _parent_range(self, index):
+        """
+        The ids of a node's parents.
+        """
+        offsets = self._parent_offsets
+
+        return self._parent_ids[offsets[index]:offsets[index + 1]]
+
+    def _child_range(self, index):
+        """
+        The ids of a node's children.
+        """
+        offsets = self._child_offsets
+
+        return self._child_ids[offsets[index]:offsets[index + 1]]
+
+    def __len__(self):
+        """
+        The number of nodes in the graph.
+        """
+        return len(self._names)
+
+    def __contains__(self, node):
+        """
+        Check whether a node is in the graph
+        """
+        return node in self._ids
+
+    def __eq__(self, other):
+        """
+        Equality checking
+        """
+        if not isinstance(other, CompactGraph):
+            return NotImplemented
+
+        return (
+            self.nodes == other.nodes and
+            all(
+                self.is_stub(name) == other.is_stub(name) and
+                self.parents(name) == other.parents(name)
+                for name in self._names
+            )
+        )
+
+    def __ne__(self, other):
+        """
+        Inequality checking
+        """
+        if not isinstance(other, CompactGraph):
+            return NotImplemented
+
+        return not (self == other)
+
+    __hash__ = None
+
+
+class CountingGraph(object):
+    """
+    A scheduling graph built on a CompactGraph. The structure never
+    changes after construction; instead each node keeps a count of its
+    unfinished parents. Removing a node (when its task completes) just
+    decrements its children's counts, and children whose count reaches
+    zero become roots.
+
+    It supports the parts of Graph's interface a Scheduler needs (nodes,
+    roots, remove, prune and membership), but nodes can't be added.
+    As counts reach zero exactly when nodes become roots, it also keeps
+    them in a ready queue, so finding a runnable node never means
+    scanning the roots.
+    """
+
+    def __init__(self, graph):
+        """
+        graph: The CompactGraph (or Graph) to schedule.
+        """
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_graph(graph)
+
+        self._graph = graph
+        self._remaining = graph.indegrees()
+        self._removed = bytearray(len(graph))
+        self._size = len(graph)
+        self._ready = deque(
+            graph.name(index) for index, count in enumerate(self._remaining)
+            if not count and not graph._stubs[index]
+        )
+        self._roots = set(self._ready)
+
+        self._node_view = SetView(self)
+        self._root_view = SetView(self._roots)
+
+    @property
+    def nodes(self):
+        """
+        A live view of the set of nodes in the graph which haven't been
+        removed.
+        """
+        return self._node_view
+
+    @property
+    def roots(self):
+        """
+        A live view of the set of nodes in the graph which have no
+        unfinished parents.
+        """
+        return self._root_view
+
+    @property
+    def ready(self):
+        """
+        A deque of roots, in the order they became roots. Consumers pop
+        nodes off the left as they take them; nodes removed since they
+        were queued aren't taken out, so check they're still roots.
+        """
+        return self._ready
+
+    def add(self, name, parents=None):
+        """
+        Nodes can't be added to a counting graph.
+        """
+        raise TypeError(name)
+
+    def remove(self, name, strategy=Strategy.orphan):
+        """
+        Remove a node from the graph. Returns the set of nodes that were
+        removed.
+
+        If the node doesn't exist, an exception will be raised.
+
+        name: The name of the node to remove.
+        strategy: (Optional, Strategy.orphan) What to do with children
+            or removed nodes. The options are:
+
+            orphan: decrement the children's count of unfinished
+                parents.
+            remove: recursively remove all children of the node.
+
+            NOTE: Strategy.promote isn't supported.
+        """
+        graph = self._graph
+        index = graph.index(name)
+
+        if self._removed[index]:
+            raise KeyError(name)
+
+        if strategy == Strategy.orphan:
+            remaining = self._remaining
+            removed = self._removed
+            offsets = graph._child_offsets
+            children = graph._child_ids
+
+            removed[index] = 1
+            self._size -= 1
+            self._roots.discard(name)
+
+            # index the child arrays directly; slicing them would copy
+            for position in range(offsets[index], offsets[index + 1]):
+                child = children[position]
+                remaining[child] -= 1
+
+                if not remaining[child] and not removed[child]:
+                    child = graph._names[child]
+                    self._roots.add(child)
+                    self._ready.append(child)
+
+            return set((name,))
+        elif strategy == Strategy.remove:
+            return self._remove_descendants(index)
+        else:
+            raise ValueError(strategy)
+
+    def prune(self):
+        """
+        Remove any tasks that have stubs as ancestors (and the stubs
+        themselves).
+
+        Returns the set of nodes which were removed.
+        """
+        graph = self._graph
+        pruned = set()
+        stubs = set()
+
+        for index in range(len(graph)):
+            if graph._stubs[index] and not self._removed[index]:
+                stubs.add(graph.name(index))
+                pruned.update(self._remove_descendants(index))
+
+        return pruned - stubs
+
+    def _remove_descendants(self, index):
+        """
+        Remove a node and all of its descendants, returning their names.
+        """
+        graph = self._graph
+        removed = self._removed
+        offsets = graph._child_offsets
+        children = graph._child_ids
+        names = set()
+
+        removed[index] = 1
+        stack = [index]
+
+        while stack:
+            current = stack.pop()
+            name = graph.name(current)
+
+            names.add(name)
+            self._size -= 1
+            self._roots.discard(name)
+
+            for position in range(offsets[current], offsets[current + 1]):
+                child = children[position]
+
+                if not removed[child]:
+                    removed[child] = 1
+                    stack.append(child)
+
+        return names
+
+    def __contains__(self, node):
+        """
+        Check whether a node is in the graph (and hasn't been removed)
+        """
+        return node in self._graph and not self._removed[
+            self._graph.index(node)
+        ]
+
+    def __iter__(self):
+        """
+        Iterate over the nodes which haven't been removed.
+        """
+        graph = self._graph
+        removed = self._removed
+
+        return (
+            graph.name(index) for index in range(len(graph))
+            if not removed[index]
+        )
+
+    def __len__(self):
+        """
+        The number of nodes which haven't been removed.
+        """
+        return self._size
@@ -0,0 +1,31 @@
+"""
+Differences between the versions of Python arbiter runs on.
+"""
+import sys
+
+
+__all__ = (
+    'POOL_CONTEXTS', 'POOL_INITIALIZERS', 'require_pool_initializers',
+)
+
+
+# Worker pools only take initializer and initargs from Python 3.7
+POOL_INITIALIZERS = sys.version_info >= (3, 7)
+
+# Process pools only take an mp_context from Python 3.7
+POOL_CONTEXTS = sys.version_info >= (3, 7)
+
+
+def require_pool_initializers(feature):
+    """
+    Check that worker pools can run an initializer in each worker as
+    it starts, which a feature needs.
+
+    feature: A description of the feature, for the error message.
+
+    Raises a RuntimeError on versions of Python whose pools can't.
+    """
+    if not POOL_INITIALIZERS:
+        raise RuntimeError(
+            "{} requires Python 3.7 or later".format(feature)
+        )
@@ -1,11 +1,15 @@
 """
 An implementation for an acyclic directed graph.
 """
-from collections import namedtuple, Hashable
+from collections import namedtuple
+try:
+    from collections.abc import Hashable, Set
+except ImportError:  # Python 2
+    from collections import Hashable, Set
 from enum import Enum
 
 
-__all__ = ('Graph', 'Strategy')
+__all__ = ('Graph', 'SetView', 'Strategy')
 
 
 Node = namedtuple('Node', ('name', 'children', 'parents'))
@@ -13,6 +17,49 @@ Node = namedtuple('Node', ('name', 'children', 'parents'))
 Strategy = Enum('Strategy', ('orphan', 'promote', 'remove'))
 
 
+class SetView(Set):
+    """
+    A read-only, live view of a set (or of any container supporting
+    membership, iteration and len).
+
+    Views don't copy their container, so they always reflect its
+    current contents. Take a snapshot (e.g., frozenset(view)) if the
+    contents are needed after the underlying object changes. Set
+    operations (e.g., view - other) return new frozensets.
+
+    Views hash like a snapshot of their contents, so they can still be
+    used where the frozensets Graph used to return were hashed. As the
+    hash changes with the contents, don't keep a view in a dict or set
+    while its graph changes; use a snapshot.
+    """
+    __slots__ = ('_container',)
+
+    def __init__(self, container):
+        self._container = container
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        """
+        Build the result of a set operation.
+        """
+        return frozenset(iterable)
+
+    def __contains__(self, item):
+        return item in self._container
+
+    def __iter__(self):
+        return iter(self._container)
+
+    def __len__(self):
+        return len(self._container)
+
+    def __hash__(self):
+        return hash(frozenset(self._container))
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, set(self._container))
+
+
 class Graph(object):
     """
     An acyclic directed graph.
@@ -24,6 +71,15 @@ class Graph(object):
         self._stubs = set()
         self._roots = set()
 
+        self._node_view = SetView(self._nodes)
+        self._root_view = SetView(self._roots)
+
+        # query caches (see _invalidate)
+        self._ancestors = {}
+        self._descendants = {}
+        self._order = None
+        self._levels = None
+
     def add(self, name, parents=None):
         """
         add a node to the graph.
@@ -52,11 +108,12 @@ class Graph(object):
         else:
             node = Node(name, set(), parents)
 
-        # cycle detection
+        # cycle detection (a new node has no descendants, so it can
+        # only form a cycle with itself)
         visited = set()
 
         for parent in parents:
-            if self.ancestor_of(parent, name, visited=visited):
+            if is_stub and self.ancestor_of(parent, name, visited=visited):
                 raise ValueError(parent)
             elif parent == name:
                 raise ValueError(parent)
@@ -82,6 +139,7 @@ class Graph(object):
             self._roots.add(name)
 
         self._nodes[name] = node
+        self._invalidate((name,))
 
     def remove(self, name, strategy=Strategy.promote):
         """
@@ -99,6 +157,14 @@ class Graph(object):
                 childs set of parents.
             remove: recursively remove all children of the node.
         """
+        if strategy == Strategy.remove:
+            closure = self._closure(name)
+            self._invalidate(closure)
+
+            return self._remove_closure(closure)
+
+        self._invalidate((name,))
+
         removed = set()
 
         stack = [name]
@@ -107,28 +173,20 @@ class Graph(object):
             current = stack.pop()
             node = self._nodes.pop(current)
 
-            if strategy == Strategy.remove:
-                for child_name in node.children:
-                    child_node = self._nodes[child_name]
-
-                    child_node.parents.remove(current)
-
-                    stack.append(child_name)
-            else:
-                for child_name in node.children:
-                    child_node = self._nodes[child_name]
+            for child_name in node.children:
+                child_node = self._nodes[child_name]
 
-                    child_node.parents.remove(current)
+                child_node.parents.remove(current)
 
-                    if strategy == Strategy.promote:
-                        for parent_name in node.parents:
-                            parent_node = self._nodes[parent_name]
+                if strategy == Strategy.promote:
+                    for parent_name in node.parents:
+                        parent_node = self._nodes[parent_name]
 
-                            parent_node.children.add(child_name)
-                            child_node.parents.add(parent_name)
+                        parent_node.children.add(child_name)
+                        child_node.parents.add(parent_name)
 
-                    if not child_node.parents:
-                        self._roots.add(child_name)
+                if not child_node.parents:
+                    self._roots.add(child_name)
 
             if current in self._stubs:
                 self._stubs.remove(current)
@@ -147,39 +205,97 @@ class Graph(object):
 
         return removed
 
+    def _closure(self, name):
+        """
+        Get the set containing a node and all of its descendants.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        closure = set((name,))
+        stack = [self._nodes[name]]
+
+        while stack:
+            for child_name in stack.pop().children:
+                if child_name not in closure:
+                    closure.add(child_name)
+                    stack.append(self._nodes[child_name])
+
+        return closure
+
+    def _remove_closure(self, closure):
+        """
+        Remove a set of nodes which is closed under descent (i.e., every
+        child of a node in the set is also in the set) in one pass.
+        Returns the set of nodes that were removed, which includes any
+        stubs left without children.
+
+        Only parents outside the set need updating: nodes in the set
+        are discarded whole, so their own parent and child sets are
+        never touched.
+        """
+        removed = set(closure)
+
+        for current in closure:
+            node = self._nodes.pop(current)
+
+            if current in self._stubs:
+                self._stubs.remove(current)
+            elif current in self._roots:
+                self._roots.remove(current)
+            else:  # stubs and roots (by definition) don't have parents
+                for parent_name in node.parents:
+                    if parent_name in closure:
+                        continue
+
+                    parent_node = self._nodes[parent_name]
+                    parent_node.children.discard(current)
+
+                    if parent_name in self._stubs and not parent_node.children:
+                        del self._nodes[parent_name]
+                        self._stubs.remove(parent_name)
+                        removed.add(parent_name)
+
+        return removed
+
     @property
     def nodes(self):
         """
-        The set of nodes in the graph.
+        A live view of the set of nodes in the graph.
         """
-        return frozenset(self._nodes)
+        return self._node_view
 
     @property
     def roots(self):
         """
-        The set of nodes in the graph which have no parents.
+        A live view of the set of nodes in the graph which have no
+        parents.
         """
-        return frozenset(self._roots)
+        return self._root_view
 
     def children(self, name):
         """
-        Get the set of children a node has.
+        Get a live view of the set of children a node has.
 
         name: The name of the node.
 
+        NOTE: The view stops updating once the node is removed.
+
         An exception will be raised if the node doesn't exist.
         """
-        return frozenset(self._nodes[name].children)
+        return SetView(self._nodes[name].children)
 
     def parents(self, name):
         """
-        Get the set of parents a node has.
+        Get a live view of the set of parents a node has.
 
         name: The name of the node.
 
+        NOTE: The view stops updating once the node is removed (or, for
+            a stub, once it is added as a node).
+
         An exception will be raised if the node doesn't exist.
         """
-        return frozenset(self._nodes[name].parents)
+        return SetView(self._nodes[name].parents)
 
     def ancestor_of(self, name, ancestor, visited=None):
         """
@@ -194,6 +310,11 @@ class Graph(object):
         NOTE: If node doesn't exist, the method will return False.
         """
         if visited is None:
+            cached = self._ancestors.get(name)
+
+            if cached is not None:
+                return ancestor in cached
+
             visited = set()
 
         node = self._nodes.get(name)
@@ -218,6 +339,176 @@ class Graph(object):
 
         return False
 
+    def ancestors(self, name):
+        """
+        Get the set of all nodes a node descends from. The result is
+        cached until the graph changes in a way that affects it.
+
+        name: The name of the node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        return self._traverse(name, self._ancestors, 'parents')
+
+    def descendants(self, name):
+        """
+        Get the set of all nodes that descend from a node. The result is
+        cached until the graph changes in a way that affects it.
+
+        name: The name of the node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        return self._traverse(name, self._descendants, 'children')
+
+    def topological_order(self):
+        """
+        Get a tuple of all nodes (stubs included), ordered such that
+        every node comes after all of its parents. The result is cached
+        until the graph changes.
+        """
+        if self._order is None:
+            indegrees = dict(
+                (name, len(node.parents))
+                for name, node in self._nodes.items()
+            )
+            stack = [name for name, count in indegrees.items() if not count]
+            order = []
+
+            while stack:
+                current = stack.pop()
+                order.append(current)
+
+                for child_name in self._nodes[current].children:
+                    indegrees[child_name] -= 1
+
+                    if not indegrees[child_name]:
+                        stack.append(child_name)
+
+            self._order = tuple(order)
+
+        return self._order
+
+    def level(self, name):
+        """
+        Get the depth of a node: 0 for roots and stubs, otherwise one
+        more than the deepest of its parents. Levels are cached until
+        the graph changes.
+
+        name: The name of the node.
+
+        An exception will be raised if the node doesn't exist.
+        """
+        return self._get_levels()[name]
+
+    def levels(self):
+        """
+        Get a dict mapping every node to its level (see level).
+        """
+        return dict(self._get_levels())
+
+    def transitive_reduction(self):
+        """
+        Get a copy of the graph with every redundant edge removed (i.e.,
+        edges from a parent that is also an ancestor of another of the
+        node's parents). The reduced graph has the same ancestors and
+        descendants for every node.
+        """
+        reduced = Graph()
+
+        for name in self.topological_order():
+            if name in self._stubs:
+                continue
+
+            parents = self._nodes[name].parents
+            ancestors = set()
+
+            for parent in parents:
+                ancestors.update(self.ancestors(parent))
+
+            reduced.add(name, parents - ancestors)
+
+        return reduced
+
+    def _traverse(self, name, cache, direction):
+        """
+        Collect every node reachable from a node in a direction
+        ('parents' or 'children'), reusing and filling a cache.
+        """
+        cached = cache.get(name)
+
+        if cached is not None:
+            return cached
+
+        result = set()
+        stack = list(getattr(self._nodes[name], direction))
+
+        while stack:
+            current = stack.pop()
+
+            if current in result:
+                continue
+
+            result.add(current)
+            known = cache.get(current)
+
+            if known is not None:  # already closed
+                result.update(known)
+            else:
+                stack.extend(getattr(self._nodes[current], direction))
+
+        cached = cache[name] = frozenset(result)
+
+        return cached
+
+    def _get_levels(self):
+        """
+        Get the (cached) dict of node levels.
+        """
+        if self._levels is None:
+            levels = {}
+
+            for name in self.topological_order():
+                parents = self._nodes[name].parents
+                levels[name] = max(
+                    [levels[parent] + 1 for parent in parents] or [0]
+                )
+
+            self._levels = levels
+
+        return self._levels
+
+    def _invalidate(self, names):
+        """
+        Drop cached query results that a change to the given nodes (and
+        their edges) could affect: the descendants of their ancestors,
+        the ancestors of their descendants, and the graph-wide order
+        and levels. Must be called while the nodes' edges are in place
+        (i.e., after adding or before removing).
+        """
+        self._order = None
+        self._levels = None
+
+        for cache, direction in (
+            (self._descendants, 'parents'),
+            (self._ancestors, 'children'),
+        ):
+            if not cache:
+                continue
+
+            visited = set()
+            stack = [name for name in names if name in self._nodes]
+
+            while stack:
+                current = stack.pop()
+
+                if current in visited:
+                    continue
+
+                visited.add(current)
+                cache.pop(current, None)
+                stack.extend(getattr(self._nodes[current], direction))
+
     def prune(self):
         """
         Remove any tasks that have stubs as ancestors (and the stubs
@@ -229,7 +520,9 @@ class Graph(object):
         stubs = frozenset(self._stubs)
 
         for stub in stubs:
-            pruned.update(self.remove(stub, strategy=Strategy.remove))
+            # removing another stub's descendants may have emptied it
+            if stub in self._stubs:
+                pruned.update(self.remove(stub, strategy=Strategy.remove))
 
         return pruned - stubs  # we're only returning actual nodes
 
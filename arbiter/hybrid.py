@@ -0,0 +1,42 @@
+"""
+Hybrid task runner which routes each task to a thread pool, a process
+pool or the scheduling thread based on the task's backend hint.
+"""
+from arbiter.runner import Runner
+from arbiter.task import Backend
+
+
+__all__ = ('run_tasks',)
+
+
+def run_tasks(tasks, max_threads=None, max_processes=None,
+              default=Backend.thread, profiler=None, hooks=None,
+              store=None, lazy=False, resume=False, targets=None):
+    """
+    Run an iterable of tasks, executing each one on the backend it
+    hints at. All backends share a single scheduler and task store.
+
+    tasks: The iterable of tasks
+    max_threads: (optional, None) The maximum number of threads to use
+        for thread-backed tasks.
+    max_processes: (optional, None) The maximum number of processes to
+        use for process-backed tasks.
+    default: (optional, Backend.thread) The backend to use for tasks
+        that don't have a hint.
+    profiler: (optional, None) A Profiler to record task timings with.
+    hooks: (optional, None) An iterable of task loop hooks (see
+        arbiter.base.task_loop).
+    store: (optional, None) The store to keep results in.
+    lazy: (optional, False) Pass results between tasks by reference
+        through the store (see arbiter.base.task_loop). If no store is
+        given, a temporary FileStore is used.
+    resume: (optional, False) Skip tasks whose results are already in
+        the store (see arbiter.base.task_loop).
+    targets: (optional, None) The names of the tasks to run. Only they
+        and the tasks they depend on are run.
+    """
+    with Runner(max_threads, max_processes, default) as runner:
+        return runner.run_tasks(
+            tasks, store=store, profiler=profiler, hooks=hooks, lazy=lazy,
+            resume=resume, targets=targets,
+        )
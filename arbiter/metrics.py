@@ -0,0 +1,351 @@
+"""
+A minimal in-process metrics registry (counters, gauges and histograms)
+with a Prometheus-style text exposition format, and a task loop hook
+which records Arbiter's scheduling overhead into it.
+"""
+from threading import Lock
+
+
+__all__ = ('Counter', 'Gauge', 'Histogram', 'Metrics', 'Registry')
+
+
+DEFAULT_BUCKETS = (
+    0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0,
+)
+
+
+def _format(value):
+    """
+    Format a number for the exposition format.
+    """
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    A value that only goes up.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, description=''):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = Lock()
+
+    @property
+    def value(self):
+        """
+        The counter's current value.
+        """
+        return self._value
+
+    def inc(self, amount=1):
+        """
+        Increment the counter.
+
+        amount: (optional, 1) How much to increment the counter by. Must
+            not be negative.
+        """
+        if amount < 0:
+            raise ValueError(amount)
+
+        with self._lock:
+            self._value += amount
+
+    def samples(self):
+        """
+        The counter's samples, as (name, labels, value) tuples.
+        """
+        return [(self.name, '', self._value)]
+
+
+class Gauge(object):
+    """
+    A value that can go up and down.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, description=''):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = Lock()
+
+    @property
+    def value(self):
+        """
+        The gauge's current value.
+        """
+        return self._value
+
+    def set(self, value):
+        """
+        Set the gauge.
+        """
+        self._value = value
+
+    def inc(self, amount=1):
+        """
+        Increment (or decrement) the gauge.
+        """
+        with self._lock:
+            self._value += amount
+
+    def samples(self):
+        """
+        The gauge's samples, as (name, labels, value) tuples.
+        """
+        return [(self.name, '', self._value)]
+
+
+class Histogram(object):
+    """
+    A distribution of observed values, counted into cumulative buckets.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, description='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    @property
+    def count(self):
+        """
+        The number of observed values.
+        """
+        return self._count
+
+    @property
+    def sum(self):
+        """
+        The total of the observed values.
+        """
+        return self._sum
+
+    def observe(self, value):
+        """
+        Record a value.
+        """
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+
+            self._sum += value
+            self._count += 1
+
+    def samples(self):
+        """
+        The histogram's samples, as (name, labels, value) tuples.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        samples = []
+        cumulative = 0
+
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            samples.append((
+                self.name + '_bucket',
+                '{{le="{}"}}'.format(_format(bound)),
+                cumulative,
+            ))
+
+        samples.append((self.name + '_sum', '', total))
+        samples.append((self.name + '_count', '', count))
+
+        return samples
+
+
+class Registry(object):
+    """
+    A collection of metrics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def counter(self, name, description=''):
+        """
+        Get (or create) a counter.
+        """
+        return self._get(Counter, name, description)
+
+    def gauge(self, name, description=''):
+        """
+        Get (or create) a gauge.
+        """
+        return self._get(Gauge, name, description)
+
+    def histogram(self, name, description='', buckets=DEFAULT_BUCKETS):
+        """
+        Get (or create) a histogram.
+        """
+        return self._get(Histogram, name, description, buckets)
+
+    def get(self, name):
+        """
+        Get a metric by name. Raises an exception if the metric doesn't
+        exist.
+        """
+        return self._metrics[name]
+
+    def exposition(self):
+        """
+        Get the registry's metrics in the Prometheus text exposition
+        format.
+        """
+        lines = []
+
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+
+        for name, metric in metrics:
+            if metric.description:
+                lines.append('# HELP {} {}'.format(name, metric.description))
+
+            lines.append('# TYPE {} {}'.format(name, metric.kind))
+
+            for sample, labels, value in metric.samples():
+                lines.append(
+                    '{}{} {}'.format(sample, labels, _format(value))
+                )
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def _get(self, kind, name, description, *args):
+        """
+        Get a metric, creating it if it doesn't exist.
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                metric = kind(name, description, *args)
+                self._metrics[name] = metric
+            elif not isinstance(metric, kind):
+                raise TypeError(name)
+
+            return metric
+
+
+class Metrics(object):
+    """
+    A task loop hook which records how long Arbiter spends scheduling
+    (compared to running tasks), queue depth, in-flight tasks and
+    worker utilization.
+
+    Pass it (or several) to a runner through hooks:
+
+        metrics = Metrics(workers=8)
+        run_tasks(tasks, max_workers=8, hooks=(metrics,))
+        print(metrics.registry.exposition())
+    """
+
+    DURATIONS = {
+        'start_task': 'Time spent in Scheduler.start_task',
+        'end_task': 'Time spent in Scheduler.end_task',
+        'graph_remove': 'Time spent in Graph.remove',
+        'collect': 'Time spent collecting task arguments',
+        'store': 'Time spent storing task results',
+        'task': 'Time spent running task functions',
+        'wait': 'Time the scheduler spent waiting for tasks',
+        'serialize': 'Time spent serializing tasks for workers',
+        'deserialize': 'Time spent deserializing task results',
+    }
+
+    SIZES = {
+        'task_bytes': 'Bytes of serialized tasks sent to workers',
+        'result_bytes': 'Bytes of serialized results sent back',
+    }
+
+    def __init__(self, registry=None, workers=None, prefix='arbiter'):
+        """
+        registry: (optional, None) The Registry to record metrics in. If
+            not given, a new registry is created.
+        workers: (optional, None) The number of workers tasks run on,
+            used to compute utilization.
+        prefix: (optional, 'arbiter') A prefix for metric names.
+        """
+        if registry is None:
+            registry = Registry()
+
+        self.registry = registry
+        self._workers = workers
+
+        self._durations = dict(
+            (
+                event,
+                registry.histogram(
+                    '{}_{}_seconds'.format(prefix, event), description
+                ),
+            )
+            for event, description in self.DURATIONS.items()
+        )
+        self._sizes = dict(
+            (
+                event,
+                registry.counter(
+                    '{}_{}_total'.format(prefix, event), description
+                ),
+            )
+            for event, description in self.SIZES.items()
+        )
+        self._succeeded = registry.counter(
+            '{}_tasks_succeeded_total'.format(prefix),
+            'Tasks which completed successfully',
+        )
+        self._failed = registry.counter(
+            '{}_tasks_failed_total'.format(prefix),
+            'Tasks which raised an exception',
+        )
+        self._runnable = registry.gauge(
+            '{}_runnable_tasks'.format(prefix),
+            'Tasks waiting to be started',
+        )
+        self._running = registry.gauge(
+            '{}_running_tasks'.format(prefix),
+            'Tasks currently in flight',
+        )
+        self._utilization = None
+
+        if workers:
+            self._utilization = registry.gauge(
+                '{}_worker_utilization'.format(prefix),
+                'Fraction of workers busy with tasks',
+            )
+
+    def __call__(self, event, name, value):
+        """
+        Record a task loop event.
+        """
+        histogram = self._durations.get(event)
+
+        if histogram is not None:
+            histogram.observe(value)
+        elif event in self._sizes:
+            self._sizes[event].inc(value)
+        elif event == 'finished':
+            (self._succeeded if value else self._failed).inc()
+        elif event == 'runnable':
+            self._runnable.set(value)
+        elif event == 'running':
+            self._running.set(value)
+
+            if self._utilization is not None:
+                self._utilization.set(
+                    min(value, self._workers) / float(self._workers)
+                )
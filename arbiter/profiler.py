@@ -0,0 +1,323 @@
+"""
+Per-task timing for task runs, exportable as a Chrome trace.
+"""
+from collections import namedtuple
+import json
+import os
+from threading import current_thread
+from time import time
+
+from arbiter.task import Element
+
+
+__all__ = ('Profiler', 'TaskTiming')
+
+
+TaskTiming = namedtuple(
+    'TaskTiming',
+    (
+        'name', 'dependencies', 'successful', 'queued', 'started',
+        'finished', 'completed', 'worker', 'collect', 'store',
+    ),
+)
+
+Timed = namedtuple('Timed', ('data', 'started', 'finished', 'worker'))
+
+
+def timed_call(function):
+    """
+    Call a function (in a worker), recording when it ran and where.
+    """
+    started = time()
+    data = function()
+    finished = time()
+
+    return Timed(data, started, finished, _worker())
+
+
+def _worker():
+    """
+    Identify the current worker by its process and thread.
+    """
+    return (os.getpid(), current_thread().ident)
+
+
+def _known(value):
+    """
+    Order values with unknown (None) ones first.
+    """
+    return (value is not None, value)
+
+
+def _total(first, second):
+    """
+    Add two values, either of which may be unknown (None).
+    """
+    if first is None or second is None:
+        return second if first is None else first
+
+    return first + second
+
+
+class Profiler(object):
+    """
+    Records when each task in a run was queued, started and finished,
+    which worker ran it, and how long the scheduler spent collecting
+    its arguments and storing its result.
+
+    Timestamps are wall-clock times so that tasks run in other
+    processes can be compared. NOTE: Worker timings are only available
+    for tasks that succeeded; failed tasks are timed from when they
+    were queued to when the scheduler saw them fail.
+    """
+
+    def __init__(self):
+        self._origin = time()
+        self._timings = {}
+        self._scheduler = _worker()
+
+    @property
+    def timings(self):
+        """
+        The list of TaskTimings recorded so far.
+        """
+        return [
+            TaskTiming(*timing) for timing in self._timings.values()
+            if timing[6] is not None
+        ]
+
+    def queue(self, task, collect):
+        """
+        Record that a task has been handed to its runner.
+
+        task: The task being queued.
+        collect: How long (in seconds) it took to collect the task's
+            arguments.
+        """
+        self._scheduler = _worker()
+        self._timings[task.name] = [
+            task.name, task.dependencies, None, time(), None, None, None,
+            None, collect, None,
+        ]
+
+    def finish(self, result, timed=None):
+        """
+        Record that the scheduler has received a task's result.
+
+        result: The TaskResult for the task.
+        timed: (optional, None) The Timed record returned by the
+            task's worker, if the task succeeded.
+        """
+        timing = self._timings[result.name]
+        timing[2] = result.successful
+        timing[6] = time()
+
+        if timed is not None:
+            timing[4] = timed.started
+            timing[5] = timed.finished
+            timing[7] = timed.worker
+
+    def stored(self, name, store):
+        """
+        Record how long it took to store a task's result.
+
+        name: The name of the task.
+        store: How long (in seconds) storing the result took.
+        """
+        self._timings[name][9] = store
+
+    def critical_path(self):
+        """
+        Get the chain of tasks that determined how long the run took,
+        as a list of TaskTimings (earliest first). The chain ends with
+        the last task to complete, and each task is preceded by the
+        dependency that completed last. Task arrays appear as a single
+        timing spanning all of their elements.
+        """
+        timings = dict((timing.name, timing) for timing in self.timings)
+        nodes = self._arrays(timings.values())
+        nodes.update(timings)
+        path = []
+
+        current = None
+
+        if timings:
+            current = max(
+                timings.values(), key=lambda timing: timing.completed
+            )
+
+        while current is not None:
+            path.append(current)
+
+            dependencies = [
+                nodes[name] for name in current.dependencies
+                if name in nodes
+            ]
+
+            if dependencies:
+                current = max(
+                    dependencies, key=lambda timing: timing.completed
+                )
+            else:
+                current = None
+
+        path.reverse()
+
+        return path
+
+    @staticmethod
+    def _arrays(timings):
+        """
+        Combine the timings of task array elements into a timing for
+        each array (from when its first element was queued to when its
+        last completed), as a dict of array names to TaskTimings.
+        """
+        arrays = {}
+
+        for timing in timings:
+            if not isinstance(timing.name, Element):
+                continue
+
+            name = timing.name.array
+            array = arrays.get(name)
+
+            if array is None:
+                arrays[name] = timing._replace(name=name)
+                continue
+
+            started = [
+                value for value in (array.started, timing.started)
+                if value is not None
+            ]
+            last = max(array, timing, key=lambda item: item.completed)
+
+            arrays[name] = array._replace(
+                successful=array.successful and timing.successful,
+                queued=min(array.queued, timing.queued),
+                started=min(started) if started else None,
+                finished=max(array.finished, timing.finished, key=_known),
+                completed=last.completed,
+                worker=last.worker,
+                collect=_total(array.collect, timing.collect),
+                store=_total(array.store, timing.store),
+            )
+
+        return arrays
+
+    def summary(self):
+        """
+        Summarize the run: its duration, how long tasks spent queued,
+        running and in the scheduler, and its critical path.
+        """
+        timings = self.timings
+        path = self.critical_path()
+
+        def total(values):
+            """
+            Sum the known values.
+            """
+            return sum(value for value in values if value is not None)
+
+        return {
+            'tasks': len(timings),
+            'failed': sum(1 for timing in timings if not timing.successful),
+            'duration': (
+                max(timing.completed for timing in timings) -
+                min(timing.queued for timing in timings)
+            ) if timings else 0.0,
+            'queued': total(
+                timing.started - timing.queued for timing in timings
+                if timing.started is not None
+            ),
+            'running': total(
+                timing.finished - timing.started for timing in timings
+                if timing.started is not None
+            ),
+            'collect': total(timing.collect for timing in timings),
+            'store': total(timing.store for timing in timings),
+            'critical_path': [timing.name for timing in path],
+            'critical_path_duration': (
+                path[-1].completed - path[0].queued
+            ) if path else 0.0,
+        }
+
+    def chrome_trace(self):
+        """
+        Get the recorded timings as a Chrome trace (which can be loaded
+        into chrome://tracing or Perfetto).
+        """
+        scheduler = self._scheduler
+        events = [{
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': scheduler[0],
+            'tid': scheduler[1],
+            'args': {'name': 'scheduler'},
+        }]
+
+        def microseconds(timestamp):
+            """
+            Convert a timestamp to microseconds since profiling began.
+            """
+            return int((timestamp - self._origin) * 1e6)
+
+        def event(name, category, start, end, worker, args=None):
+            """
+            Add a complete event to the trace.
+            """
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': microseconds(start),
+                'dur': max(microseconds(end) - microseconds(start), 0),
+                'pid': worker[0],
+                'tid': worker[1],
+                'args': args or {},
+            })
+
+        for timing in self.timings:
+            name = str(timing.name)
+            args = {
+                'dependencies': sorted(
+                    str(dependency) for dependency in timing.dependencies
+                ),
+                'collect': timing.collect,
+                'store': timing.store,
+            }
+
+            if timing.started is not None:
+                args['queued'] = timing.started - timing.queued
+                event(
+                    name, 'task', timing.started, timing.finished,
+                    timing.worker, args,
+                )
+            else:
+                event(
+                    name, 'failed' if not timing.successful else 'task',
+                    timing.queued, timing.completed, scheduler, args,
+                )
+
+            if timing.collect is not None:
+                event(
+                    'collect {}'.format(name), 'scheduler',
+                    timing.queued - timing.collect, timing.queued,
+                    scheduler,
+                )
+
+            if timing.store is not None:
+                event(
+                    'store {}'.format(name), 'scheduler',
+                    timing.completed, timing.completed + timing.store,
+                    scheduler,
+                )
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, fp):
+        """
+        Write the recorded timings to a file as a Chrome trace.
+
+        fp: A writable text file.
+        """
+        json.dump(self.chrome_trace(), fp)
@@ -0,0 +1,451 @@
+"""
+A process pool which survives its workers crashing, and can recycle
+its workers to keep their memory use down.
+"""
+from collections import deque, namedtuple
+import concurrent.futures
+from functools import partial
+from itertools import count
+from multiprocessing import cpu_count
+import os
+import shutil
+from tempfile import mkdtemp
+from threading import Condition, Thread
+
+try:
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:  # Python 2's futures backport doesn't detect crashes
+    BrokenProcessPool = None
+
+
+__all__ = ('ResilientExecutor', 'WorkerCrashed')
+
+
+# a result, and the worker which produced it
+_Measured = namedtuple('_Measured', ('value', 'pid', 'rss'))
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError):  # e.g., Windows
+    _PAGE_SIZE = None
+
+
+class WorkerCrashed(Exception):
+    """
+    A task's worker process died (e.g., it segfaulted or was killed for
+    using too much memory) while running the task on its own.
+    """
+
+
+def _crashed(exc):
+    """
+    Is an exception a process pool breaking?
+    """
+    return BrokenProcessPool is not None and isinstance(exc, BrokenProcessPool)
+
+
+def _rss():
+    """
+    The resident set size (in bytes) of the current process, or None
+    if it can't be read from /proc.
+    """
+    if _PAGE_SIZE is None:
+        return None
+
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _tracked_call(directory, token, function, measure=False):
+    """
+    Call a function (in a worker), leaving a marker in a directory for
+    as long as it runs. Markers left behind belong to tasks which were
+    running when their worker died.
+
+    If measure is True, the result is returned with the worker's pid
+    and resident set size.
+    """
+    path = os.path.join(directory, str(token))
+    open(path, 'w').close()
+
+    try:
+        value = function()
+    finally:
+        os.remove(path)
+
+    if measure:
+        return _Measured(value, os.getpid(), _rss())
+
+    return value
+
+
+class _Call(object):
+    """
+    A submitted call, and the future it resolves.
+    """
+    __slots__ = ('token', 'function', 'future', 'crashes')
+
+    def __init__(self, token, function, future):
+        self.token = token
+        self.function = function
+        self.future = future
+        self.crashes = 0
+
+
+class ResilientExecutor(object):
+    """
+    A process pool executor which recovers when a worker dies instead
+    of failing every outstanding task.
+
+    When the pool breaks, it is replaced with a fresh one. Tasks which
+    were running when it broke are suspects (as the pool kills all of
+    its workers when one dies, that's every one of them): each is run
+    again in a quarantine pool of its own, with a single worker, and a
+    task which crashes its worker there fails with WorkerCrashed.
+    Suspects are run side by side (up to max_workers at a time), so a
+    crash costs one rerun of the tasks it interrupted, not a rerun of
+    each in turn. Every other outstanding task (including suspects
+    which run cleanly on their own) is unaffected apart from being
+    resubmitted.
+
+    Workers leave a marker file while running a task so suspects can be
+    told apart from tasks which were just queued. A task caught up in
+    max_crashes crashes without being a suspect (e.g., because it
+    crashes its worker while returning its result) is quarantined too.
+
+    Workers can also be recycled, to stop leaks and fragmentation from
+    growing their memory use over long runs. Once a worker has run
+    max_tasks tasks, or its resident set size (read from /proc, so only
+    on Linux) reaches max_memory bytes, the pool is rotated: new tasks
+    go to a fresh pool, while the old one finishes the tasks it already
+    has and then exits.
+
+    To keep pools small enough to rotate (and to limit how many tasks a
+    crash disrupts), only twice as many tasks as there are workers are
+    handed to the pool at a time. The rest wait in the executor.
+
+    NOTE: Requires Python 3, where broken process pools are detected.
+    """
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None,
+                 initargs=(), max_crashes=3, max_tasks=None,
+                 max_memory=None):
+        """
+        max_workers: (optional, None) The maximum number of worker
+            processes. Defaults to the number of processors.
+        mp_context: (optional, None) The multiprocessing context to
+            start workers with.
+        initializer: (optional, None) A function to call in each worker
+            when it starts.
+        initargs: (optional, ()) Arguments to pass to initializer.
+        max_crashes: (optional, 3) How many crashes a task can be caught
+            up in before it is quarantined regardless.
+        max_tasks: (optional, None) How many tasks a worker can run
+            before the pool is rotated.
+        max_memory: (optional, None) How large (in bytes) a worker's
+            resident set can grow before the pool is rotated.
+        """
+        self._max_workers = max_workers
+        self._kwargs = {}
+
+        if mp_context is not None:
+            self._kwargs['mp_context'] = mp_context
+
+        if initializer is not None:
+            self._kwargs['initializer'] = initializer
+            self._kwargs['initargs'] = tuple(initargs)
+
+        self._max_crashes = max_crashes
+        self._max_tasks = max_tasks
+        self._max_memory = max_memory
+        self._measure = max_tasks is not None or max_memory is not None
+        self._counts = {}  # pid -> tasks run by the current pool
+        self._directory = mkdtemp(prefix='arbiter-markers-')
+        self._tokens = count()
+        self._limit = 2 * (max_workers or cpu_count())
+        self._in_flight = 0
+        self._backlog = deque()
+        self._pool = self._create_pool(max_workers)
+        self._quarantines = set()
+        self._suspects = deque()
+        self._isolating = 0
+        self._max_isolating = max_workers or cpu_count()
+        self._outstanding = set()
+        self._condition = Condition()
+        self._shutdown = False
+        self.crashes = 0
+        self.recycled = 0
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Submit a function to be called in a worker, returning a Future.
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError(
+                    'cannot schedule new futures after shutdown'
+                )
+
+            call = _Call(
+                next(self._tokens), partial(function, *args, **kwargs),
+                concurrent.futures.Future(),
+            )
+            self._outstanding.add(call)
+
+        self._submit(call)
+
+        return call.future
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting tasks and shut down the workers.
+
+        wait: (optional, True) Wait for outstanding tasks (including
+            ones being retried) to finish first.
+        """
+        with self._condition:
+            self._shutdown = True
+
+            while wait and self._outstanding:
+                self._condition.wait()
+
+            pools = [self._pool] + list(self._quarantines)
+
+        for pool in pools:
+            pool.shutdown(wait)
+
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _create_pool(self, workers):
+        """
+        Start a process pool.
+        """
+        return concurrent.futures.ProcessPoolExecutor(workers, **self._kwargs)
+
+    @staticmethod
+    def _retire(pool):
+        """
+        Shut down a pool without waiting for its workers. This happens in
+        another thread, as it's usually called from one of the pool's
+        own callbacks, and a broken pool can still hold the lock
+        shutdown needs while it runs them (it does on Python 3.13).
+        """
+        thread = Thread(target=pool.shutdown, args=(False,))
+        thread.daemon = True
+        thread.start()
+
+    def _submit(self, call):
+        """
+        Submit a call to the main pool (replacing it if it has broken),
+        or add it to the backlog if the pool has enough to do.
+        """
+        with self._condition:
+            if self._in_flight >= self._limit:
+                self._backlog.append(call)
+                return
+
+            self._in_flight += 1
+
+        while True:
+            with self._condition:
+                pool = self._pool
+
+            try:
+                inner = pool.submit(
+                    _tracked_call, self._directory, call.token,
+                    call.function, self._measure,
+                )
+            except Exception as exc:
+                with self._condition:
+                    replaced = self._pool is not pool
+
+                if _crashed(exc):
+                    self._replace(pool)
+                elif not replaced:
+                    self._resolve(call, exc=exc)
+                    self._release()
+                    return
+                # otherwise the pool was shut down after being replaced
+            else:
+                break
+
+        inner.add_done_callback(partial(self._done, pool, call))
+
+    def _replace(self, pool, crashed=True):
+        """
+        Replace the main pool once it has broken (or needs recycling),
+        if it hasn't been already. The old pool finishes any tasks it
+        still can before its workers exit.
+        """
+        with self._condition:
+            if self._pool is not pool:
+                return
+
+            if crashed:
+                self.crashes += 1
+            else:
+                self.recycled += 1
+
+            self._counts = {}
+            self._pool = self._create_pool(self._max_workers)
+
+        self._retire(pool)
+
+    def _check(self, pool, measured):
+        """
+        Recycle the main pool if the worker which produced a result has
+        run too many tasks or grown too large.
+        """
+        with self._condition:
+            if self._pool is not pool:
+                return
+
+            count = self._counts.get(measured.pid, 0) + 1
+            self._counts[measured.pid] = count
+
+        if (
+            (self._max_tasks is not None and count >= self._max_tasks) or
+            (
+                self._max_memory is not None and
+                measured.rss is not None and
+                measured.rss >= self._max_memory
+            )
+        ):
+            self._replace(pool, crashed=False)
+
+    def _done(self, pool, call, inner):
+        """
+        Handle a call finishing in the main pool.
+        """
+        exc = inner.exception()
+
+        if not _crashed(exc):
+            if exc is None and self._measure:
+                self._check(pool, inner.result())
+
+            self._resolve(call, inner)
+        else:
+            self._replace(pool)
+            call.crashes += 1
+
+            marker = os.path.join(self._directory, str(call.token))
+
+            if os.path.exists(marker) or call.crashes >= self._max_crashes:
+                with self._condition:
+                    self._suspects.append(call)
+
+                self._isolate()
+            else:  # innocent: it was only waiting
+                with self._condition:
+                    self._backlog.appendleft(call)
+
+        self._release()
+
+    def _release(self):
+        """
+        Free up a call's place in the main pool, handing it the next
+        call in the backlog.
+        """
+        with self._condition:
+            self._in_flight -= 1
+
+            if not self._backlog:
+                return
+
+            call = self._backlog.popleft()
+
+        self._submit(call)
+
+    def _isolate(self):
+        """
+        Run waiting suspects, each in a quarantine pool of its own, as
+        long as fewer than max_workers are running.
+        """
+        while True:
+            with self._condition:
+                if (
+                    self._isolating >= self._max_isolating or
+                    not self._suspects
+                ):
+                    return
+
+                call = self._suspects.popleft()
+                self._isolating += 1
+                quarantine = self._create_pool(1)
+                self._quarantines.add(quarantine)
+
+            inner = quarantine.submit(
+                _tracked_call, self._directory, call.token, call.function,
+                self._measure,
+            )
+            inner.add_done_callback(
+                partial(self._isolated, quarantine, call)
+            )
+
+    def _isolated(self, quarantine, call, inner):
+        """
+        Handle a suspect finishing in its quarantine pool.
+        """
+        exc = inner.exception()
+
+        if _crashed(exc):
+            with self._condition:
+                self.crashes += 1
+
+            self._resolve(
+                call,
+                exc=WorkerCrashed(
+                    'The worker running the task died: {}'.format(exc)
+                ),
+            )
+        else:
+            self._resolve(call, inner)
+
+        with self._condition:
+            self._isolating -= 1
+            self._quarantines.discard(quarantine)
+
+        self._retire(quarantine)
+        self._isolate()
+
+    def _resolve(self, call, inner=None, exc=None):
+        """
+        Resolve a call's future from the future which ran it (or an
+        exception).
+        """
+        if inner is not None:
+            exc = inner.exception()
+
+        marker = os.path.join(self._directory, str(call.token))
+
+        if os.path.exists(marker):
+            os.remove(marker)
+
+        if exc is None:
+            value = inner.result()
+
+            if self._measure:
+                value = value.value
+
+            call.future.set_result(value)
+        else:
+            call.future.set_exception(exc)
+
+        with self._condition:
+            self._outstanding.discard(call)
+            self._condition.notify_all()
+
+    def __enter__(self):
+        """
+        Enter a context manager. The executor is shut down on exit.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exit the context manager, shutting down the executor.
+        """
+        self.shutdown(True)
@@ -0,0 +1,570 @@
+"""
+A long-lived task runner which keeps its worker pools warm between
+runs.
+"""
+try:
+    from collections.abc import Hashable
+except ImportError:  # Python 2
+    from collections import Hashable
+import concurrent.futures
+from multiprocessing import cpu_count
+from threading import Condition, Lock, Thread
+
+from arbiter.affinity import Affinity, NodeExecutor
+from arbiter.base import task_loop, wait_for
+from arbiter.broadcast import broadcast_shared
+from arbiter.compat import require_pool_initializers
+from arbiter.resilient import ResilientExecutor
+from arbiter.serialize import dump_task
+from arbiter.shared import fork_context, register, unregister
+from arbiter.store import FileStore
+from arbiter.sync import execute as execute_inline
+from arbiter.task import Backend, origin, TaskStore
+
+
+__all__ = ('Runner', 'worker_state')
+
+
+_WORKER_STATE = {}
+
+
+def worker_state():
+    """
+    Get the state preloaded into the current worker. Tasks can use this
+    to access objects that were set up once per worker (models, lookup
+    tables, connections) instead of receiving them as arguments.
+    """
+    return _WORKER_STATE
+
+
+def _initialize(state, initializer, initargs):
+    """
+    Set up a freshly started worker.
+    """
+    if state:
+        _WORKER_STATE.update(state)
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _noop():
+    """
+    A task that does nothing, used to start workers ahead of time.
+    """
+
+
+class _Tenant(object):
+    """
+    The bookkeeping for one run sharing a runner's pools.
+    """
+
+    def __init__(self, weight, order):
+        if weight <= 0:
+            raise ValueError(weight)
+
+        self.weight = weight
+        self.order = order
+        self.positions = {}
+
+
+class _FairShare(object):
+    """
+    Hands out a pool's worker slots to concurrent runs using stride
+    scheduling: each slot a run is given moves it forward by the
+    inverse of its weight, and the next free slot goes to the waiting
+    run which is furthest behind.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._in_flight = 0
+        self._clock = 0.0
+        self._waiting = set()
+        self._condition = Condition()
+
+    def acquire(self, tenant):
+        """
+        Block until the run is allowed to submit a task.
+        """
+        with self._condition:
+            # runs don't bank credit while they have nothing to submit
+            tenant.positions[self] = max(
+                tenant.positions.get(self, self._clock), self._clock
+            )
+            self._waiting.add(tenant)
+
+            while not (
+                self._in_flight < self._capacity and
+                min(self._waiting, key=self._key) is tenant
+            ):
+                self._condition.wait()
+
+            self._waiting.remove(tenant)
+            self._in_flight += 1
+            self._clock = tenant.positions[self]
+            tenant.positions[self] += 1.0 / tenant.weight
+
+            self._condition.notify_all()
+
+    def release(self):
+        """
+        Return a slot once a run's task has finished.
+        """
+        with self._condition:
+            self._in_flight -= 1
+
+            self._condition.notify_all()
+
+    def _key(self, tenant):
+        """
+        The order in which waiting runs are given slots.
+        """
+        return (tenant.positions[self], tenant.order)
+
+
+class Runner(object):
+    """
+    A task runner which owns a set of worker pools (one per backend)
+    and reuses them across calls to run_tasks. Pools are started the
+    first time a task needs them (or when start is called), and run
+    until the runner is shut down.
+    """
+
+    def __init__(self, max_threads=None, max_processes=None,
+                 default=Backend.thread, initializer=None, initargs=(),
+                 state=None, frozen=False, serializer=None,
+                 auto_broadcast=None, shared=None, resilient=False,
+                 max_tasks_per_worker=None, max_worker_memory=None,
+                 affinity=None, locality=False):
+        """
+        max_threads: (optional, None) The maximum number of threads to
+            use for thread-backed tasks.
+        max_processes: (optional, None) The maximum number of processes
+            to use for process-backed tasks.
+        default: (optional, Backend.thread) The backend to use for
+            tasks that don't have a hint.
+        initializer: (optional, None) A function to call in each worker
+            when it starts (e.g., to import heavy modules).
+        initargs: (optional, ()) Arguments to pass to initializer.
+        state: (optional, None) A dict of objects to preload into each
+            worker, accessible from tasks through worker_state.
+            NOTE: For process pools the state is pickled once per
+            worker.
+            NOTE: initializer and state require Python 3.7 or later.
+        frozen: (optional, False) Freeze each run's dependency graph
+            once its tasks have been added, tracking remaining
+            dependencies with counters (see Scheduler).
+        serializer: (optional, None) The Serializer (see
+            arbiter.serialize) to send tasks to, and results back from,
+            process workers with. Tasks can override it with their own.
+            If neither is given, the process pool pickles them itself.
+        auto_broadcast: (optional, None) A size in bytes. If given,
+            arguments at least this big (when pickled) which are shared
+            by several process-backed tasks in a run are sent to each
+            worker once instead of with every task (see
+            arbiter.broadcast.broadcast_shared).
+        shared: (optional, None) A dict of large read-only objects to
+            share with workers without serializing them, accessible
+            from tasks through arbiter.shared.shared. They are
+            registered before the process pool starts, and its workers
+            are forked (with the fork start method, so not on Windows)
+            and inherit them copy-on-write. The state is inherited too.
+            NOTE: Objects are registered globally by name, so runners
+            sharing different objects should use different names.
+        resilient: (optional, False) Recover from process workers
+            crashing (see arbiter.resilient.ResilientExecutor): only
+            the task which crashed its worker fails, and the rest of
+            the run carries on.
+        max_tasks_per_worker: (optional, None) Recycle process workers
+            once one has run this many tasks. Implies resilient.
+        max_worker_memory: (optional, None) Recycle process workers
+            once one's resident set size (read from /proc, so only on
+            Linux) reaches this many bytes. Implies resilient.
+            NOTE: Workers are recycled by rotating the whole pool (see
+            arbiter.resilient.ResilientExecutor). Tasks already
+            submitted to the old pool still run there.
+        affinity: (optional, None) Pin process workers to CPUs, with
+            an arbiter.affinity.Affinity or the name of a strategy
+            ('compact', 'spread' or 'numa').
+        locality: (optional, False) Run a process pool per NUMA node
+            (see arbiter.affinity.NodeExecutor), with workers pinned to
+            their node, and send each process-backed task to the node
+            where most of its dependencies ran. The nodes are taken
+            from affinity if it's an Affinity.
+            NOTE: affinity and locality require Python 3.7 or later.
+        """
+        if state or initializer is not None:
+            require_pool_initializers("Worker initializers and state")
+
+        if affinity is not None or locality:
+            require_pool_initializers("Pinning workers to CPUs")
+
+        self._max_workers = {
+            Backend.thread: max_threads,
+            Backend.process: max_processes,
+        }
+        self._default = default
+        self._initializer = initializer
+        self._initargs = tuple(initargs)
+        self._state = state
+        self._frozen = frozen
+        self._serializer = serializer
+        self._auto_broadcast = auto_broadcast
+        self._shared = dict(shared or {})
+        self._resilient = resilient
+        self._recycling = {}
+        self._affinity = affinity
+        self._locality = locality
+
+        if isinstance(affinity, str):
+            self._affinity = Affinity(affinity)
+
+        if max_tasks_per_worker is not None:
+            self._recycling['max_tasks'] = max_tasks_per_worker
+
+        if max_worker_memory is not None:
+            self._recycling['max_memory'] = max_worker_memory
+        self._executors = {}
+        self._shares = {}
+        self._submitted = set()
+        self._order = 0
+        self._lock = Lock()
+
+        if self._shared:
+            register(self._shared)
+
+    def start(self, *backends):
+        """
+        Start the pools for the given backends (all pooled backends if
+        none are given), and wait until their workers are running.
+        """
+        if not backends:
+            backends = tuple(self._max_workers)
+
+        for backend in backends:
+            if backend == Backend.inline:
+                continue
+
+            executor = self._get_executor(backend)
+            workers = self._max_workers[backend] or cpu_count()
+
+            concurrent.futures.wait(
+                [executor.submit(_noop) for _ in range(workers)]
+            )
+
+    def run_tasks(self, tasks, store=None, weight=1, profiler=None,
+                  hooks=None, lazy=False, resume=False, targets=None):
+        """
+        Run an iterable of tasks, executing each one on the backend it
+        hints at.
+
+        tasks: The iterable of tasks
+        store: (optional, None) The TaskStore to keep results in. If
+            not given, each run gets a fresh store.
+        weight: (optional, 1) The run's share of the pools relative to
+            other runs happening at the same time.
+        profiler: (optional, None) A Profiler to record task timings
+            with.
+        hooks: (optional, None) An iterable of task loop hooks (see
+            arbiter.base.task_loop).
+        lazy: (optional, False) Pass results between tasks by reference
+            through the store (see arbiter.base.task_loop). If no store
+            is given, the run gets a temporary FileStore.
+        resume: (optional, False) Skip tasks whose results are already
+            in the store (see arbiter.base.task_loop).
+        targets: (optional, None) The names of the tasks to run. Only
+            they and the tasks they depend on are run.
+        """
+        return self._run(
+            tuple(tasks), store, self._tenant(weight), profiler, hooks,
+            lazy, resume, targets,
+        )
+
+    def submit(self, tasks, store=None, weight=1, profiler=None,
+               hooks=None, lazy=False, resume=False, targets=None):
+        """
+        Run an iterable of tasks in the background, alongside any other
+        runs. Runs share the runner's pools but are otherwise separate,
+        so task names only need to be unique within a run.
+
+        Returns a Future which resolves to the run's Results.
+
+        tasks: The iterable of tasks
+        store: (optional, None) The TaskStore to keep results in. If
+            not given, the run gets a fresh store.
+        weight: (optional, 1) The run's share of the pools relative to
+            other runs happening at the same time. A run with weight 2
+            gets twice as many workers as a run with weight 1 when both
+            have tasks waiting.
+        profiler: (optional, None) A Profiler to record task timings
+            with.
+        hooks: (optional, None) An iterable of task loop hooks (see
+            arbiter.base.task_loop).
+        lazy: (optional, False) Pass results between tasks by reference
+            through the store (see arbiter.base.task_loop). If no store
+            is given, the run gets a temporary FileStore.
+        resume: (optional, False) Skip tasks whose results are already
+            in the store (see arbiter.base.task_loop).
+        targets: (optional, None) The names of the tasks to run. Only
+            they and the tasks they depend on are run.
+        """
+        tasks = tuple(tasks)
+        tenant = self._tenant(weight)
+        future = concurrent.futures.Future()
+
+        def run():
+            """
+            Run the tasks, resolving the future.
+            """
+            try:
+                future.set_result(
+                    self._run(
+                        tasks, store, tenant, profiler, hooks, lazy, resume,
+                        targets,
+                    )
+                )
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                with self._lock:
+                    self._submitted.discard(future)
+
+        with self._lock:
+            self._submitted.add(future)
+
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+        return future
+
+    def _run(self, tasks, store, tenant, profiler, hooks, lazy, resume,
+             targets):
+        """
+        Run a tuple of tasks for a tenant.
+        """
+        if store is None:
+            if lazy:
+                with FileStore() as store:
+                    return self._run(
+                        tasks, store, tenant, profiler, hooks, lazy, resume,
+                        targets,
+                    )
+
+            store = TaskStore()
+
+        hooks = tuple(hooks or ())
+        backends = {}
+        serializers = {}
+        dependencies = {}
+        placements = {}  # task name -> the NUMA node it ran on
+        broadcasts = ()
+
+        if self._auto_broadcast is not None:
+            tasks, broadcasts = self._broadcast(tasks)
+
+        for task in tasks:
+            if isinstance(task.name, Hashable):
+                backends[task.name] = task.backend or self._default
+
+                if task.serializer is not None:
+                    serializers[task.name] = task.serializer
+
+                if self._locality:
+                    dependencies[task.name] = task.dependencies
+
+        futures = set()
+
+        def execute(function, name):
+            """
+            Run a task inline, or submit it to the pool for its backend
+            once the run's share allows it.
+            """
+            # array elements and batches run where their tasks were told to
+            key = origin(name)
+            backend = backends.get(key, self._default)
+
+            if backend == Backend.inline:
+                return execute_inline(function, name)
+
+            serializer = None
+
+            if backend == Backend.process:
+                serializer = serializers.get(key, self._serializer)
+
+            if serializer is not None:
+                function = dump_task(serializer, function, name, hooks)
+
+            executor = self._get_executor(backend)
+            share = self._shares[backend]
+
+            share.acquire(tenant)
+
+            try:
+                if self._locality and backend == Backend.process:
+                    node = executor.place(
+                        placements.get(dependency)
+                        for dependency in dependencies.get(key, ())
+                    )
+                    future = executor.submit_to(node, function)
+                    placements[key] = node
+                else:
+                    future = executor.submit(function)
+            except BaseException:
+                share.release()
+                raise
+
+            future.name = name
+            future.serialized = serializer is not None
+            future.add_done_callback(lambda _: share.release())
+
+            futures.add(future)
+
+        def wait():
+            """
+            Wait for at least one task to complete
+            """
+            return wait_for(futures, hooks)
+
+        try:
+            return task_loop(
+                tasks, execute, wait, store=store, profiler=profiler,
+                hooks=hooks, frozen=self._frozen, lazy=lazy, resume=resume,
+                targets=targets,
+            )
+        finally:
+            for broadcast in broadcasts:
+                broadcast.close()
+
+    def _broadcast(self, tasks):
+        """
+        Broadcast the large arguments shared by a run's process-backed
+        tasks, returning the new tasks and the broadcasts.
+        """
+        processes = []
+        others = []
+
+        for task in tasks:
+            if (task.backend or self._default) == Backend.process:
+                processes.append(task)
+            else:
+                others.append(task)
+
+        processes, broadcasts = broadcast_shared(
+            processes, self._auto_broadcast
+        )
+
+        return tuple(others + processes), broadcasts
+
+    def _tenant(self, weight):
+        """
+        Create the bookkeeping for a new run.
+        """
+        with self._lock:
+            self._order += 1
+
+            return _Tenant(weight, self._order)
+
+    def shutdown(self, wait=True):
+        """
+        Stop all of the runner's pools.
+
+        wait: (optional, True) Block until all submitted runs have
+            finished and all workers have exited.
+        """
+        with self._lock:
+            submitted = tuple(self._submitted)
+
+        if wait:
+            concurrent.futures.wait(submitted)
+
+        with self._lock:
+            executors, self._executors = self._executors, {}
+
+        for executor in executors.values():
+            executor.shutdown(wait)
+
+        if self._shared:
+            unregister(self._shared)
+
+    def _get_executor(self, backend):
+        """
+        Get the pool for a backend, starting it if necessary.
+        """
+        with self._lock:
+            executor = self._executors.get(backend)
+
+            if executor is None:
+                executor = self._create_executor(backend)
+                self._executors[backend] = executor
+
+                if backend not in self._shares:
+                    self._shares[backend] = _FairShare(
+                        self._max_workers[backend] or cpu_count()
+                    )
+
+            return executor
+
+    def _create_executor(self, backend):
+        """
+        Create a new pool for a backend.
+        """
+        kwargs = {}
+
+        if self._state or self._initializer is not None:
+            kwargs['initializer'] = _initialize
+            kwargs['initargs'] = (
+                self._state, self._initializer, self._initargs
+            )
+
+        workers = self._max_workers[backend]
+
+        if backend != Backend.process:
+            return concurrent.futures.ThreadPoolExecutor(workers, **kwargs)
+
+        if self._resilient or self._recycling:
+            get_executor = ResilientExecutor
+            kwargs.update(self._recycling)
+        else:
+            get_executor = concurrent.futures.ProcessPoolExecutor
+
+        if self._shared:
+            # workers forked from here on inherit the objects
+            register(self._shared)
+            context = fork_context()
+
+            if context is not None:
+                kwargs['mp_context'] = context
+
+        if self._locality:
+            nodes = None
+
+            if self._affinity is not None:
+                nodes = self._affinity.nodes
+
+            return NodeExecutor(
+                workers, nodes, executor=get_executor, **kwargs
+            )
+
+        if self._affinity is not None:
+            kwargs.update(
+                self._affinity.pool_kwargs(
+                    workers or cpu_count(), kwargs.get('mp_context'),
+                    kwargs.get('initializer'), kwargs.get('initargs', ()),
+                )
+            )
+
+        return get_executor(workers, **kwargs)
+
+    def __enter__(self):
+        """
+        Enter a context manager. The runner is shut down on exit.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exit the context manager, shutting down all pools.
+        """
+        self.shutdown()
@@ -1,20 +1,63 @@
 """
 The dependency scheduler.
 """
-from collections import Hashable
-
+try:
+    from collections.abc import Hashable
+except ImportError:  # Python 2
+    from collections import Hashable
+from collections import deque
+from threading import Condition, RLock
+from time import time
+
+from arbiter.compact import CompactGraph, CountingGraph
 from arbiter.graph import Graph, Strategy
+from arbiter.task import Element, element, TaskArray
+
+
+__all__ = ('ConcurrentScheduler', 'Scheduler')
 
 
-__all__ = ('Scheduler',)
+class _Array(object):
+    """
+    The progress of a task array whose elements are being run.
+    """
+    __slots__ = ('task', 'size', 'started', 'finished')
+
+    def __init__(self, task):
+        self.task = task
+        self.size = len(task.items)
+        self.started = 0
+        self.finished = 0
 
 
 class Scheduler(object):
     """
     A dependency scheduler.
+
+    Task arrays (see arbiter.task.create_task_array) are kept in the
+    dependency graph as a single node. Once the array is runnable,
+    start_task hands out its elements one at a time; the array node
+    completes (unblocking its dependents) when every element has.
     """
 
-    def __init__(self, tasks=None, completed=None, failed=None):
+    def __init__(self, tasks=None, completed=None, failed=None, hooks=None,
+                 frozen=False):
+        """
+        tasks: (optional, None) An iterable of tasks to add.
+        completed: (optional, None) A set to add completed task names
+            to.
+        failed: (optional, None) A set to add failed task names to.
+        hooks: (optional, None) An iterable of functions to call with
+            ('graph_remove', name, seconds) whenever a task is removed
+            from the dependency graph.
+        frozen: (optional, False) If True, the dependency graph is
+            built as a CountingGraph when the scheduler is entered as a
+            context manager (until then, tasks are only collected, and
+            none are runnable). Completing a task then only decrements
+            counters instead of rewriting the graph, and tasks are
+            started in the order they became runnable, but no more tasks
+            can be added.
+        """
         if completed is None:
             completed = set()
 
@@ -23,9 +66,13 @@ class Scheduler(object):
 
         self._graph = Graph()
         self._tasks = {}
+        self._arrays = {}
         self._running = set()
         self._completed = completed
         self._failed = failed
+        self._hooks = tuple(hooks or ())
+        self._edges = [] if frozen else None  # (name, parents) to freeze
+        self._ready = None  # the frozen graph's ready queue
 
         if tasks is not None:
             for task in tasks:
@@ -70,12 +117,18 @@ class Scheduler(object):
         Add a task to the scheduler.
 
         task: The task to add.
+
+        NOTE: Tasks can't be added to a frozen scheduler once it has
+            been entered.
         """
         if not self._valid_name(task.name):
             raise ValueError(task.name)
 
         self._tasks[task.name] = task
 
+        if isinstance(task, TaskArray):
+            self._arrays[task.name] = _Array(task)
+
         incomplete_dependencies = set()
 
         for dependency in task.dependencies:
@@ -88,11 +141,99 @@ class Scheduler(object):
             if dependency not in self._completed:
                 incomplete_dependencies.add(dependency)
         else:  # task hasn't failed
+            if self._edges is not None:
+                self._edges.append((task.name, incomplete_dependencies))
+                return
+
             try:
                 self._graph.add(task.name, incomplete_dependencies)
             except ValueError:
                 self._cascade_failure(task.name)
 
+    def restrict(self, targets):
+        """
+        Drop every task that isn't needed for a set of target tasks
+        (i.e., isn't a target or an ancestor of one). Dropped tasks are
+        neither completed nor failed; they just won't run. Returns the
+        set of dropped task names.
+
+        Raises a KeyError if a target isn't a known task (including
+        names which tasks depend on but which were never added), rather
+        than running nothing.
+
+        targets: An iterable of task names.
+
+        NOTE: This should be called before any tasks are started (and,
+            for a frozen scheduler, before it is entered).
+        """
+        if self._edges is not None:
+            return self._restrict_edges(targets)
+
+        keep = set()
+
+        for target in targets:
+            if target in self._tasks and target in self._graph:
+                keep.add(target)
+                keep.update(self._graph.ancestors(target))
+            elif not (target in self._completed or target in self._failed):
+                raise KeyError(target)
+
+        removed = set()
+
+        # everything outside an ancestor closure is closed under descent,
+        # so each removal takes a whole branch with it
+        for name in frozenset(self._graph.nodes) - keep:
+            if name in self._graph:
+                removed.update(self._graph.remove(name, Strategy.remove))
+
+        dropped = set()
+
+        for name in removed:
+            self._arrays.pop(name, None)
+
+            if self._tasks.pop(name, None) is not None:
+                dropped.add(name)
+
+        return dropped
+
+    def _restrict_edges(self, targets):
+        """
+        Restrict the tasks of a frozen scheduler which hasn't been
+        entered yet (see restrict).
+        """
+        parents = dict(self._edges)
+        keep = set()
+        stack = []
+
+        for target in targets:
+            if target in parents:
+                stack.append(target)
+            elif not (target in self._completed or target in self._failed):
+                raise KeyError(target)
+
+        while stack:
+            current = stack.pop()
+
+            if current not in keep:
+                keep.add(current)
+                stack.extend(
+                    parent for parent in parents.get(current, ())
+                    if parent not in keep
+                )
+
+        self._edges = [edge for edge in self._edges if edge[0] in keep]
+
+        dropped = set()
+
+        for name in parents:
+            if name not in keep:
+                self._arrays.pop(name, None)
+
+                if self._tasks.pop(name, None) is not None:
+                    dropped.add(name)
+
+        return dropped
+
     def start_task(self, name=None):
         """
         Start a task.
@@ -103,23 +244,79 @@ class Scheduler(object):
         name: (optional, None) The task to start. If a name is given,
             Scheduler will attempt to start the task (and raise an
             exception if the task doesn't exist or isn't runnable). If
-            no name is given, a task will be chosen arbitrarily
+            no name is given, a task will be chosen arbitrarily. Naming
+            a task array starts its next element.
         """
         if name is None:
-            for possibility in self._graph.roots:
-                if possibility not in self._running:
-                    name = possibility
-                    break
-            else:  # all tasks blocked/running/completed/failed
+            name = self._next_runnable()
+
+            if name is None:  # all tasks blocked/running/completed/failed
                 return None
         else:
             if name not in self._graph.roots or name in self._running:
                 raise ValueError(name)
 
+        array = self._arrays.get(name)
+
+        if array is not None:
+            if not array.size:  # nothing to run
+                self._finish_array(name)
+
+                return self.start_task()
+
+            if array.started >= array.size:
+                raise ValueError(name)
+
+            task = element(array.task, array.started)
+            array.started += 1
+            self._running.add(task.name)
+
+            return task
+
         self._running.add(name)
 
         return self._tasks[name]
 
+    def _next_runnable(self):
+        """
+        Choose a runnable task (or a task array with elements left to
+        start). Returns its name, or None if there isn't one.
+        """
+        if self._ready is None:
+            for possibility in self._graph.roots:
+                array = self._arrays.get(possibility)
+
+                if array is None:
+                    if possibility not in self._running:
+                        return possibility
+                elif array.started < array.size or not array.size:
+                    return possibility
+
+            return None
+
+        # frozen: take roots in the order they became runnable
+        ready = self._ready
+        roots = self._graph.roots
+
+        while ready:
+            possibility = ready.popleft()
+
+            if possibility not in roots:  # completed or failed since
+                continue
+
+            array = self._arrays.get(possibility)
+
+            if array is None:
+                if possibility not in self._running:
+                    return possibility
+            elif array.started < array.size or not array.size:
+                if array.started + 1 < array.size:
+                    ready.appendleft(possibility)  # more elements to start
+
+                return possibility
+
+        return None
+
     def end_task(self, name, success=True):
         """
         End a running task. Raises an exception if the task isn't
@@ -130,9 +327,26 @@ class Scheduler(object):
         """
         self._running.remove(name)
 
-        if success:
+        if isinstance(name, Element) and name.array in self._tasks:
+            array = self._arrays.get(name.array)
+
+            if success:
+                self._completed.add(name)
+
+                if array is not None:
+                    array.finished += 1
+
+                    if array.finished == array.size:
+                        self._finish_array(name.array)
+            else:
+                self._failed.add(name)
+
+                if array is not None:  # the first failure fails the array
+                    del self._arrays[name.array]
+                    self._cascade_failure(name.array)
+        elif success:
             self._completed.add(name)
-            self._graph.remove(name, strategy=Strategy.orphan)
+            self._remove(name, Strategy.orphan)
         else:
             self._cascade_failure(name)
 
@@ -148,7 +362,10 @@ class Scheduler(object):
         failed.
         """
         self._failed.update(self._graph.nodes)
+        self._failed.update(self._running)  # including array elements
         self._graph = Graph()
+        self._ready = None
+        self._arrays = {}
         self._running = set()
 
     def _cascade_failure(self, name):
@@ -158,19 +375,74 @@ class Scheduler(object):
         name: The name of the offending task
         """
         if name in self._graph:
-            self._failed.update(
-                self._graph.remove(name, strategy=Strategy.remove)
-            )
+            removed = self._remove(name, Strategy.remove)
+
+            for array in removed & frozenset(self._arrays):
+                del self._arrays[array]
+
+            self._failed.update(removed)
         else:
             self._failed.add(name)
 
+    def _finish_array(self, name):
+        """
+        Complete a task array whose elements have all succeeded.
+        """
+        del self._arrays[name]
+        self._completed.add(name)
+        self._remove(name, Strategy.orphan)
+
+    def _freeze(self, edges):
+        """
+        Build the counting graph for a frozen scheduler from the
+        (name, parents) pairs of its tasks.
+        """
+        try:
+            return CountingGraph(CompactGraph(edges))
+        except ValueError:  # a cycle or duplicate: fail the tasks involved
+            self._graph = Graph()
+
+            for name, parents in edges:
+                try:
+                    self._graph.add(name, parents)
+                except ValueError:
+                    self._cascade_failure(name)
+
+            return CountingGraph(self._graph)
+
+    def _remove(self, name, strategy):
+        """
+        Remove a task from the dependency graph, timing the removal if
+        there are any hooks.
+
+        name: The name of the task.
+        strategy: How to handle the task's children.
+        """
+        if not self._hooks:
+            return self._graph.remove(name, strategy=strategy)
+
+        started = time()
+        removed = self._graph.remove(name, strategy=strategy)
+        elapsed = time() - started
+
+        for hook in self._hooks:
+            hook('graph_remove', name, elapsed)
+
+        return removed
+
     def __enter__(self):
         """
         Remove all unrunnable tasks and enter a context manager. When
         the context manager is exited, all non-complete tasks will be
         failed.
         """
+        if self._edges is not None:
+            edges, self._edges = self._edges, None
+            self._graph = self._freeze(edges)
+            self._ready = self._graph.ready
+
         self.remove_unrunnable()
+
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -186,3 +458,200 @@ class Scheduler(object):
         Check whether a name is valid as a task name.
         """
         return name is not None and isinstance(name, Hashable)
+
+
+class ConcurrentScheduler(Scheduler):
+    """
+    A Scheduler which can be driven from many threads at once: each of
+    a runner's worker threads can start tasks, and end them, itself
+    rather than going through a single scheduling thread.
+
+    Runnable tasks are kept in a ready queue (a deque, whose appends and
+    pops are atomic), and starting a task just claims one from it, so
+    threads never take a lock to start a task or scan the graph's roots
+    for one. The dependency graph is guarded by a lock which is only
+    held while it changes: when a task ends (queueing any tasks that
+    have become runnable) and while a thread with nothing to run checks
+    the queue before blocking in next_task. Task arrays are the
+    exception, as handing out an element also takes the lock.
+    """
+
+    def __init__(self, tasks=None, completed=None, failed=None, hooks=None,
+                 frozen=False):
+        self._condition = Condition(RLock())
+        self._feed = False  # queue the roots that removals leave
+
+        super(ConcurrentScheduler, self).__init__(
+            tasks, completed, failed, hooks, frozen
+        )
+
+    @property
+    def completed(self):
+        with self._condition:
+            return frozenset(self._completed)
+
+    @property
+    def failed(self):
+        with self._condition:
+            return frozenset(self._failed)
+
+    @property
+    def running(self):
+        with self._condition:
+            return frozenset(self._running)
+
+    @property
+    def runnable(self):
+        with self._condition:
+            return frozenset(self._graph.roots - self._running)
+
+    def is_finished(self):
+        with self._condition:
+            return super(ConcurrentScheduler, self).is_finished()
+
+    def add_task(self, task):
+        with self._condition:
+            super(ConcurrentScheduler, self).add_task(task)
+
+            if self._feed and task.name in self._graph.roots:
+                self._ready.append(task.name)
+
+            self._condition.notify_all()
+
+    def restrict(self, targets):
+        with self._condition:
+            return super(ConcurrentScheduler, self).restrict(targets)
+
+    def start_task(self, name=None):
+        if self._ready is None:  # not entered yet
+            with self._condition:
+                return super(ConcurrentScheduler, self).start_task(name)
+
+        if name is None:
+            return self._claim()
+
+        with self._condition:
+            try:  # take it out of the queue so no other thread starts it
+                self._ready.remove(name)
+            except ValueError:
+                raise ValueError(name)
+
+            task = super(ConcurrentScheduler, self).start_task(name)
+            array = self._arrays.get(name)
+
+            if array is not None and array.started < array.size:
+                self._ready.appendleft(name)
+
+            return task
+
+    def _claim(self):
+        """
+        Start the next task in the ready queue, if there is one.
+        Returns the task, or None if the queue is empty.
+        """
+        ready = self._ready
+
+        while True:
+            try:
+                name = ready.popleft()
+            except IndexError:
+                return None
+
+            if name not in self._graph.roots:  # completed or failed since
+                continue
+
+            array = self._arrays.get(name)
+
+            if array is None:
+                if name in self._running:
+                    continue
+
+                self._running.add(name)
+
+                return self._tasks[name]
+
+            with self._condition:
+                if name not in self._arrays:  # failed since
+                    continue
+
+                if not array.size:  # nothing to run
+                    self._finish_array(name)
+                    self._condition.notify(len(self._ready))
+
+                    continue
+
+                if array.started >= array.size:  # claimed elsewhere
+                    continue
+
+                task = element(array.task, array.started)
+                array.started += 1
+                self._running.add(task.name)
+
+                if array.started < array.size:
+                    ready.appendleft(name)
+                    self._condition.notify()
+
+                return task
+
+    def next_task(self):
+        """
+        Start a task, waiting for one to become runnable if necessary.
+        Returns None once every task has finished.
+        """
+        while True:
+            task = self.start_task()
+
+            if task is not None:
+                return task
+
+            with self._condition:
+                if self._ready:  # queued since
+                    continue
+
+                if super(ConcurrentScheduler, self).is_finished():
+                    return None
+
+                self._condition.wait()
+
+    def end_task(self, name, success=True):
+        with self._condition:
+            try:
+                super(ConcurrentScheduler, self).end_task(name, success)
+            finally:
+                if super(ConcurrentScheduler, self).is_finished():
+                    self._condition.notify_all()
+                elif self._ready:
+                    self._condition.notify(len(self._ready))
+
+    def remove_unrunnable(self):
+        with self._condition:
+            super(ConcurrentScheduler, self).remove_unrunnable()
+            self._condition.notify_all()
+
+    def fail_remaining(self):
+        with self._condition:
+            super(ConcurrentScheduler, self).fail_remaining()
+            self._ready = deque()
+            self._feed = False
+            self._condition.notify_all()
+
+    def _remove(self, name, strategy):
+        if not self._feed or strategy != Strategy.orphan:
+            return super(ConcurrentScheduler, self)._remove(name, strategy)
+
+        children = frozenset(self._graph.children(name))
+        removed = super(ConcurrentScheduler, self)._remove(name, strategy)
+        roots = self._graph.roots
+        self._ready.extend(child for child in children if child in roots)
+
+        return removed
+
+    def __enter__(self):
+        with self._condition:
+            super(ConcurrentScheduler, self).__enter__()
+
+            if self._ready is None:  # frozen graphs keep their own queue
+                self._ready = deque(self._graph.roots)
+                self._feed = True
+
+            return self
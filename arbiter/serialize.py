@@ -0,0 +1,277 @@
+"""
+Serializers for sending tasks to, and results back from, process
+workers.
+"""
+from collections import namedtuple
+from functools import partial
+import pickle
+from time import time
+
+from arbiter.profiler import Timed
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+
+__all__ = (
+    'ArrowSerializer', 'CloudPickleSerializer', 'MsgpackSerializer',
+    'PickleSerializer', 'Serializer',
+)
+
+
+Serialized = namedtuple('Serialized', ('serializer', 'frames'))
+
+
+class Serializer(object):
+    """
+    The serializer interface. A serializer turns an object into a list
+    of frames (bytes-like objects) and back. Serializers are themselves
+    pickled and sent to workers, so they should be cheap to pickle.
+    """
+
+    def dumps(self, obj):
+        """
+        Serialize an object into a list of frames.
+        """
+        raise NotImplementedError()
+
+    def loads(self, frames):
+        """
+        Rebuild an object from a list of frames.
+        """
+        raise NotImplementedError()
+
+
+class PickleSerializer(Serializer):
+    """
+    Pickle objects.
+
+    NOTE: Large buffers aren't sent out-of-band (pickle protocol 5):
+        the process pool pickles the frames again to send them, so
+        separate buffer frames would only add a copy.
+    """
+
+    def __init__(self, protocol=None):
+        """
+        protocol: (optional, None) The pickle protocol to use. Defaults
+            to the highest available.
+        """
+        if protocol is None:
+            protocol = pickle.HIGHEST_PROTOCOL
+
+        self.protocol = protocol
+
+    def dumps(self, obj):
+        return [self._dumps(obj, self.protocol)]
+
+    def loads(self, frames):
+        return pickle.loads(frames[0])
+
+    @staticmethod
+    def _dumps(obj, protocol):
+        """
+        Pickle an object.
+        """
+        return pickle.dumps(obj, protocol)
+
+
+class CloudPickleSerializer(PickleSerializer):
+    """
+    Pickle objects with cloudpickle, which can also serialize lambdas,
+    closures and interactively defined functions.
+
+    NOTE: Requires cloudpickle.
+    """
+
+    def __init__(self, protocol=None):
+        if cloudpickle is None:
+            raise ImportError('CloudPickleSerializer requires cloudpickle')
+
+        super(CloudPickleSerializer, self).__init__(protocol)
+
+    @staticmethod
+    def _dumps(obj, protocol):
+        return cloudpickle.dumps(obj, protocol)
+
+
+class MsgpackSerializer(Serializer):
+    """
+    Serialize plain data (dicts, lists, strings, numbers) with msgpack,
+    falling back to another serializer for anything else (including
+    the tasks themselves).
+
+    NOTE: Requires msgpack. Tuples come back as lists.
+    """
+
+    def __init__(self, fallback=None):
+        """
+        fallback: (optional, None) The serializer to use for objects
+            msgpack can't handle. Defaults to a PickleSerializer.
+        """
+        if msgpack is None:
+            raise ImportError('MsgpackSerializer requires msgpack')
+
+        self.fallback = fallback or PickleSerializer()
+
+    def dumps(self, obj):
+        try:
+            return [b'msgpack', msgpack.packb(obj, use_bin_type=True)]
+        except (TypeError, ValueError, OverflowError):
+            return [b''] + self.fallback.dumps(obj)
+
+    def loads(self, frames):
+        if frames[0] == b'msgpack':
+            return msgpack.unpackb(frames[1], raw=False)
+
+        return self.fallback.loads(frames[1:])
+
+
+class ArrowSerializer(Serializer):
+    """
+    Serialize Arrow tables and record batches in the Arrow IPC stream
+    format, falling back to another serializer for anything else
+    (including the tasks themselves).
+
+    NOTE: Requires pyarrow.
+    """
+
+    def __init__(self, fallback=None):
+        """
+        fallback: (optional, None) The serializer to use for objects
+            which aren't Arrow tables or record batches. Defaults to a
+            PickleSerializer.
+        """
+        if pyarrow is None:
+            raise ImportError('ArrowSerializer requires pyarrow')
+
+        self.fallback = fallback or PickleSerializer()
+
+    def dumps(self, obj):
+        if isinstance(obj, pyarrow.Table):
+            tag = b'table'
+        elif isinstance(obj, pyarrow.RecordBatch):
+            tag = b'batch'
+        else:
+            return [b''] + self.fallback.dumps(obj)
+
+        sink = pyarrow.BufferOutputStream()
+        writer = pyarrow.ipc.new_stream(sink, obj.schema)
+
+        try:
+            writer.write(obj)
+        finally:
+            writer.close()
+
+        return [tag, sink.getvalue().to_pybytes()]
+
+    def loads(self, frames):
+        tag = frames[0]
+
+        if not tag:
+            return self.fallback.loads(frames[1:])
+
+        reader = pyarrow.ipc.open_stream(frames[1])
+
+        if tag == b'table':
+            return reader.read_all()
+
+        return reader.read_next_batch()
+
+
+def serialize(serializer, obj):
+    """
+    Serialize an object, tagging it with its serializer.
+    """
+    return Serialized(serializer, serializer.dumps(obj))
+
+
+def deserialize(serialized):
+    """
+    Rebuild a serialized object.
+    """
+    return serialized.serializer.loads(serialized.frames)
+
+
+def size(serialized):
+    """
+    The total number of bytes in a serialized object's frames.
+    """
+    return sum(memoryview(frame).nbytes for frame in serialized.frames)
+
+
+def serialized_call(serialized):
+    """
+    Call a serialized function (in a worker), returning its result
+    serialized the same way. Timed results keep their timings
+    readable.
+    """
+    data = deserialize(serialized)()
+
+    if isinstance(data, Timed):
+        return data._replace(data=serialize(serialized.serializer, data.data))
+
+    return serialize(serialized.serializer, data)
+
+
+def dump_task(serializer, function, name, hooks=()):
+    """
+    Serialize a task's function for a worker, returning a function
+    which runs it there (see serialized_call).
+
+    serializer: The Serializer to use.
+    function: The task's function.
+    name: The name of the task.
+    hooks: (optional, ()) Task loop hooks to call with ('serialize',
+        name, seconds) and ('task_bytes', name, bytes).
+    """
+    started = time()
+    serialized = serialize(serializer, function)
+    elapsed = time() - started
+
+    for hook in hooks:
+        hook('serialize', name, elapsed)
+        hook('task_bytes', name, size(serialized))
+
+    return partial(serialized_call, serialized)
+
+
+def load_result(data, name, hooks=()):
+    """
+    Rebuild a result returned by serialized_call.
+
+    data: The (possibly Timed) serialized result.
+    name: The name of the task.
+    hooks: (optional, ()) Task loop hooks to call with ('deserialize',
+        name, seconds) and ('result_bytes', name, bytes).
+    """
+    timed = None
+
+    if isinstance(data, Timed):
+        timed = data
+        data = timed.data
+
+    started = time()
+    value = deserialize(data)
+    elapsed = time() - started
+
+    for hook in hooks:
+        hook('deserialize', name, elapsed)
+        hook('result_bytes', name, size(data))
+
+    if timed is not None:
+        return timed._replace(data=value)
+
+    return value
@@ -0,0 +1,78 @@
+"""
+Read-only objects shared with forked process workers.
+
+Objects registered here before a process pool forks its workers are
+inherited by the workers (copy-on-write, so pages are only copied if
+they're written to) instead of being pickled and sent to them. Tasks
+look them up by name.
+"""
+import multiprocessing
+from threading import Lock
+
+from arbiter.compat import POOL_CONTEXTS
+
+
+__all__ = ('fork_context', 'register', 'shared', 'unregister')
+
+
+_SHARED = {}
+_SHARED_LOCK = Lock()
+
+
+def shared(name):
+    """
+    Get a shared object by name. Works in the process which registered
+    it, and in workers forked from that process after it was
+    registered.
+
+    Raises a KeyError if no object has been registered under the name.
+    """
+    return _SHARED[name]
+
+
+def register(objects):
+    """
+    Register read-only objects to share with workers forked from now
+    on. An object replaces any registered under the same name.
+
+    objects: A dict of names to objects.
+    """
+    with _SHARED_LOCK:
+        _SHARED.update(objects)
+
+
+def unregister(objects):
+    """
+    Stop sharing objects registered with register. Names which have
+    since been registered with other objects are left alone. Workers
+    which have already been forked keep their copies.
+
+    objects: A dict of names to objects.
+    """
+    with _SHARED_LOCK:
+        for name in objects:
+            if _SHARED.get(name) is objects[name]:
+                del _SHARED[name]
+
+
+def fork_context():
+    """
+    Get the multiprocessing context for the fork start method, for
+    pools whose workers need to inherit shared objects. Returns None
+    where process pools don't take a context (before Python 3.7), as
+    long as they will fork anyway.
+
+    Raises a ValueError if the platform can't fork (e.g., Windows), or
+    if pools don't take a context and the default start method isn't
+    fork.
+    """
+    if not POOL_CONTEXTS:
+        # Python 2 always forks on POSIX
+        get_start_method = getattr(multiprocessing, 'get_start_method', None)
+
+        if get_start_method is not None and get_start_method() != 'fork':
+            raise ValueError(get_start_method())
+
+        return None
+
+    return multiprocessing.get_context('fork')
@@ -0,0 +1,780 @@
+"""
+Task stores which can be shared with workers (so task arguments can be
+passed by reference instead of by value) or which compress results.
+"""
+from collections import namedtuple, OrderedDict
+from hashlib import sha1
+import bz2
+from io import BytesIO
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+from tempfile import mkdtemp, NamedTemporaryFile
+from threading import local, Lock
+from time import time
+import zlib
+
+from arbiter.broadcast import Broadcast
+from arbiter.task import batch_results, TaskStore
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+__all__ = (
+    'CODECS', 'CompressedStore', 'FileStore', 'Reference', 'SQLiteStore',
+    'resolve',
+)
+
+
+Reference = namedtuple('Reference', ('store', 'name'))
+
+Codec = namedtuple('Codec', ('compress', 'decompress'))
+Compressed = namedtuple('Compressed', ('codec', 'data'))
+
+# name -> Codec for every codec available in this environment
+CODECS = {
+    'zlib': Codec(zlib.compress, zlib.decompress),
+    'bz2': Codec(bz2.compress, bz2.decompress),
+}
+
+if lzma is not None:
+    CODECS['lzma'] = Codec(lzma.compress, lzma.decompress)
+
+if zstandard is not None:
+    CODECS['zstd'] = Codec(
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+if lz4 is not None:
+    CODECS['lz4'] = Codec(lz4.frame.compress, lz4.frame.decompress)
+
+# containers whose pickled size can be bounded from their contents
+_CONTAINERS = (tuple, list, set, frozenset)
+
+_CACHE = OrderedDict()  # (path, inode, mtime, size) -> value, oldest first
+_CACHE_LOCK = Lock()
+
+_replace = getattr(os, 'replace', os.rename)  # Python 2 has no os.replace
+
+
+class References(list):
+    """
+    A list of References, resolved to a list of values (e.g., the
+    results of a task array's elements).
+    """
+
+
+def resolve(value):
+    """
+    Get the value a Reference (or each value a References list, or a
+    Broadcast) points at. Anything else is returned unchanged.
+    """
+    if isinstance(value, Reference):
+        return value.store.get(value.name)
+
+    if isinstance(value, Broadcast):
+        return value.value
+
+    if isinstance(value, References):
+        return [resolve(item) for item in value]
+
+    return value
+
+
+def resolve_call(function, args, kwargs):
+    """
+    Call a function after resolving any References in its arguments.
+    """
+    return function(
+        *[resolve(arg) for arg in args],
+        **dict((key, resolve(kwargs[key])) for key in kwargs)
+    )
+
+
+def store_call(store, name, function):
+    """
+    Call a function, put its result into a store, and return a
+    Reference to the result. Stores which buffer writes are flushed,
+    so the result can be read from other workers straight away.
+    """
+    store.put(name, function())
+    _flush(store)
+
+    return Reference(store, name)
+
+
+def store_batch_call(store, names, function):
+    """
+    Call a batched function (see arbiter.task.batchable), put each of
+    its results into a store under the name of the task it belongs to,
+    and return References to the results.
+    """
+    values = batch_results(function(), len(names))
+
+    for name, value in zip(names, values):
+        store.put(name, value)
+
+    _flush(store)
+
+    return References(Reference(store, name) for name in names)
+
+
+def _flush(store):
+    """
+    Flush a store's buffered writes, if it buffers them.
+    """
+    flush = getattr(store, 'flush', None)
+
+    if flush is not None:
+        flush()
+
+
+def _size_bound(value, budget=1000):
+    """
+    Cheaply bound how large a value will be once pickled, without
+    pickling it. Only built-in scalars, strings and (small) containers
+    of them are bounded; returns None for anything else.
+
+    budget: (optional, 1000) The most values to look at.
+    """
+    size = 16  # the protocol and frame headers
+    stack = [value]
+
+    while stack:
+        budget -= 1
+
+        if budget < 0:
+            return None
+
+        current = stack.pop()
+        kind = type(current)
+
+        if current is None or kind in (bool, int, float, complex):
+            size += sys.getsizeof(current) + 8
+        elif kind in (bytes, bytearray):
+            size += len(current) + 16
+        elif kind is type(u''):
+            size += 4 * len(current) + 16
+        elif kind in _CONTAINERS:
+            size += 16
+            stack.extend(current)
+        elif kind is dict:
+            size += 16
+            stack.extend(current)
+            stack.extend(current.values())
+        else:
+            return None
+
+    return size
+
+
+class FileStore(object):
+    """
+    A task store which pickles each result to a file in a directory.
+
+    A FileStore can be pickled (only its directory is sent), so workers
+    in other processes can read and write results directly. Each process
+    keeps a small cache of the results it has read most recently, so a
+    worker which runs several tasks with the same argument only loads it
+    once.
+
+    NOTE: Files are named after a hash of each task name's repr, so
+        names need a stable repr (strings, numbers and tuples of them
+        are fine).
+    """
+
+    def __init__(self, directory=None, cache_size=16,
+                 protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        directory: (optional, None) Where to keep results. If not given,
+            a temporary directory is created, which is removed when the
+            store is closed.
+        cache_size: (optional, 16) The number of results each process
+            keeps in memory after reading them. 0 disables the cache.
+        protocol: (optional, pickle.HIGHEST_PROTOCOL) The pickle
+            protocol to write results with.
+        """
+        self._owned = directory is None
+
+        if directory is None:
+            directory = mkdtemp(prefix='arbiter-')
+
+        self.directory = directory
+        self.cache_size = cache_size
+        self.protocol = protocol
+
+    def get(self, name):
+        """
+        Retrieve a task result given its unique task name.
+        """
+        path = self._path(name)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise KeyError(name)
+
+        key = (path, stat.st_ino, stat.st_mtime, stat.st_size)
+
+        if self.cache_size:
+            with _CACHE_LOCK:
+                if key in _CACHE:
+                    value = _CACHE.pop(key)
+                    _CACHE[key] = value
+
+                    return value
+
+        with open(path, 'rb') as fp:
+            value = pickle.load(fp)
+
+        if self.cache_size:
+            with _CACHE_LOCK:
+                _CACHE[key] = value
+
+                while len(_CACHE) > self.cache_size:
+                    _CACHE.popitem(last=False)
+
+        return value
+
+    def put(self, name, value):
+        """
+        Store a task result under its unique task name.
+        """
+        # write then rename, so readers never see a partial file
+        with NamedTemporaryFile(
+            dir=self.directory, prefix='.', delete=False
+        ) as fp:
+            pickle.dump(value, fp, self.protocol)
+
+        _replace(fp.name, self._path(name))
+
+    def reference(self, name):
+        """
+        Get a lightweight, picklable handle to a task result, which can
+        be resolved (with resolve) wherever the store is reachable.
+        """
+        return Reference(self, name)
+
+    def __contains__(self, name):
+        """
+        Check whether a task result has been stored.
+        """
+        return os.path.exists(self._path(name))
+
+    def close(self):
+        """
+        Remove the store's directory if the store created it.
+        """
+        if self._owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._owned = False
+
+    def _path(self, name):
+        """
+        The file a task's result is kept in.
+        """
+        digest = sha1(repr(name).encode('utf-8')).hexdigest()
+
+        return os.path.join(self.directory, digest)
+
+    def __getstate__(self):
+        """
+        Pickle the store without ownership of its directory (only the
+        original store removes it).
+        """
+        state = self.__dict__.copy()
+        state['_owned'] = False
+
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CompressedStore(object):
+    """
+    A task store wrapper which pickles and compresses large results.
+
+    Results whose pickle is at least the threshold are compressed with
+    the codec that currently looks best: the one with the highest
+    measured compression ratio among those compressing at least
+    min_speed bytes a second (or the fastest, if none do). Every codec
+    is measured on the first few large results, and again periodically
+    as the results change. Smaller results are stored as they are.
+
+    Values are only decompressed when they are retrieved.
+    """
+
+    def __init__(self, store=None, threshold=65536, codecs=None,
+                 min_speed=50e6, samples=3, resample=100,
+                 protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        store: (optional, None) The store to keep (compressed) results
+            in. Defaults to a new TaskStore.
+        threshold: (optional, 65536) The size (in pickled bytes) from
+            which results are compressed.
+        codecs: (optional, None) The names of the codecs (in CODECS) to
+            choose from. Defaults to all available codecs.
+        min_speed: (optional, 50e6) The compression speed (in bytes a
+            second) a codec needs to be chosen for its ratio.
+        samples: (optional, 3) The number of large results every codec
+            is measured on before one is chosen.
+        resample: (optional, 100) How often (in large results) every
+            codec is measured again. 0 disables remeasuring.
+        protocol: (optional, pickle.HIGHEST_PROTOCOL) The pickle
+            protocol to serialize results with.
+        """
+        if codecs is None:
+            codecs = sorted(CODECS)
+
+        for codec in codecs:
+            if codec not in CODECS:
+                raise ValueError(codec)
+
+        if not codecs:
+            raise ValueError(codecs)
+
+        self._store = TaskStore() if store is None else store
+        self.threshold = threshold
+        self.codecs = tuple(codecs)
+        self.min_speed = min_speed
+        self.samples = samples
+        self.resample = resample
+        self.protocol = protocol
+
+        self._lock = Lock()
+        self._stats = dict((codec, None) for codec in self.codecs)
+        self._compressed = 0
+        self._raw_bytes = 0
+        self._stored_bytes = 0
+
+    @property
+    def stats(self):
+        """
+        A dict of compression statistics: the number of results
+        compressed, their total bytes before and after compression, the
+        codec currently chosen, and each codec's measured ratio and
+        speed (bytes a second, None until measured).
+        """
+        with self._lock:
+            return {
+                'compressed': self._compressed,
+                'raw_bytes': self._raw_bytes,
+                'stored_bytes': self._stored_bytes,
+                'codec': self._choose(),
+                'codecs': dict(
+                    (codec, None if stats is None else {
+                        'ratio': stats[0], 'speed': stats[1],
+                    })
+                    for codec, stats in self._stats.items()
+                ),
+            }
+
+    def get(self, name):
+        """
+        Retrieve a task result given its unique task name.
+        """
+        value = self._store.get(name)
+
+        if isinstance(value, Compressed):
+            return pickle.loads(CODECS[value.codec].decompress(value.data))
+
+        return value
+
+    def put(self, name, value):
+        """
+        Store a task result under its unique task name. Results which
+        can't be pickled are stored as they are.
+        """
+        size = _size_bound(value)
+
+        if size is not None and size < self.threshold:
+            self._store.put(name, value)  # too small to be worth pickling
+            return
+
+        try:
+            data = pickle.dumps(value, self.protocol)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            self._store.put(name, value)
+            return
+
+        if len(data) < self.threshold:
+            self._store.put(name, value)
+            return
+
+        with self._lock:
+            measure = (
+                self._compressed < self.samples or
+                (
+                    self.resample and self._compressed and
+                    not self._compressed % self.resample
+                )
+            )
+            codec = self._choose()
+
+        if measure:
+            codec, compressed = self._measure(data)
+        else:
+            compressed = CODECS[codec].compress(data)
+
+        with self._lock:
+            self._compressed += 1
+            self._raw_bytes += len(data)
+            self._stored_bytes += len(compressed)
+
+        self._store.put(name, Compressed(codec, compressed))
+
+    def reference(self, name):
+        """
+        Get a lightweight, picklable handle to a task result (see
+        FileStore.reference). Only useful if the wrapped store can be
+        shared with workers.
+        """
+        return Reference(self, name)
+
+    def __contains__(self, name):
+        """
+        Check whether a task result has been stored.
+        """
+        return name in self._store
+
+    def _measure(self, data):
+        """
+        Compress data with every codec, updating their measurements.
+        Returns the name of the chosen codec and the data compressed
+        with it.
+        """
+        results = {}
+
+        for codec in self.codecs:
+            started = time()
+            compressed = CODECS[codec].compress(data)
+            elapsed = max(time() - started, 1e-9)
+
+            results[codec] = compressed
+            ratio = len(data) / float(max(len(compressed), 1))
+            speed = len(data) / elapsed
+
+            with self._lock:
+                previous = self._stats[codec]
+
+                if previous is not None:  # smooth out noisy timings
+                    ratio = (previous[0] + ratio) / 2
+                    speed = (previous[1] + speed) / 2
+
+                self._stats[codec] = (ratio, speed)
+
+        with self._lock:
+            codec = self._choose()
+
+        return codec, results[codec]
+
+    def _choose(self):
+        """
+        Pick the codec to compress with from the measurements so far.
+        Must be called with the lock held.
+        """
+        measured = [
+            (codec, stats) for codec, stats in self._stats.items()
+            if stats is not None
+        ]
+
+        if not measured:
+            return self.codecs[0]
+
+        fast = [
+            (stats[0], codec) for codec, stats in measured
+            if stats[1] >= self.min_speed
+        ]
+
+        if fast:
+            return max(fast)[1]
+
+        return max((stats[1], codec) for codec, stats in measured)[1]
+
+    def __getstate__(self):
+        """
+        Pickle the store without its lock.
+        """
+        state = self.__dict__.copy()
+        del state['_lock']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+
+class SQLiteStore(object):
+    """
+    A task store backed by a SQLite database, so results outlive the
+    run and can be read (and written) from several processes at once.
+
+    The database uses write-ahead logging, so readers don't block the
+    writer. Writes are buffered and committed in batches; buffered
+    results are visible to the process that wrote them straight away,
+    and to other processes once they are flushed (when the batch fills
+    up, on flush or close, and at the end of a run).
+
+    Results are pickled, except for bytes and bytearrays, which are
+    kept as they are and can be read incrementally with open. Large
+    results are written (and read) through SQLite's incremental blob
+    I/O where the sqlite3 module supports it (Python 3.11+).
+
+    A SQLiteStore can be pickled (only its path and settings are sent),
+    and each process and thread using it opens its own connection.
+
+    NOTE: Results are keyed by the repr of their task's name (see
+        FileStore).
+    """
+
+    def __init__(self, path, batch_size=64, timeout=30.0,
+                 blob_threshold=1048576, protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        path: The database file. It is created if it doesn't exist.
+        batch_size: (optional, 64) The number of results to buffer
+            before committing them. 1 commits every result immediately.
+        timeout: (optional, 30.0) How long (in seconds) to wait for
+            another process's write lock.
+        blob_threshold: (optional, 1048576) The size (in bytes) from
+            which results are streamed through the blob API.
+        protocol: (optional, pickle.HIGHEST_PROTOCOL) The pickle
+            protocol to write results with.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.blob_threshold = blob_threshold
+        self.protocol = protocol
+
+        self._setup()
+
+        connection = self._connection()
+
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'name TEXT PRIMARY KEY, raw INTEGER NOT NULL, value BLOB)'
+            )
+
+    def get(self, name):
+        """
+        Retrieve a task result given its unique task name.
+        """
+        key = repr(name)
+
+        with self._lock:
+            if key in self._pending:
+                raw, value = self._pending[key]
+
+                return value if raw else pickle.loads(value)
+
+        row = self._connection().execute(
+            'SELECT rowid, raw, length(value) FROM results WHERE name = ?',
+            (key,)
+        ).fetchone()
+
+        if row is None:
+            raise KeyError(name)
+
+        rowid, raw, size = row
+
+        if self._blobs and size >= self.blob_threshold:
+            with self._connection().blobopen(
+                'results', 'value', rowid, readonly=True
+            ) as blob:
+                data = blob.read()
+        else:
+            data = self._connection().execute(
+                'SELECT value FROM results WHERE rowid = ?', (rowid,)
+            ).fetchone()[0]
+
+        return bytes(data) if raw else pickle.loads(data)
+
+    def put(self, name, value):
+        """
+        Store a task result under its unique task name.
+        """
+        if isinstance(value, (bytes, bytearray)):
+            entry = (True, value)
+        else:
+            entry = (False, pickle.dumps(value, self.protocol))
+
+        with self._lock:
+            self._pending[repr(name)] = entry
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self.flush()
+
+    def open(self, name):
+        """
+        Open a raw (bytes) result as a read-only file-like object, so it
+        can be read incrementally without loading it all at once (where
+        the blob API is available).
+
+        NOTE: Pickled results can't be opened.
+        """
+        self.flush()
+
+        row = self._connection().execute(
+            'SELECT rowid, raw FROM results WHERE name = ?', (repr(name),)
+        ).fetchone()
+
+        if row is None:
+            raise KeyError(name)
+
+        if not row[1]:
+            raise ValueError(name)
+
+        if self._blobs:
+            return self._connection().blobopen(
+                'results', 'value', row[0], readonly=True
+            )
+
+        return BytesIO(self.get(name))
+
+    def flush(self):
+        """
+        Commit any buffered results.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+
+            if not pending:
+                return
+
+            connection = self._connection()
+            small = []
+
+            with connection:
+                for key, (raw, data) in pending.items():
+                    if self._blobs and len(data) >= self.blob_threshold:
+                        rowid = connection.execute(
+                            'INSERT OR REPLACE INTO results VALUES '
+                            '(?, ?, zeroblob(?))',
+                            (key, raw, len(data))
+                        ).lastrowid
+
+                        with connection.blobopen(
+                            'results', 'value', rowid
+                        ) as blob:
+                            blob.write(data)
+                    else:
+                        small.append((key, raw, memoryview(data)))
+
+                connection.executemany(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?)', small
+                )
+
+            # results stay readable from the buffer until committed
+            with self._lock:
+                for key, entry in pending.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+    def reference(self, name):
+        """
+        Get a lightweight, picklable handle to a task result (see
+        FileStore.reference).
+        """
+        return Reference(self, name)
+
+    def close(self):
+        """
+        Commit any buffered results and close this thread's connection.
+        """
+        self.flush()
+
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _setup(self):
+        """
+        Set up the per-process state.
+        """
+        self._pid = os.getpid()
+        self._local = local()
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._pending = {}
+        self._blobs = hasattr(sqlite3.Connection, 'blobopen')
+
+    def _connection(self):
+        """
+        Get this thread's connection, opening it if necessary.
+        """
+        if self._pid != os.getpid():  # forked: nothing can be shared
+            self._setup()
+
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+
+        return connection
+
+    def __contains__(self, name):
+        """
+        Check whether a task result has been stored.
+        """
+        key = repr(name)
+
+        with self._lock:
+            if key in self._pending:
+                return True
+
+        return self._connection().execute(
+            'SELECT 1 FROM results WHERE name = ?', (key,)
+        ).fetchone() is not None
+
+    def __getstate__(self):
+        """
+        Pickle the store's settings (buffered results are flushed, and
+        connections are reopened on the other side).
+        """
+        self.flush()
+
+        return dict(
+            (key, value) for key, value in self.__dict__.items()
+            if key not in (
+                '_pid', '_local', '_lock', '_flush_lock', '_pending', '_blobs'
+            )
+        )
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,18 +2,34 @@
 Synchronous task runner
 """
 from arbiter.base import task_loop, TaskResult
+from arbiter.task import TaskStore
 
 
 __all__ = ('run_tasks',)
 
 
-def run_tasks(tasks):
+def run_tasks(tasks, profiler=None, hooks=None, store=None, resume=False,
+              targets=None):
     """
     Run an iterable of tasks.
 
     tasks: The iterable of tasks
+    profiler: (optional, None) A Profiler to record task timings with.
+    hooks: (optional, None) An iterable of task loop hooks (see
+        arbiter.base.task_loop).
+    store: (optional, None) The store to keep results in.
+    resume: (optional, False) Skip tasks whose results are already in
+        the store (see arbiter.base.task_loop).
+    targets: (optional, None) The names of the tasks to run. Only they
+        and the tasks they depend on are run.
     """
-    return task_loop(tasks, execute)
+    if store is None:
+        store = TaskStore()
+
+    return task_loop(
+        tasks, execute, store=store, profiler=profiler, hooks=hooks,
+        resume=resume, targets=targets,
+    )
 
 
 def execute(function, name):
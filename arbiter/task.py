@@ -2,14 +2,124 @@
 Task creation/generation
 """
 from collections import namedtuple
+try:
+    from collections.abc import Sequence
+except ImportError:  # Python 2
+    from collections import Sequence
+from enum import Enum
 from uuid import uuid4
 
 
 Task = namedtuple(
     'Task',
-    ('name', 'function', 'handler', 'dependencies', 'args', 'kwargs'),
+    (
+        'name', 'function', 'handler', 'dependencies', 'args', 'kwargs',
+        'backend', 'serializer',
+    ),
 )
 
+TaskArray = namedtuple(
+    'TaskArray',
+    (
+        'name', 'function', 'handler', 'dependencies', 'args', 'kwargs',
+        'backend', 'serializer', 'items',
+    ),
+)
+
+Backend = Enum('Backend', ('inline', 'thread', 'process'))
+
+
+class Element(namedtuple('Element', ('array', 'index'))):
+    """
+    The name of one element of a task array: (array name, index). It
+    compares, hashes and prints like a plain tuple, so results can be
+    looked up with (name, index).
+    """
+    __slots__ = ()
+
+    __repr__ = tuple.__repr__
+
+
+class Batch(namedtuple('Batch', ('names',))):
+    """
+    The name of a batch of tasks run together in one call to a
+    batchable function (see batchable).
+    """
+    __slots__ = ()
+
+
+def batchable(max_size=64):
+    """
+    A decorator marking a function as batchable: rather than being
+    called once per task, it is called with a list of inputs (one per
+    task) and must return a sequence of outputs in the same order.
+    Runnable tasks which share a batchable function (and handler,
+    backend and serializer) are coalesced into calls of up to max_size
+    inputs, so per-task overhead is paid once per batch and the
+    function can vectorize (e.g., with NumPy).
+
+    Tasks using a batchable function should take their input as their
+    only argument. Tasks with other arguments call the function
+    normally.
+
+    max_size: (optional, 64) The most tasks to run in one call.
+    """
+    if max_size < 1:
+        raise ValueError(max_size)
+
+    def decorator(function):
+        function.batch_size = max_size
+
+        return function
+
+    return decorator
+
+
+def batch_size(task):
+    """
+    The most tasks a task can be batched with (see batchable), or None
+    if it can't be batched.
+    """
+    if len(task.args) != 1 or task.kwargs:
+        return None
+
+    return getattr(task.function, 'batch_size', None)
+
+
+def batch_results(values, size):
+    """
+    Check what a batchable function returned for a batch of a given
+    size, returning its results as a list.
+
+    Raises a TypeError if the function didn't return a sequence, or a
+    ValueError if it returned the wrong number of results.
+    """
+    try:
+        count = len(values)
+    except TypeError:
+        raise TypeError(
+            "Expected {} results, got {}".format(size, type(values).__name__)
+        )
+
+    if count != size:
+        raise ValueError("Expected {} results, got {}".format(size, count))
+
+    return list(values)
+
+
+def origin(name):
+    """
+    The name of the task a generated task name came from: the array
+    an element belongs to, or the first task in a batch.
+    """
+    if isinstance(name, Batch):
+        name = name.names[0]
+
+    if isinstance(name, Element):
+        name = name.array
+
+    return name
+
 
 def create_task(function, *args, **kwargs):
     """
@@ -19,9 +129,16 @@ def create_task(function, *args, **kwargs):
         and return a False-y value if it fails.
     dependencies: (optional, ()) Any dependencies that this task relies
         on.
+    backend: (optional, None) A Backend hinting where the task should
+        be executed. Runners that don't support hints ignore it.
+    serializer: (optional, None) The Serializer (see arbiter.serialize)
+        to send the task to, and its result back from, a process worker
+        with. Overrides the runner's serializer.
     """
     name = "{}".format(uuid4())
     handler = None
+    backend = None
+    serializer = None
     deps = set()
 
     if 'name' in kwargs:
@@ -34,20 +151,69 @@ def create_task(function, *args, **kwargs):
         handler = kwargs['handler']
         del kwargs['handler']
 
+    if 'backend' in kwargs:
+        backend = kwargs['backend']
+        del kwargs['backend']
+
+    if 'serializer' in kwargs:
+        serializer = kwargs['serializer']
+        del kwargs['serializer']
+
     if 'dependencies' in kwargs:
         for dep in kwargs['dependencies']:
             deps.add(dep)
         del kwargs['dependencies']
 
     for arg in args:
-        if isinstance(arg, Task):
+        if isinstance(arg, (Task, TaskArray)):
             deps.add(arg.name)
 
     for key in kwargs:
-        if isinstance(kwargs[key], Task):
+        if isinstance(kwargs[key], (Task, TaskArray)):
             deps.add(kwargs[key].name)
 
-    return Task(name, function, handler, frozenset(deps), args, kwargs)
+    return Task(
+        name, function, handler, frozenset(deps), args, kwargs, backend,
+        serializer,
+    )
+
+
+def create_task_array(function, items, *args, **kwargs):
+    """
+    Create a task array: one task per item, each calling
+    function(item, *args, **kwargs). Elements are only created when the
+    scheduler starts them, so an array of a million items costs little
+    more than a single task.
+
+    Elements are named Element(array name, index). Tasks which take the
+    array as an argument (or depend on it) run once every element has
+    succeeded, and receive a list of the elements' results. If any
+    element fails, the array fails.
+
+    Accepts the same options as create_task (name, handler,
+    dependencies, backend and serializer), which apply to every
+    element. Other arguments (including tasks) are passed to every
+    element.
+
+    items: A sequence (or iterable) of items, one per element.
+    """
+    task = create_task(function, *args, **kwargs)
+
+    if not isinstance(items, Sequence):
+        items = tuple(items)
+
+    return TaskArray(*(task + (items,)))
+
+
+def element(array, index):
+    """
+    Get the task for one element of a task array.
+    """
+    return Task(
+        Element(array.name, index), array.function, array.handler,
+        array.dependencies, (array.items[index],) + tuple(array.args),
+        array.kwargs, array.backend, array.serializer,
+    )
 
 
 class TaskStore(object):
@@ -69,3 +235,9 @@ class TaskStore(object):
         Retrieve a task result given its unique task name.
         """
         self._results[name] = value
+
+    def __contains__(self, name):
+        """
+        Check whether a task result has been stored.
+        """
+        return name in self._results
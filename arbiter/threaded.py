@@ -0,0 +1,193 @@
+"""
+Threaded task runner, where each worker thread schedules its own tasks.
+
+Unlike arbiter.async (where one thread starts tasks, hands them to a
+thread pool and collects their results), every worker here starts its
+next task, collects its arguments, runs it, stores its result and ends
+it itself, using a ConcurrentScheduler. Workers claim tasks from the
+scheduler's ready queue without taking a lock, and only ending a task
+(which updates the dependency graph) is serialized, so on free-threaded
+builds of Python (3.13t and later) the runner isn't held back by a
+single scheduling thread.
+"""
+from functools import partial
+from multiprocessing import cpu_count
+from threading import Lock, Thread
+from time import time
+
+from arbiter.base import (
+    collect, finish_task, Results, resume_tasks, TaskResult,
+)
+from arbiter.profiler import Timed, timed_call
+from arbiter.scheduler import ConcurrentScheduler
+from arbiter.store import resolve_call
+from arbiter.task import batch_results, batch_size, TaskStore
+
+
+__all__ = ('run_tasks',)
+
+
+def run_tasks(tasks, max_workers=None, profiler=None, hooks=None,
+              store=None, resume=False, targets=None):
+    """
+    Run an iterable of tasks.
+
+    tasks: The iterable of tasks
+    max_workers: (optional, None) The number of worker threads.
+        Defaults to the number of processors.
+    profiler: (optional, None) A Profiler to record task timings with.
+    hooks: (optional, None) An iterable of task loop hooks (see
+        arbiter.base.task_loop). Hooks are called from the worker
+        threads, so must be thread-safe.
+    store: (optional, None) The store to keep results in. It is used
+        from every worker thread.
+    resume: (optional, False) Skip tasks whose results are already in
+        the store (see arbiter.base.task_loop).
+    targets: (optional, None) The names of the tasks to run. Only they
+        and the tasks they depend on are run.
+
+    NOTE: Tasks are never coalesced into batches; tasks with batchable
+        functions (see arbiter.task.batchable) are run in batches of
+        one.
+    """
+    if store is None:
+        store = TaskStore()
+
+    if max_workers is None:
+        max_workers = cpu_count()
+
+    completed = set()
+    failed = set()
+    exceptions = []
+    exceptions_lock = Lock()
+    errors = []  # raised by the workers themselves, not tasks
+
+    hooks = tuple(hooks or ())
+    instrumented = profiler is not None or bool(hooks)
+
+    def emit(event, name, value):
+        for hook in hooks:
+            hook(event, name, value)
+
+    def start(scheduler):
+        if not hooks:
+            return scheduler.next_task()
+
+        emit('runnable', None, len(scheduler.runnable))
+
+        started = time()
+        task = scheduler.start_task()
+        emit(
+            'start_task',
+            None if task is None else task.name,
+            time() - started,
+        )
+
+        if task is None and not scheduler.is_finished():
+            emit('running', None, len(scheduler.running))
+
+            started = time()
+            task = scheduler.next_task()
+            emit('wait', None, time() - started)
+
+        return task
+
+    def execute(task):
+        if instrumented:
+            started = time()
+
+        args, kwargs, broadcast = collect(store, task)
+        batched = batch_size(task)
+
+        if batched:
+            args = [args]
+
+        if broadcast:
+            func = partial(resolve_call, task.function, args, kwargs)
+        else:
+            func = partial(task.function, *args, **kwargs)
+
+        if task.handler:
+            func = partial(task.handler, func)
+
+        if instrumented:
+            collected = time() - started
+
+            if profiler is not None:
+                profiler.queue(task, collected)
+
+            emit('collect', task.name, collected)
+            func = partial(timed_call, func)
+
+        try:
+            data = func()
+
+            if batched:
+                if isinstance(data, Timed):
+                    data = data._replace(
+                        data=batch_results(data.data, 1)[0]
+                    )
+                else:
+                    data = batch_results(data, 1)[0]
+        except Exception as exc:
+            return False, exc, None
+
+        return True, None, data
+
+    def complete(scheduler, task, successful, exception, data):
+        result = TaskResult(task.name, successful, exception, data)
+        finish_task(scheduler, store, result, profiler, hooks)
+
+        if exception is not None:
+            with exceptions_lock:
+                exceptions.append(exception)
+
+    def work(scheduler):
+        try:
+            task = start(scheduler)
+
+            while task is not None:
+                try:
+                    successful, exception, data = execute(task)
+                except Exception as exc:  # e.g., a missing result
+                    successful, exception, data = False, exc, None
+
+                complete(scheduler, task, successful, exception, data)
+
+                task = start(scheduler)
+        except BaseException as exc:  # e.g., the store failed
+            errors.append(exc)
+            scheduler.fail_remaining()  # stops the other workers
+
+    if resume:
+        tasks = resume_tasks(tasks, store, completed)
+
+    scheduler = ConcurrentScheduler(
+        tasks, completed=completed, failed=failed, hooks=hooks, frozen=True,
+    )
+
+    if targets is not None:
+        scheduler.restrict(targets)
+
+    with scheduler:
+        workers = [
+            Thread(target=work, args=(scheduler,))
+            for _ in range(max(1, max_workers))
+        ]
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+    if errors:
+        raise errors[0]
+
+    flush = getattr(store, 'flush', None)
+
+    if flush is not None:
+        flush()
+
+    return Results(completed, failed, exceptions)
@@ -0,0 +1,156 @@
+"""
+Synthetic task graphs for benchmarking.
+
+Each generator returns a list of (name, dependencies) pairs, which can
+be turned into tasks with make_tasks (or added straight to a Graph).
+"""
+from random import Random
+
+from arbiter.task import create_task
+
+
+__all__ = (
+    'GRAPHS', 'chain', 'diamond', 'fan', 'layered', 'make_tasks', 'noop',
+    'pipeline',
+)
+
+
+def noop(*args, **kwargs):
+    """
+    A task that does nothing.
+    """
+
+
+def make_tasks(edges, function=noop):
+    """
+    Turn (name, dependencies) pairs into tasks.
+
+    edges: The (name, dependencies) pairs.
+    function: (optional, noop) The function every task runs.
+    """
+    return [
+        create_task(function, name=name, dependencies=dependencies)
+        for name, dependencies in edges
+    ]
+
+
+def chain(size):
+    """
+    A single chain of tasks, each depending on the last.
+    """
+    edges = [(0, ())]
+
+    for index in range(1, size):
+        edges.append((index, (index - 1,)))
+
+    return edges
+
+
+def fan(size):
+    """
+    A single source fanning out to (size - 2) tasks, which fan back in
+    to a single sink.
+    """
+    width = max(size - 2, 0)
+    edges = [('source', ())]
+    edges.extend((index, ('source',)) for index in range(width))
+    edges.append(('sink', tuple(range(width))))
+
+    return edges
+
+
+def layered(size, width=100, density=3, seed=0):
+    """
+    Random layers of tasks, where each task depends on up to density
+    tasks from the previous layer.
+
+    width: (optional, 100) The number of tasks per layer.
+    density: (optional, 3) The maximum number of dependencies per task.
+    seed: (optional, 0) The random seed.
+    """
+    random = Random(seed)
+    edges = []
+    layer = []
+    current = []
+
+    for index in range(size):
+        if index % width == 0:
+            layer, current = current, []
+
+        count = min(len(layer), random.randint(1, density))
+
+        edges.append((index, tuple(random.sample(layer, count))))
+        current.append(index)
+
+    return edges
+
+
+def diamond(size, width=10):
+    """
+    A lattice of diamonds: a grid where each task depends on the task
+    above it and the task above and to the left.
+
+    width: (optional, 10) The number of tasks per row.
+    """
+    edges = []
+
+    for index in range(size):
+        row, column = divmod(index, width)
+        dependencies = []
+
+        if row:
+            dependencies.append(index - width)
+
+            if column:
+                dependencies.append(index - width - 1)
+
+        edges.append((index, tuple(dependencies)))
+
+    return edges
+
+
+def pipeline(size, stages=5, seed=0):
+    """
+    A graph shaped like a typical data pipeline: independent sources,
+    each followed by a short chain of per-source transformations, a
+    few joins across random subsets of sources, and a final report.
+
+    stages: (optional, 5) The length of each source's chain.
+    seed: (optional, 0) The random seed.
+    """
+    random = Random(seed)
+    sources = max((size - 1) // (stages + 1), 1)
+    ends = []
+    edges = []
+
+    for source in range(sources):
+        previous = ()
+
+        for stage in range(stages):
+            name = (source, stage)
+            edges.append((name, previous))
+            previous = (name,)
+
+        ends.append(previous[0])
+
+    joins = []
+
+    while len(edges) + len(joins) < size - 1:
+        name = ('join', len(joins))
+        joins.append(
+            (name, tuple(random.sample(ends, min(len(ends), 4))))
+        )
+
+    edges.extend(joins)
+    edges.append(('report', tuple(name for name, _ in joins) or tuple(ends)))
+
+    return edges
+
+
+GRAPHS = {
+    'chain': chain,
+    'fan': fan,
+    'layered': layered,
+    'diamond': diamond,
+    'pipeline': pipeline,
+}
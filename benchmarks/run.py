@@ -0,0 +1,281 @@
+"""
+Benchmark graph construction, scheduling overhead, runner throughput
+and memory use on synthetic task graphs.
+
+To run (from the root of the repository):
+
+    python -m benchmarks.run --sizes 1000 10000 --save baseline.json
+    python -m benchmarks.run --sizes 1000 10000 --compare baseline.json
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+from importlib import import_module
+import json
+import sys
+import time
+
+from arbiter import threaded
+from arbiter.compact import CompactGraph
+from arbiter.graph import Graph
+from arbiter.runner import Runner
+from arbiter.scheduler import Scheduler
+from arbiter.sync import run_tasks
+from arbiter.task import Backend
+
+from benchmarks.graphs import GRAPHS, make_tasks
+
+try:
+    import tracemalloc
+except ImportError:  # Python < 3.4
+    tracemalloc = None
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# arbiter.async starts a new pool for each run, so these include startup
+ASYNC_RUNNERS = {
+    'async_thread': {},
+    'async_process': {'use_processes': True},
+    'interpreter': {'use_interpreters': True},
+}
+
+
+def timed(function, repeat=1):
+    """
+    Run a function, returning the fastest time (in seconds) out of the
+    given number of repeats.
+    """
+    best = None
+
+    for _ in range(repeat):
+        gc.collect()
+        started = timer()
+        function()
+        elapsed = timer() - started
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def peak_memory(function):
+    """
+    Run a function, returning the peak memory (in bytes) it allocated,
+    or None if memory can't be traced.
+    """
+    if tracemalloc is None:
+        return None
+
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def build_graph(edges):
+    """
+    Add every node to a Graph.
+    """
+    graph = Graph()
+
+    for name, dependencies in edges:
+        graph.add(name, dependencies)
+
+    return graph
+
+
+def schedule(tasks, frozen=False):
+    """
+    Run the scheduler over all tasks without executing any of them.
+    """
+    with Scheduler(tasks, frozen=frozen) as scheduler:
+        while not scheduler.is_finished():
+            task = scheduler.start_task()
+
+            while task is not None:
+                scheduler.end_task(task.name)
+                task = scheduler.start_task()
+
+
+def cascade(tasks, frozen=False):
+    """
+    Fail every initially runnable task (cascading the failure to all
+    of their descendants), returning how long the failures took.
+    """
+    with Scheduler(tasks, frozen=frozen) as scheduler:
+        started = timer()
+        task = scheduler.start_task()
+
+        while task is not None:
+            scheduler.end_task(task.name, False)
+            task = scheduler.start_task()
+
+        return timer() - started
+
+
+def bench(graphs, sizes, runners, repeat, workers):
+    """
+    Run the benchmarks, returning a dict of results keyed by
+    graph/size/measure. Times are in seconds, memory in bytes.
+    """
+    results = {}
+
+    for graph in graphs:
+        for size in sizes:
+            edges = GRAPHS[graph](size)
+            tasks = make_tasks(edges)
+            count = float(len(tasks))
+            prefix = '{}/{}/'.format(graph, size)
+
+            results[prefix + 'build'] = timed(
+                lambda: build_graph(edges), repeat
+            ) / count
+            results[prefix + 'schedule'] = timed(
+                lambda: schedule(tasks), repeat
+            ) / count
+            results[prefix + 'schedule_frozen'] = timed(
+                lambda: schedule(tasks, frozen=True), repeat
+            ) / count
+
+            results[prefix + 'cascade'] = min(
+                cascade(tasks) for _ in range(repeat)
+            ) / count
+            results[prefix + 'cascade_frozen'] = min(
+                cascade(tasks, frozen=True) for _ in range(repeat)
+            ) / count
+
+            memories = (
+                ('memory', lambda: Scheduler(tasks)),
+                ('graph_memory', lambda: build_graph(edges)),
+                ('compact_memory', lambda: CompactGraph(edges)),
+            )
+
+            for measure, function in memories:
+                memory = peak_memory(function)
+
+                if memory is not None:
+                    results[prefix + measure] = memory / count
+
+            for runner in runners:
+                if runner == 'sync':
+                    elapsed = timed(lambda: run_tasks(tasks), repeat)
+                elif runner == 'threaded':
+                    elapsed = timed(
+                        lambda: threaded.run_tasks(tasks, workers), repeat
+                    )
+                elif runner in ASYNC_RUNNERS:
+                    # async is a keyword from Python 3.7
+                    run_async = import_module('arbiter.async').run_tasks
+                    options = ASYNC_RUNNERS[runner]
+                    elapsed = timed(
+                        lambda: run_async(tasks, workers, **options), repeat
+                    )
+                else:
+                    backend = Backend[runner]
+
+                    with Runner(workers, workers, backend) as pool:
+                        pool.start(backend)
+                        elapsed = timed(lambda: pool.run_tasks(tasks), repeat)
+
+                results[prefix + runner] = elapsed / count
+
+            print(
+                '\n'.join(
+                    '{:<40} {:>12.3f} {}'.format(
+                        key,
+                        value * (1e6 if not key.endswith('memory') else 1),
+                        'B/task' if key.endswith('memory') else 'us/task',
+                    )
+                    for key, value in sorted(results.items())
+                    if key.startswith(prefix)
+                )
+            )
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against a baseline, printing the ratio for each
+    measure. Returns the list of measures which regressed by more than
+    the tolerance.
+    """
+    regressions = []
+
+    print('\n{:<40} {:>10}'.format('measure', 'vs baseline'))
+
+    for key, value in sorted(results.items()):
+        if key not in baseline or not baseline[key]:
+            continue
+
+        ratio = value / baseline[key]
+        flag = ''
+
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+
+        print('{:<40} {:>9.2f}x{}'.format(key, ratio, flag))
+
+    return regressions
+
+
+def main(argv=None):
+    """
+    Run the benchmarks from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--graphs', nargs='+', default=sorted(GRAPHS), choices=sorted(GRAPHS)
+    )
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000])
+    parser.add_argument(
+        '--runners', nargs='*', default=['sync', 'thread'],
+        choices=[
+            'sync', 'inline', 'thread', 'threaded', 'process',
+        ] + sorted(ASYNC_RUNNERS),
+    )
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write results to a JSON file')
+    parser.add_argument('--compare', help='compare to a JSON baseline')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='allowed slowdown relative to the baseline (default 0.2)',
+    )
+
+    args = parser.parse_args(argv)
+
+    # threads only run in parallel on free-threaded builds
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+
+    if is_gil_enabled is not None:
+        print('GIL enabled: {}'.format(is_gil_enabled()))
+
+    results = bench(
+        args.graphs, args.sizes, args.runners, args.repeat, args.workers
+    )
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+
+        if compare(results, baseline, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Tests for CPU pinning and NUMA-aware pools.
+"""
+import os
+import shutil
+from tempfile import mkdtemp
+from time import sleep
+
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_numa_nodes():
+    """
+    Read NUMA nodes from /sys
+    """
+    from arbiter.affinity import _available_cpus, _parse_cpulist, numa_nodes
+
+    assert_equals(_parse_cpulist('0-3,8,10-11\n'), [0, 1, 2, 3, 8, 10, 11])
+
+    cpu = min(_available_cpus())
+    root = mkdtemp()
+
+    try:
+        for node, cpulist in ((0, str(cpu)), (1, str(cpu)), (2, '')):
+            os.mkdir(os.path.join(root, 'node{}'.format(node)))
+
+            with open(os.path.join(root, 'node{}'.format(node),
+                                   'cpulist'), 'w') as handle:
+                handle.write(cpulist)
+
+        # nodes without any usable CPUs are left out
+        assert_equals(numa_nodes(root), {0: [cpu], 1: [cpu]})
+    finally:
+        shutil.rmtree(root)
+
+    assert_equals(numa_nodes(root), {0: sorted(_available_cpus())})
+
+
+def test_plan():
+    """
+    Plan which CPUs to pin workers to
+    """
+    from arbiter.affinity import Affinity
+
+    nodes = {0: [0, 1], 1: [2, 3]}
+
+    assert_equals(
+        Affinity('compact', nodes).plan(5),
+        [{0}, {1}, {2}, {3}, {0}],
+    )
+    assert_equals(
+        Affinity('spread', nodes).plan(3),
+        [{0}, {2}, {1}],
+    )
+    assert_equals(
+        Affinity('numa', nodes).plan(3),
+        [{0, 1}, {2, 3}, {0, 1}],
+    )
+
+    assert_raises(ValueError, Affinity, 'fake', nodes)
+    assert_raises(ValueError, Affinity, 'compact', {0: []})
+
+
+def test_pinning():
+    """
+    Pin process workers to CPUs
+    """
+    from arbiter.affinity import _available_cpus, Affinity
+    from arbiter.compat import POOL_INITIALIZERS
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task, TaskStore
+
+    cpu = min(_available_cpus())
+    store = TaskStore()
+
+    if not POOL_INITIALIZERS:
+        assert_raises(RuntimeError, Runner, affinity='compact')
+        assert_raises(RuntimeError, Affinity('compact').pool_kwargs, 2)
+        return
+
+    with Runner(
+        max_processes=2, affinity=Affinity('compact', {0: [cpu]}),
+        state={'foo': 'bar'},
+    ) as runner:
+        results = runner.run_tasks(
+            [create_task(where, name='where', backend=Backend.process)],
+            store=store,
+        )
+
+    assert_equals(results.completed, frozenset(('where',)))
+
+    pinned, allowed, state = store.get('where')
+
+    assert_equals(pinned, frozenset((cpu,)))
+    assert_equals(state, 'bar')  # the runner's initializer still runs
+
+    if allowed is not None:
+        assert_equals(allowed, frozenset((cpu,)))
+
+
+def test_locality():
+    """
+    Dependent tasks run on the node their dependencies ran on
+    """
+    from arbiter.affinity import _available_cpus, Affinity
+    from arbiter.compat import POOL_INITIALIZERS
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task, TaskStore
+
+    cpu = min(_available_cpus())
+    nodes = {0: [cpu], 1: [cpu]}
+    store = TaskStore()
+
+    if not POOL_INITIALIZERS:
+        assert_raises(RuntimeError, Runner, locality=True)
+        return
+
+    first = create_task(nap, None, name='first', backend=Backend.process)
+    second = create_task(nap, None, name='second', backend=Backend.process)
+    tasks = [first, second]
+
+    for index in range(4):
+        tasks.append(
+            create_task(
+                nap, tasks[-2], name=index, backend=Backend.process,
+            )
+        )
+
+    with Runner(
+        max_processes=2, affinity=Affinity('numa', nodes), locality=True,
+    ) as runner:
+        results = runner.run_tasks(tasks, store=store)
+
+    assert_equals(len(results.completed), 6)
+
+    # each chain stays in its node's (single) worker
+    assert_true(store.get('first') != store.get('second'))
+    assert_equals(store.get(2), store.get('first'))
+    assert_equals(store.get(3), store.get('second'))
+
+
+def where():
+    """
+    Report where the current worker is pinned
+    """
+    from arbiter.affinity import worker_cpus
+    from arbiter.runner import worker_state
+
+    allowed = None
+
+    if hasattr(os, 'sched_getaffinity'):
+        allowed = frozenset(os.sched_getaffinity(0))
+
+    return worker_cpus(), allowed, worker_state().get('foo')
+
+
+def nap(_):
+    """
+    Sleep briefly, then return the worker's pid
+    """
+    sleep(0.1)
+
+    return os.getpid()
@@ -1,7 +1,16 @@
 """
 Tests for the asynchronous task runner (using processes).
 """
-from nose.tools import assert_equals
+from nose.tools import assert_equals, assert_not_equals, assert_raises
+
+
+def get_async():
+    """
+    Import arbiter.async (async is a keyword from Python 3.7)
+    """
+    from importlib import import_module
+
+    return import_module('arbiter.async')
 
 
 def make_task(name, dependencies=(), should_succeed=True):
@@ -18,7 +27,7 @@ def test_empty():
     """
     Solve no tasks (with processes)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     results = run_tasks((), 2, use_processes=True)
 
@@ -30,7 +39,7 @@ def test_no_dependencies():
     """
     run dependency-less tasks (with processes)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     results = run_tasks(
         (
@@ -51,7 +60,7 @@ def test_chain():
     """
     run a dependency chain (with processes)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     results = run_tasks(
         (
@@ -72,7 +81,7 @@ def test_tree():
     """
     run a dependency tree (with processes)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     results = run_tasks(
         (
@@ -108,6 +117,61 @@ def test_tree():
     )
 
 
+def test_lazy():
+    """
+    pass results by reference (with processes)
+    """
+    from arbiter.store import FileStore
+    from arbiter.task import create_task
+
+    run_tasks = get_async().run_tasks
+
+    foo = create_task(succeed, name='foo')
+    bar = create_task(negate, foo, name='bar')
+
+    with FileStore() as store:
+        results = run_tasks(
+            (foo, bar), 2, use_processes=True, store=store, lazy=True
+        )
+
+        assert_equals(results.completed, frozenset(('foo', 'bar')))
+        assert_equals(store.get('bar'), False)
+
+
+def test_serializer():
+    """
+    send unpicklable tasks with a serializer (with processes)
+    """
+    from nose.plugins.skip import SkipTest
+
+    from arbiter import serialize
+    from arbiter.task import create_task
+
+    run_tasks = get_async().run_tasks
+
+    if serialize.cloudpickle is None:
+        raise SkipTest('cloudpickle is not installed')
+
+    offset = 3
+
+    foo = create_task(lambda: offset, name='foo')
+    bar = create_task(negate, foo, name='bar')
+
+    results = run_tasks(
+        (foo, bar), 2, use_processes=True,
+        serializer=serialize.CloudPickleSerializer(),
+    )
+
+    assert_equals(results.completed, frozenset(('foo', 'bar')))
+
+
+def negate(value):
+    """
+    A task that negates its argument
+    """
+    return not value
+
+
 def succeed():
     """
     A task that succeeds
@@ -120,3 +184,209 @@ def fail():
     A task that fails
     """
     raise Exception("Failure Test")
+
+
+def test_auto_broadcast():
+    """
+    Broadcast shared arguments to process workers
+    """
+    from arbiter.task import create_task, TaskStore
+
+    run_tasks = get_async().run_tasks
+
+    table = list(range(100000))
+    store = TaskStore()
+
+    results = run_tasks(
+        [
+            create_task(max, table, name='max'),
+            create_task(min, table, name='min'),
+            create_task(len, table, name='len'),
+        ],
+        2,
+        use_processes=True,
+        store=store,
+        auto_broadcast=1000,
+    )
+
+    assert_equals(results.completed, frozenset(('max', 'min', 'len')))
+    assert_equals(store.get('max'), 99999)
+    assert_equals(store.get('len'), 100000)
+
+
+def test_shared():
+    """
+    Share objects with forked process workers
+    """
+    from arbiter.task import create_task, TaskStore
+
+    run_tasks = get_async().run_tasks
+
+    store = TaskStore()
+
+    results = run_tasks(
+        [create_task(use_shared, name='shared')],
+        2,
+        use_processes=True,
+        store=store,
+        shared={'function': lambda: 'unpicklable'},
+    )
+
+    assert_equals(results.completed, frozenset(('shared',)))
+    assert_equals(store.get('shared'), 'unpicklable')
+
+
+def use_shared():
+    """
+    Call a shared function
+    """
+    from arbiter.shared import shared
+
+    return shared('function')()
+
+
+def test_resilient():
+    """
+    Recover from a worker crashing
+    """
+    from arbiter.task import create_task
+
+    run_tasks = get_async().run_tasks
+
+    results = run_tasks(
+        (
+            make_task('foo'),
+            make_task('bar'),
+            create_task(crash, name='crash'),
+            make_task('baz', ('crash',)),
+        ),
+        2,
+        use_processes=True,
+        resilient=True,
+    )
+
+    assert_equals(results.completed, frozenset(('foo', 'bar')))
+    assert_equals(results.failed, frozenset(('crash', 'baz')))
+
+
+def crash():
+    """
+    Kill the worker running the task
+    """
+    import os
+    import signal
+
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_affinity():
+    """
+    Pin process workers to CPUs
+    """
+    from arbiter.affinity import _available_cpus, worker_cpus
+    from arbiter.compat import POOL_INITIALIZERS
+    from arbiter.task import create_task, TaskStore
+
+    run_tasks = get_async().run_tasks
+
+    store = TaskStore()
+    tasks = [create_task(worker_cpus, name='cpus')]
+
+    if not POOL_INITIALIZERS:
+        assert_raises(
+            RuntimeError, run_tasks, tasks, 2, use_processes=True,
+            affinity='spread',
+        )
+        return
+
+    results = run_tasks(
+        tasks, 2, use_processes=True, store=store, affinity='spread',
+    )
+
+    assert_equals(results.completed, frozenset(('cpus',)))
+    assert_equals(len(store.get('cpus')), 1)
+    assert_equals(store.get('cpus') - _available_cpus(), frozenset())
+
+
+def test_interpreters():
+    """
+    Run tasks in subinterpreters (or processes, before Python 3.14)
+    """
+    from operator import neg
+    import os
+
+    from arbiter.task import create_task, TaskStore
+
+    module = get_async()
+    InterpreterPoolExecutor = module.InterpreterPoolExecutor
+    run_tasks = module.run_tasks
+
+    store = TaskStore()
+    pid = create_task(os.getpid, name='pid')
+
+    results = run_tasks(
+        [
+            pid,
+            create_task(neg, pid, name='negated'),
+            create_task(fail, name='fail'),
+        ],
+        2,
+        store=store,
+        use_interpreters=True,
+    )
+
+    assert_equals(results.completed, frozenset(('pid', 'negated')))
+    assert_equals(results.failed, frozenset(('fail',)))
+    assert_equals(store.get('negated'), -store.get('pid'))
+
+    if InterpreterPoolExecutor is None:  # fell back on processes
+        assert_not_equals(store.get('pid'), os.getpid())
+    else:  # subinterpreters share the process
+        assert_equals(store.get('pid'), os.getpid())
+
+
+def test_subinterpreters():
+    """
+    Run tasks in subinterpreters, which share the process but not
+    module state (Python 3.14 and later)
+    """
+    import os
+
+    from nose.plugins.skip import SkipTest
+
+    from arbiter.task import create_task, TaskStore
+
+    module = get_async()
+
+    if module.InterpreterPoolExecutor is None:
+        raise SkipTest('interpreter pools require Python 3.14')
+
+    store = TaskStore()
+
+    results = module.run_tasks(
+        [create_task(count, name=index) for index in range(4)],
+        1,
+        store=store,
+        use_interpreters=True,
+    )
+
+    assert_equals(results.completed, frozenset(range(4)))
+    assert_equals(
+        sorted(store.get(index) for index in range(4)),
+        [(os.getpid(), calls) for calls in (1, 2, 3, 4)],
+    )
+    assert_equals(CALLS, [])  # counted in the subinterpreter
+
+
+CALLS = []
+
+
+def count():
+    """
+    Count the calls made in this interpreter
+    """
+    import os
+
+    CALLS.append(None)
+
+    return os.getpid(), len(CALLS)
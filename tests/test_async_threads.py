@@ -4,11 +4,20 @@ Tests for the asynchronous task runner (using threads).
 from nose.tools import assert_equals
 
 
+def get_async():
+    """
+    Import arbiter.async (async is a keyword from Python 3.7)
+    """
+    from importlib import import_module
+
+    return import_module('arbiter.async')
+
+
 def test_empty():
     """
     Solve no tasks (with threads)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     results = run_tasks((), 2)
 
@@ -20,7 +29,7 @@ def test_no_dependencies():
     """
     run dependency-less tasks (with threads)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     executed_tasks = set()
 
@@ -57,7 +66,7 @@ def test_chain():
     """
     run a dependency chain (with threads)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     executed_tasks = set()
 
@@ -94,7 +103,7 @@ def test_tree():
     """
     run a dependency tree (with threads)
     """
-    from arbiter.async import run_tasks
+    run_tasks = get_async().run_tasks
 
     executed_tasks = set()
 
@@ -158,9 +167,10 @@ def test_with_data():
     """
     Pass data.
     """
-    from arbiter.async import run_tasks
     from arbiter.task import create_task
 
+    run_tasks = get_async().run_tasks
+
     data = [4, 5, 6]
 
     def myfunc(val=-1):
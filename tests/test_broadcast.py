@@ -0,0 +1,117 @@
+"""
+Tests for broadcast variables.
+"""
+import os
+import pickle
+
+from nose.tools import assert_equals, assert_false, assert_true
+
+
+def test_broadcast():
+    """
+    Broadcast a value through a temporary file
+    """
+    from arbiter.broadcast import Broadcast
+    from arbiter.store import resolve
+
+    table = list(range(1000))
+
+    with Broadcast(table) as broadcast:
+        assert_true(broadcast.value is table)
+        assert_true(resolve(broadcast) is table)
+        assert_equals(broadcast.path, None)
+
+        data = pickle.dumps(broadcast)
+
+        assert_true(len(data) < 200)
+        assert_true(os.path.exists(broadcast.path))
+
+        copy = pickle.loads(data)
+
+        assert_equals(copy, broadcast)
+        assert_equals(copy.value, table)
+        assert_true(copy.value is pickle.loads(data).value)  # cached
+
+        path = broadcast.path
+
+    assert_false(os.path.exists(path))
+
+
+def test_broadcast_shared():
+    """
+    Find large shared arguments
+    """
+    from arbiter.broadcast import Broadcast, broadcast_shared
+    from arbiter.task import create_task, create_task_array
+
+    large = b'x' * 1000
+    other = b'y' * 1000
+
+    tasks = [
+        create_task(len, large, name='foo'),
+        create_task(len, large, name='bar'),
+        create_task(len, other, name='baz'),
+        create_task(len, b'small', name='small'),
+        create_task(len, b'small', name='other small'),
+        create_task_array(max, (1, 2), [0] * 1000, name='array'),
+    ]
+
+    replaced, broadcasts = broadcast_shared(tasks, min_size=500)
+
+    assert_equals(len(broadcasts), 2)
+    assert_true(isinstance(replaced[0].args[0], Broadcast))
+    assert_true(replaced[0].args[0] is replaced[1].args[0])
+    assert_true(replaced[2] is tasks[2])
+    assert_true(replaced[3] is tasks[3])
+    assert_true(isinstance(replaced[5].args[0], Broadcast))
+    assert_equals(replaced[5].items, (1, 2))
+
+    for broadcast in broadcasts:
+        broadcast.close()
+
+    assert_equals(broadcast_shared(tasks, min_size=5000), (tasks, []))
+
+
+def test_runner():
+    """
+    Process workers receive shared arguments once
+    """
+    from arbiter.runner import Runner
+    from arbiter.serialize import PickleSerializer
+    from arbiter.task import Backend, create_task
+
+    table = list(range(100000))
+    sizes = {}
+
+    def hook(event, name, value):
+        """
+        Record how big each task was
+        """
+        if event == 'task_bytes':
+            sizes[name] = value
+
+    tasks = [
+        create_task(lookup, table, index, name=index, backend=Backend.process)
+        for index in range(10)
+    ]
+
+    for auto_broadcast in (None, 1000):
+        with Runner(
+            max_processes=2, serializer=PickleSerializer(),
+            auto_broadcast=auto_broadcast,
+        ) as runner:
+            results = runner.run_tasks(tasks, hooks=(hook,))
+
+        assert_equals(len(results.completed), 10)
+
+        if auto_broadcast is None:
+            assert_true(min(sizes.values()) > 100000)
+        else:
+            assert_true(max(sizes.values()) < 1000)
+
+
+def lookup(table, index):
+    """
+    Look a value up in a table
+    """
+    return table[index]
@@ -0,0 +1,217 @@
+"""
+Tests for the compact graph module.
+"""
+from nose.tools import assert_equals, assert_false, assert_raises, assert_true
+
+
+def test_empty():
+    """
+    Create an empty compact graph
+    """
+    from arbiter.compact import CompactGraph
+
+    graph = CompactGraph()
+
+    assert_equals(len(graph), 0)
+    assert_equals(graph.nodes, frozenset())
+    assert_equals(graph.roots, frozenset())
+    assert_false('foo' in graph)
+    assert_false(graph.ancestor_of('foo', 'bar'))
+    assert_raises(KeyError, graph.children, 'foo')
+    assert_raises(KeyError, graph.parents, 'foo')
+    assert_equals(graph, CompactGraph())
+
+
+def test_graph():
+    """
+    Build a compact graph
+    """
+    from arbiter.compact import CompactGraph
+
+    graph = CompactGraph(
+        (
+            ('foo', ()),
+            ('bar', ('foo',)),
+            ('baz', ('foo', 'bar')),
+            ('ipsum', ('lorem',)),
+            ('qux', None),
+        )
+    )
+
+    assert_equals(len(graph), 6)
+    assert_equals(
+        graph.nodes,
+        frozenset(('foo', 'bar', 'baz', 'lorem', 'ipsum', 'qux'))
+    )
+    assert_equals(graph.roots, frozenset(('foo', 'qux')))
+
+    assert_equals(graph.children('foo'), frozenset(('bar', 'baz')))
+    assert_equals(graph.children('bar'), frozenset(('baz',)))
+    assert_equals(graph.children('baz'), frozenset())
+    assert_equals(graph.children('lorem'), frozenset(('ipsum',)))
+    assert_equals(graph.parents('foo'), frozenset())
+    assert_equals(graph.parents('baz'), frozenset(('foo', 'bar')))
+    assert_equals(graph.parents('ipsum'), frozenset(('lorem',)))
+
+    assert_true(graph.is_stub('lorem'))
+    assert_false(graph.is_stub('ipsum'))
+
+    assert_true(graph.ancestor_of('baz', 'foo'))
+    assert_true(graph.ancestor_of('ipsum', 'lorem'))
+    assert_false(graph.ancestor_of('foo', 'baz'))
+    assert_false(graph.ancestor_of('baz', 'qux'))
+    assert_false(graph.ancestor_of('baz', 'fake'))
+
+    visited = set()
+
+    assert_false(graph.ancestor_of('baz', 'qux', visited=visited))
+    assert_equals(visited, set(('foo', 'bar')))
+
+    assert_equals(graph.name(graph.index('bar')), 'bar')
+    assert_equals(
+        dict(
+            (graph.name(index), count)
+            for index, count in enumerate(graph.indegrees())
+        ),
+        {'foo': 0, 'bar': 1, 'baz': 2, 'lorem': 0, 'ipsum': 1, 'qux': 0}
+    )
+
+
+def test_invalid():
+    """
+    Invalid compact graphs can't be built
+    """
+    from arbiter.compact import CompactGraph
+
+    assert_raises(TypeError, CompactGraph, ((set(), ()),))
+    assert_raises(TypeError, CompactGraph, (('foo', (set(),)),))
+    assert_raises(ValueError, CompactGraph, (('foo', ()), ('foo', ())))
+    assert_raises(ValueError, CompactGraph, (('foo', ('foo',)),))
+    assert_raises(
+        ValueError,
+        CompactGraph,
+        (('foo', ()), ('tick', ('tock', 'foo')), ('tock', ('tick',)))
+    )
+
+    # nodes can still be given before their parents
+    graph = CompactGraph((('baz', ('bar',)), ('bar', ('foo',)), ('foo', ())))
+
+    assert_equals(graph.roots, frozenset(('foo',)))
+    assert_equals(graph.children('bar'), frozenset(('baz',)))
+
+
+def test_from_graph():
+    """
+    Build a compact copy of a Graph
+    """
+    from arbiter.compact import CompactGraph
+    from arbiter.graph import Graph
+
+    graph = Graph()
+    graph.add('foo')
+    graph.add('bar', ('foo',))
+    graph.add('baz', ('foo', 'bar'))
+    graph.add('ipsum', ('lorem',))
+
+    compact = CompactGraph.from_graph(graph)
+
+    assert_equals(compact.nodes, graph.nodes)
+    assert_equals(compact.roots, graph.roots)
+
+    for name in graph.nodes:
+        assert_equals(compact.children(name), graph.children(name))
+        assert_equals(compact.parents(name), graph.parents(name))
+
+    assert_true(compact.is_stub('lorem'))
+    assert_equals(
+        compact,
+        CompactGraph(
+            (
+                ('bar', ('foo',)),
+                ('foo', ()),
+                ('ipsum', ('lorem',)),
+                ('baz', ('bar', 'foo')),
+            )
+        )
+    )
+    assert_true(compact != CompactGraph((('foo', ()),)))
+
+
+def test_counting():
+    """
+    Schedule with a counting graph
+    """
+    from arbiter.compact import CompactGraph, CountingGraph
+    from arbiter.graph import Strategy
+
+    graph = CountingGraph(
+        CompactGraph(
+            (
+                ('foo', ()),
+                ('bar', ('foo',)),
+                ('baz', ('foo', 'bar')),
+                ('qux', ('baz',)),
+                ('bell', ('bar',)),
+                ('ipsum', ('lorem',)),
+                ('dolor', ('ipsum',)),
+            )
+        )
+    )
+
+    assert_equals(
+        graph.nodes,
+        frozenset(
+            ('foo', 'bar', 'baz', 'qux', 'bell', 'lorem', 'ipsum', 'dolor')
+        )
+    )
+    assert_equals(graph.roots, frozenset(('foo',)))
+    assert_equals(list(graph.ready), ['foo'])
+    assert_raises(TypeError, graph.add, 'new')
+
+    nodes = graph.nodes
+    roots = graph.roots
+
+    assert_equals(graph.prune(), set(('ipsum', 'dolor')))
+    assert_false('lorem' in graph)
+    assert_false('ipsum' in graph)
+    assert_false('fake' in graph)
+
+    assert_equals(graph.remove('foo'), set(('foo',)))
+    assert_false('foo' in graph)
+    assert_false('foo' in nodes)
+    assert_equals(graph.roots, frozenset(('bar',)))
+    assert_equals(roots, frozenset(('bar',)))
+    assert_raises(KeyError, graph.remove, 'foo')
+    assert_raises(ValueError, graph.remove, 'bar', Strategy.promote)
+
+    assert_equals(graph.remove('bar', Strategy.orphan), set(('bar',)))
+    assert_equals(graph.roots, frozenset(('baz', 'bell')))
+
+    # roots are queued as they become roots
+    assert_equals(graph.ready.popleft(), 'foo')
+    assert_equals(graph.ready.popleft(), 'bar')
+    assert_equals(sorted(graph.ready), ['baz', 'bell'])
+
+    assert_equals(
+        graph.remove('baz', Strategy.remove), set(('baz', 'qux'))
+    )
+    assert_equals(graph.roots, frozenset(('bell',)))
+    assert_equals(graph.nodes, frozenset(('bell',)))
+    assert_equals(len(graph.nodes), 1)
+
+
+def test_counting_from_graph():
+    """
+    Counting graphs can be built from Graphs
+    """
+    from arbiter.compact import CountingGraph
+    from arbiter.graph import Graph
+
+    graph = Graph()
+    graph.add('foo')
+    graph.add('bar', ('foo',))
+
+    counting = CountingGraph(graph)
+
+    assert_equals(counting.nodes, graph.nodes)
+    assert_equals(counting.roots, graph.roots)
@@ -309,6 +309,38 @@ def test_remove_remove():
     assert_raises(KeyError, graph.remove, 'fake', strategy=Strategy.remove)
 
 
+def test_remove_remove_closure():
+    """
+    Remove a node whose descendants overlap and have outside parents
+    """
+    from arbiter.graph import Graph, Strategy
+
+    graph = Graph()
+
+    graph.add('top')
+    graph.add('other')
+    graph.add('left', ('top',))
+    graph.add('right', ('top',))
+    graph.add('bottom', ('left', 'right', 'other'))
+    graph.add('sibling', ('other',))
+    graph.add('leaf', ('bottom', 'stub'))
+
+    assert_equals(
+        graph.remove('top', strategy=Strategy.remove),
+        frozenset(('top', 'left', 'right', 'bottom', 'leaf', 'stub'))
+    )
+
+    assert_equals(graph.nodes, frozenset(('other', 'sibling')))
+    assert_equals(graph.roots, frozenset(('other',)))
+    assert_equals(graph.children('other'), frozenset(('sibling',)))
+
+    expected = Graph()
+    expected.add('other')
+    expected.add('sibling', ('other',))
+
+    assert_equals(graph, expected)
+
+
 def test_prune():
     """
     Prune a Graph
@@ -354,6 +386,12 @@ def test_prune():
     )
     assert_equals(graph.roots, frozenset(('node',)))
 
+    # a node with several stubs
+    graph.add('multiple', ('lorem', 'ipsum'))
+
+    assert_equals(graph.prune(), frozenset(('multiple',)))
+    assert_equals(graph.nodes, frozenset(('node',)))
+
 
 def test_equality():
     """
@@ -437,3 +475,176 @@ def test_naming():
 
     assert_raises(TypeError, graph.add, [])
     assert_raises(TypeError, graph.add, 'valid', parents=([],))
+
+
+def test_queries():
+    """
+    Bulk graph queries
+    """
+    from arbiter.graph import Graph
+
+    graph = Graph()
+
+    graph.add('foo')
+    graph.add('bar', ('foo',))
+    graph.add('baz', ('foo', 'bar'))
+    graph.add('qux', ('baz',))
+    graph.add('ipsum', ('lorem',))
+
+    assert_equals(graph.ancestors('foo'), frozenset())
+    assert_equals(graph.ancestors('qux'), frozenset(('foo', 'bar', 'baz')))
+    assert_equals(graph.ancestors('ipsum'), frozenset(('lorem',)))
+    assert_equals(graph.descendants('foo'), frozenset(('bar', 'baz', 'qux')))
+    assert_equals(graph.descendants('lorem'), frozenset(('ipsum',)))
+    assert_raises(KeyError, graph.ancestors, 'fake')
+    assert_raises(KeyError, graph.descendants, 'fake')
+
+    order = graph.topological_order()
+
+    assert_equals(frozenset(order), graph.nodes)
+    assert_equals(len(order), len(graph.nodes))
+
+    for name in order:
+        for parent in graph.parents(name):
+            assert_true(order.index(parent) < order.index(name))
+
+    assert_equals(
+        graph.levels(),
+        {'foo': 0, 'bar': 1, 'baz': 2, 'qux': 3, 'lorem': 0, 'ipsum': 1}
+    )
+    assert_equals(graph.level('baz'), 2)
+    assert_raises(KeyError, graph.level, 'fake')
+
+    reduced = graph.transitive_reduction()
+
+    assert_equals(reduced.nodes, graph.nodes)
+    assert_equals(reduced.parents('baz'), frozenset(('bar',)))
+    assert_equals(reduced.parents('qux'), frozenset(('baz',)))
+
+    for name in graph.nodes:
+        assert_equals(reduced.ancestors(name), graph.ancestors(name))
+
+    # the original is untouched
+    assert_equals(graph.parents('baz'), frozenset(('foo', 'bar')))
+
+
+def test_query_caching():
+    """
+    Cached query results are invalidated when the graph changes
+    """
+    from arbiter.graph import Graph, Strategy
+
+    graph = Graph()
+
+    graph.add('bar', ('foo',))
+    graph.add('baz', ('bar',))
+
+    assert_equals(graph.ancestors('baz'), frozenset(('foo', 'bar')))
+    assert_equals(graph.descendants('foo'), frozenset(('bar', 'baz')))
+    assert_equals(graph.level('baz'), 2)
+    assert_true(graph.ancestor_of('baz', 'foo'))
+
+    # stub becomes a node
+    graph.add('foo', ('lorem',))
+
+    assert_equals(
+        graph.ancestors('baz'), frozenset(('lorem', 'foo', 'bar'))
+    )
+    assert_equals(graph.descendants('lorem'), frozenset(('foo', 'bar', 'baz')))
+    assert_equals(graph.level('baz'), 3)
+    assert_true(graph.ancestor_of('baz', 'lorem'))
+
+    # a new child
+    graph.add('qux', ('baz',))
+
+    assert_equals(
+        graph.descendants('foo'), frozenset(('bar', 'baz', 'qux'))
+    )
+    assert_equals(graph.ancestors('baz'), frozenset(('lorem', 'foo', 'bar')))
+    assert_equals(graph.topological_order()[-1], 'qux')
+
+    # adding a cycle fails without touching the caches
+    graph.add('tick', ('tock',))
+    graph.ancestors('tick')
+    assert_raises(ValueError, graph.add, 'tock', ('tick',))
+    assert_equals(graph.ancestors('tick'), frozenset(('tock',)))
+
+    graph.remove('bar', Strategy.promote)
+
+    assert_equals(graph.ancestors('qux'), frozenset(('lorem', 'foo', 'baz')))
+    assert_equals(graph.descendants('foo'), frozenset(('baz', 'qux')))
+    assert_equals(graph.level('qux'), 3)
+
+    graph.remove('foo', Strategy.orphan)
+
+    # the childless stub is removed too
+    assert_equals(graph.ancestors('qux'), frozenset(('baz',)))
+    assert_raises(KeyError, graph.descendants, 'lorem')
+    assert_false(graph.ancestor_of('qux', 'lorem'))
+
+    graph.remove('baz', Strategy.remove)
+
+    assert_equals(
+        frozenset(graph.topological_order()),
+        frozenset(('tick', 'tock')),
+    )
+    assert_raises(KeyError, graph.descendants, 'baz')
+    assert_raises(KeyError, graph.ancestors, 'qux')
+
+
+def test_views():
+    """
+    Graph views are live and read-only
+    """
+    from arbiter.graph import Graph, SetView
+
+    graph = Graph()
+
+    nodes = graph.nodes
+    roots = graph.roots
+
+    assert_true(isinstance(nodes, SetView))
+    assert_equals(nodes, frozenset())
+    assert_equals(len(roots), 0)
+    assert_false(roots)
+
+    graph.add('foo')
+    children = graph.children('foo')
+
+    graph.add('bar', ('foo',))
+
+    assert_equals(nodes, frozenset(('foo', 'bar')))
+    assert_equals(roots, frozenset(('foo',)))
+    assert_true('bar' in nodes)
+    assert_equals(len(nodes), 2)
+    assert_equals(children, frozenset(('bar',)))
+    assert_equals(graph.parents('bar'), frozenset(('foo',)))
+
+    # set operations create snapshots
+    difference = nodes - roots
+
+    assert_true(isinstance(difference, frozenset))
+    assert_equals(difference, frozenset(('bar',)))
+    assert_equals(nodes & set(('bar', 'baz')), frozenset(('bar',)))
+    assert_true(roots <= nodes)
+
+    snapshot = frozenset(roots)
+    graph.remove('foo')
+
+    assert_equals(roots, frozenset(('bar',)))
+    assert_equals(snapshot, frozenset(('foo',)))
+    assert_equals(difference, frozenset(('bar',)))
+
+    # views hash like snapshots
+    snapshot = frozenset(roots)
+
+    assert_equals(hash(roots), hash(snapshot))
+    assert_true(roots in set((snapshot,)))
+
+    graph.add('baz')
+
+    assert_equals(hash(nodes), hash(frozenset(('bar', 'baz'))))
+
+    assert_false(hasattr(nodes, 'add'))
+    assert_false(hasattr(nodes, 'remove'))
+    assert_raises(AttributeError, setattr, nodes, 'foo', 1)
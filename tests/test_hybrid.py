@@ -0,0 +1,121 @@
+"""
+Tests for the hybrid task runner.
+"""
+import os
+import threading
+
+from nose.tools import assert_equals, assert_not_equal
+
+
+def test_empty():
+    """
+    Solve no tasks (hybrid)
+    """
+    from arbiter.hybrid import run_tasks
+
+    results = run_tasks((), 2, 2)
+
+    assert_equals(results.completed, frozenset())
+    assert_equals(results.failed, frozenset())
+
+
+def test_backends():
+    """
+    Each task runs on the backend it hints at (hybrid)
+    """
+    from arbiter.hybrid import run_tasks
+    from arbiter.task import Backend, create_task
+
+    locations = {}
+
+    def record(name, location):
+        """
+        Record where a task ran
+        """
+        locations[name] = location
+
+    inline = create_task(
+        threading.current_thread, name='inline', backend=Backend.inline
+    )
+    thread = create_task(
+        threading.current_thread, name='thread', backend=Backend.thread
+    )
+    default = create_task(threading.current_thread, name='default')
+    process = create_task(os.getpid, name='process', backend=Backend.process)
+
+    results = run_tasks(
+        (
+            inline,
+            thread,
+            default,
+            process,
+            create_task(record, 'inline', inline, backend=Backend.inline),
+            create_task(record, 'thread', thread, backend=Backend.inline),
+            create_task(record, 'default', default, backend=Backend.inline),
+            create_task(record, 'process', process, backend=Backend.inline),
+        ),
+        2,
+        2,
+    )
+
+    assert_equals(len(results.completed), 8)
+    assert_equals(results.failed, frozenset())
+
+    assert_equals(locations['inline'], threading.current_thread())
+    assert_not_equal(locations['thread'], threading.current_thread())
+    assert_not_equal(locations['default'], threading.current_thread())
+    assert_not_equal(locations['process'], os.getpid())
+
+
+def test_tree():
+    """
+    run a dependency tree across backends (hybrid)
+    """
+    from arbiter.hybrid import run_tasks
+    from arbiter.task import Backend, create_task
+
+    results = run_tasks(
+        (
+            create_task(succeed, name='foo', backend=Backend.process),
+            create_task(
+                succeed, name='bar', dependencies=('foo',),
+                backend=Backend.inline,
+            ),
+            create_task(
+                fail, name='baz', dependencies=('bar',),
+                backend=Backend.process,
+            ),
+            create_task(
+                succeed, name='qux', dependencies=('baz',),
+                backend=Backend.thread,
+            ),
+            create_task(
+                fail, name='bell', dependencies=('bar',),
+                backend=Backend.inline,
+            ),
+            create_task(
+                succeed, name='ipsum', dependencies=('lorem',),
+                backend=Backend.inline,
+            ),
+            create_task(succeed, name='success', dependencies=('bar',)),
+        ),
+        2,
+        2,
+    )
+
+    assert_equals(results.completed, frozenset(('foo', 'bar', 'success')))
+    assert_equals(results.failed, frozenset(('baz', 'qux', 'bell', 'ipsum')))
+
+
+def succeed():
+    """
+    A task that succeeds
+    """
+    return True
+
+
+def fail():
+    """
+    A task that fails
+    """
+    raise Exception("Failure Test")
@@ -0,0 +1,185 @@
+"""
+Tests for the metrics module.
+"""
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_counter():
+    """
+    Counters only go up
+    """
+    from arbiter.metrics import Counter
+
+    counter = Counter('foo_total', 'Foos')
+
+    assert_equals(counter.value, 0)
+
+    counter.inc()
+    counter.inc(2)
+
+    assert_equals(counter.value, 3)
+    assert_raises(ValueError, counter.inc, -1)
+    assert_equals(counter.samples(), [('foo_total', '', 3)])
+
+
+def test_gauge():
+    """
+    Gauges go up and down
+    """
+    from arbiter.metrics import Gauge
+
+    gauge = Gauge('foo')
+
+    gauge.set(5)
+    gauge.inc(-2)
+
+    assert_equals(gauge.value, 3)
+
+
+def test_histogram():
+    """
+    Histograms count values into cumulative buckets
+    """
+    from arbiter.metrics import Histogram
+
+    histogram = Histogram('foo_seconds', buckets=(1, 0.1))
+
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+
+    assert_equals(histogram.count, 4)
+    assert_equals(histogram.sum, 6.05)
+    assert_equals(
+        histogram.samples(),
+        [
+            ('foo_seconds_bucket', '{le="0.1"}', 1),
+            ('foo_seconds_bucket', '{le="1"}', 3),
+            ('foo_seconds_bucket', '{le="+Inf"}', 4),
+            ('foo_seconds_sum', '', 6.05),
+            ('foo_seconds_count', '', 4),
+        ]
+    )
+
+
+def test_registry():
+    """
+    Registries expose their metrics in the text format
+    """
+    from arbiter.metrics import Registry
+
+    registry = Registry()
+
+    assert_equals(registry.exposition(), '')
+
+    counter = registry.counter('foo_total', 'Foos')
+
+    assert_true(registry.counter('foo_total') is counter)
+    assert_true(registry.get('foo_total') is counter)
+    assert_raises(TypeError, registry.gauge, 'foo_total')
+    assert_raises(KeyError, registry.get, 'bar')
+
+    counter.inc()
+    registry.gauge('bar').set(1.5)
+    registry.histogram('baz', buckets=(1,)).observe(0.5)
+
+    assert_equals(
+        registry.exposition(),
+        '\n'.join((
+            '# TYPE bar gauge',
+            'bar 1.5',
+            '# TYPE baz histogram',
+            'baz_bucket{le="1"} 1',
+            'baz_bucket{le="+Inf"} 1',
+            'baz_sum 0.5',
+            'baz_count 1',
+            '# HELP foo_total Foos',
+            '# TYPE foo_total counter',
+            'foo_total 1',
+        )) + '\n'
+    )
+
+
+def test_hooks():
+    """
+    Hooks are called as tasks are run
+    """
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task
+
+    events = []
+
+    foo = create_task(lambda: 'foo', name='foo')
+    bar = create_task(lambda value: value, foo, name='bar')
+    baz = create_task(fail, name='baz')
+    qux = create_task(lambda value: value, baz, name='qux')
+
+    run_tasks(
+        (foo, bar, baz, qux),
+        hooks=(lambda *event: events.append(event),)
+    )
+
+    def find(event, name=None):
+        """
+        Find the values recorded for an event
+        """
+        return [
+            value for kind, task, value in events
+            if kind == event and (name is None or task == name)
+        ]
+
+    assert_equals(len(find('collect')), 3)
+    assert_equals(len(find('store')), 3)
+    assert_equals(len(find('end_task')), 3)
+    assert_equals(len(find('task')), 2)
+    assert_equals(find('finished', 'foo'), [True])
+    assert_equals(find('finished', 'baz'), [False])
+    assert_equals(
+        sorted(task for kind, task, _ in events if kind == 'graph_remove'),
+        ['bar', 'baz', 'foo'],
+    )
+    assert_true(
+        all(value >= 0 for kind, _, value in events if kind != 'finished')
+    )
+
+
+def test_metrics():
+    """
+    Record a run's metrics
+    """
+    from arbiter.metrics import Metrics
+    from arbiter.runner import Runner
+    from arbiter.task import create_task
+
+    metrics = Metrics(workers=2)
+
+    with Runner(max_threads=2) as runner:
+        runner.run_tasks(
+            (
+                create_task(len, (), name='foo'),
+                create_task(len, (), name='bar'),
+                create_task(fail, name='baz'),
+            ),
+            hooks=(metrics,),
+        )
+
+    registry = metrics.registry
+
+    assert_equals(registry.get('arbiter_tasks_succeeded_total').value, 2)
+    assert_equals(registry.get('arbiter_tasks_failed_total').value, 1)
+    assert_equals(registry.get('arbiter_collect_seconds').count, 3)
+    assert_equals(registry.get('arbiter_task_seconds').count, 2)
+    assert_true(registry.get('arbiter_wait_seconds').count > 0)
+    assert_true(registry.get('arbiter_start_task_seconds').count >= 3)
+    assert_true(0 <= registry.get('arbiter_worker_utilization').value <= 1)
+
+    exposition = registry.exposition()
+
+    assert_true('# TYPE arbiter_end_task_seconds histogram' in exposition)
+    assert_true('arbiter_tasks_failed_total 1' in exposition)
+
+
+def fail():
+    """
+    A task that fails
+    """
+    raise Exception("Failure Test")
@@ -0,0 +1,122 @@
+"""
+Tests for the profiler module.
+"""
+import json
+import os
+from time import sleep
+
+from nose.tools import assert_equals, assert_true
+
+
+def test_empty():
+    """
+    Profile no tasks
+    """
+    from arbiter.profiler import Profiler
+    from arbiter.sync import run_tasks
+
+    profiler = Profiler()
+
+    run_tasks((), profiler=profiler)
+
+    assert_equals(profiler.timings, [])
+    assert_equals(profiler.critical_path(), [])
+    assert_equals(profiler.summary()['tasks'], 0)
+    assert_equals(len(profiler.chrome_trace()['traceEvents']), 1)
+
+
+def test_timings():
+    """
+    Profile a synchronous run
+    """
+    from arbiter.profiler import Profiler
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task
+
+    profiler = Profiler()
+
+    foo = create_task(lambda: sleep(0.01) or 'foo', name='foo')
+    bar = create_task(lambda value: value * 2, foo, name='bar')
+    baz = create_task(fail, name='baz', dependencies=('bar',))
+
+    results = run_tasks((foo, bar, baz), profiler=profiler)
+
+    assert_equals(results.completed, frozenset(('foo', 'bar')))
+
+    timings = dict((timing.name, timing) for timing in profiler.timings)
+
+    assert_equals(frozenset(timings), frozenset(('foo', 'bar', 'baz')))
+
+    for name in ('foo', 'bar'):
+        timing = timings[name]
+
+        assert_true(timing.successful)
+        assert_true(
+            timing.queued <= timing.started <= timing.finished <=
+            timing.completed
+        )
+        assert_equals(timing.worker[0], os.getpid())
+        assert_true(timing.collect >= 0)
+        assert_true(timing.store >= 0)
+
+    assert_true(timings['foo'].finished - timings['foo'].started >= 0.01)
+    assert_equals(timings['bar'].dependencies, frozenset(('foo',)))
+
+    assert_true(not timings['baz'].successful)
+    assert_true(timings['baz'].started is None)
+    assert_true(timings['baz'].completed is not None)
+
+    assert_equals(
+        [timing.name for timing in profiler.critical_path()],
+        ['foo', 'bar', 'baz'],
+    )
+
+    summary = profiler.summary()
+
+    assert_equals(summary['tasks'], 3)
+    assert_equals(summary['failed'], 1)
+    assert_equals(summary['critical_path'], ['foo', 'bar', 'baz'])
+    assert_true(summary['running'] >= 0.01)
+
+
+def test_chrome_trace():
+    """
+    Export a Chrome trace
+    """
+    from arbiter.profiler import Profiler
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task
+
+    profiler = Profiler()
+
+    with Runner(max_processes=2) as runner:
+        runner.run_tasks(
+            (
+                create_task(os.getpid, name='foo', backend=Backend.process),
+                create_task(fail, name='bar', backend=Backend.process),
+            ),
+            profiler=profiler,
+        )
+
+    timings = dict((timing.name, timing) for timing in profiler.timings)
+
+    assert_true(timings['foo'].worker[0] != os.getpid())
+
+    trace = json.loads(json.dumps(profiler.chrome_trace()))
+    events = dict(
+        (event['name'], event) for event in trace['traceEvents']
+    )
+
+    assert_equals(events['foo']['ph'], 'X')
+    assert_equals(events['foo']['cat'], 'task')
+    assert_equals(events['foo']['pid'], timings['foo'].worker[0])
+    assert_equals(events['bar']['cat'], 'failed')
+    assert_true('collect foo' in events)
+    assert_true('store foo' in events)
+
+
+def fail():
+    """
+    A task that fails
+    """
+    raise Exception("Failure Test")
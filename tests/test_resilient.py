@@ -0,0 +1,157 @@
+"""
+Tests for the crash-resilient process pool.
+"""
+import os
+import signal
+from time import sleep, time
+
+from nose.tools import assert_equals, assert_true
+
+
+def test_executor():
+    """
+    Only the task which crashes its worker fails
+    """
+    from arbiter.resilient import ResilientExecutor, WorkerCrashed
+
+    with ResilientExecutor(2) as executor:
+        futures = [executor.submit(nap, index) for index in range(8)]
+        crash_future = executor.submit(crash)
+        futures.extend(executor.submit(nap, index) for index in range(8, 12))
+
+        assert_equals(
+            [future.result() for future in futures], list(range(12))
+        )
+        assert_true(isinstance(crash_future.exception(), WorkerCrashed))
+        assert_true(executor.crashes >= 2)  # the pool, then quarantine
+
+        # the executor carries on working
+        assert_equals(executor.submit(nap, 'after').result(), 'after')
+
+        error = executor.submit(int, 'foo').exception()
+
+        assert_true(isinstance(error, ValueError))
+
+
+def test_runner():
+    """
+    A crashing task doesn't fail the rest of a run
+    """
+    from arbiter.runner import Runner
+    from arbiter.resilient import WorkerCrashed
+    from arbiter.task import Backend, create_task
+
+    tasks = [
+        create_task(nap, index, name=index, backend=Backend.process)
+        for index in range(6)
+    ]
+    tasks.append(create_task(crash, name='crash', backend=Backend.process))
+    tasks.append(create_task(max, *tasks[:6], name='max'))
+    tasks.append(create_task(len, tasks[-2], name='blocked'))
+
+    with Runner(max_processes=2, resilient=True) as runner:
+        results = runner.run_tasks(tasks)
+
+    assert_equals(len(results.completed), 7)
+    assert_equals(results.failed, frozenset(('crash', 'blocked')))
+    assert_true(isinstance(results.exceptions[0], WorkerCrashed))
+
+
+def test_quarantine():
+    """
+    Tasks interrupted by a crash are rerun side by side
+    """
+    from arbiter.resilient import ResilientExecutor, WorkerCrashed
+
+    with ResilientExecutor(4) as executor:
+        futures = [executor.submit(span) for _ in range(3)]
+        crash_future = executor.submit(crash)
+
+        spans = [future.result() for future in futures]
+
+        assert_true(isinstance(crash_future.exception(), WorkerCrashed))
+
+    # every rerun overlapped with every other one
+    starts, ends = zip(*spans)
+
+    assert_true(max(starts) < min(ends))
+
+
+def nap(value):
+    """
+    Sleep briefly, then return a value
+    """
+    sleep(0.05)
+
+    return value
+
+
+def span():
+    """
+    Sleep, then return when the task started and finished
+    """
+    started = time()
+    sleep(0.5)
+
+    return started, time()
+
+
+def crash():
+    """
+    Kill the worker running the task
+    """
+    sleep(0.02)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_recycling():
+    """
+    Recycle workers after a number of tasks or once they grow too large
+    """
+    from arbiter.resilient import ResilientExecutor
+
+    for kwargs in ({'max_tasks': 2}, {'max_memory': 1}):
+        with ResilientExecutor(2, **kwargs) as executor:
+            futures = [executor.submit(worker, index) for index in range(20)]
+            results = [future.result() for future in futures]
+
+        assert_equals([value for value, _ in results], list(range(20)))
+        assert_true(len(set(pid for _, pid in results)) > 2)
+        assert_true(executor.recycled > 0)
+        assert_equals(executor.crashes, 0)
+
+    with ResilientExecutor(2, max_memory=2 ** 60) as executor:
+        pids = set(
+            executor.submit(worker, index).result()[1]
+            for index in range(10)
+        )
+
+    assert_true(len(pids) <= 2)
+    assert_equals(executor.recycled, 0)
+
+
+def test_runner_recycling():
+    """
+    Recycle a Runner's process workers
+    """
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task, TaskStore
+
+    tasks = [
+        create_task(worker, index, name=index, backend=Backend.process)
+        for index in range(12)
+    ]
+    store = TaskStore()
+
+    with Runner(max_processes=2, max_tasks_per_worker=3) as runner:
+        results = runner.run_tasks(tasks, store=store)
+
+    assert_equals(len(results.completed), 12)
+    assert_true(len(set(store.get(index)[1] for index in range(12))) > 2)
+
+
+def worker(value):
+    """
+    Return a value along with the worker's pid
+    """
+    return value, os.getpid()
@@ -0,0 +1,226 @@
+"""
+Tests for the long-lived task runner.
+"""
+import os
+from threading import Event
+from time import sleep
+
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_empty():
+    """
+    Solve no tasks (runner)
+    """
+    from arbiter.runner import Runner
+
+    with Runner(2, 2) as runner:
+        results = runner.run_tasks(())
+
+    assert_equals(results.completed, frozenset())
+    assert_equals(results.failed, frozenset())
+
+
+def test_reuse():
+    """
+    Process pools are kept warm between runs
+    """
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task
+
+    pids = []
+
+    def make_tasks():
+        """
+        Make a batch of tasks recording the pids of their workers
+        """
+        tasks = [
+            create_task(os.getpid, name=index, backend=Backend.process)
+            for index in range(4)
+        ]
+
+        tasks.append(
+            create_task(
+                lambda *values: pids.append(frozenset(values)),
+                *tasks,
+                backend=Backend.inline
+            )
+        )
+
+        return tasks
+
+    with Runner(max_processes=2) as runner:
+        runner.start()
+
+        first = runner.run_tasks(make_tasks())
+        second = runner.run_tasks(make_tasks())
+
+    assert_equals(len(first.completed), 5)
+    assert_equals(len(second.completed), 5)
+    assert_equals(len(pids), 2)
+    assert_true(len(pids[0] | pids[1]) <= 2)
+
+
+def test_state():
+    """
+    Initializers and preloaded state are available to tasks
+    """
+    from arbiter.compat import POOL_INITIALIZERS
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task
+
+    if not POOL_INITIALIZERS:
+        assert_raises(RuntimeError, Runner, initializer=initialize)
+        assert_raises(RuntimeError, Runner, state={'table': {}})
+        return
+
+    results = []
+
+    runner = Runner(
+        max_threads=2,
+        max_processes=2,
+        initializer=initialize,
+        initargs=('initialized',),
+        state={'table': {'foo': 'bar'}},
+    )
+
+    with runner:
+        for backend in (Backend.thread, Backend.process):
+            table = create_task(read_state, 'table', backend=backend)
+            initialized = create_task(read_state, 'init', backend=backend)
+
+            runner.run_tasks(
+                (
+                    table,
+                    initialized,
+                    create_task(
+                        lambda *values: results.append(values),
+                        table,
+                        initialized,
+                        backend=Backend.inline,
+                    ),
+                )
+            )
+
+    assert_equals(
+        results,
+        [({'foo': 'bar'}, 'initialized'), ({'foo': 'bar'}, 'initialized')]
+    )
+
+
+def test_shutdown():
+    """
+    A runner can be used again after being shut down
+    """
+    from arbiter.runner import Runner
+    from arbiter.task import create_task
+
+    runner = Runner(max_threads=1)
+
+    assert_equals(
+        runner.run_tasks((create_task(len, (), name='foo'),)).completed,
+        frozenset(('foo',))
+    )
+
+    runner.shutdown()
+
+    assert_equals(
+        runner.run_tasks((create_task(len, (), name='bar'),)).completed,
+        frozenset(('bar',))
+    )
+
+    runner.shutdown()
+
+
+def test_submit():
+    """
+    Concurrent runs don't share task names
+    """
+    from arbiter.runner import Runner
+    from arbiter.task import create_task
+
+    outputs = {}
+
+    def make_tasks(label):
+        """
+        Make a small DAG whose task names clash with other DAGs
+        """
+        foo = create_task(lambda: label, name='foo')
+        bar = create_task(lambda value: value * 2, foo, name='bar')
+        fail = create_task(failure, name='fail')
+        baz = create_task(lambda value: value, fail, name='baz')
+        qux = create_task(
+            lambda value: outputs.setdefault(label, value), bar, name='qux'
+        )
+
+        return (foo, bar, fail, baz, qux)
+
+    with Runner(max_threads=2) as runner:
+        futures = [runner.submit(make_tasks(label)) for label in 'abc']
+
+        for future in futures:
+            results = future.result()
+
+            assert_equals(results.completed, frozenset(('foo', 'bar', 'qux')))
+            assert_equals(results.failed, frozenset(('fail', 'baz')))
+
+    assert_equals(outputs, {'a': 'aa', 'b': 'bb', 'c': 'cc'})
+
+
+def test_weights():
+    """
+    Concurrent runs share the pool according to their weights
+    """
+    from arbiter.runner import Runner
+    from arbiter.task import create_task
+
+    order = []
+    release = Event()
+
+    def make_tasks(label):
+        """
+        Make independent tasks which record when they run
+        """
+        return [
+            create_task(lambda: sleep(0.01) or order.append(label))
+            for _ in range(12)
+        ]
+
+    with Runner(max_threads=1) as runner:
+        blocker = runner.submit((create_task(release.wait),))
+        light = runner.submit(make_tasks('light'), weight=1)
+        heavy = runner.submit(make_tasks('heavy'), weight=3)
+
+        sleep(0.1)
+        release.set()
+
+        for future in (blocker, light, heavy):
+            future.result()
+
+    assert_equals(len(order), 24)
+    assert_true(order[:12].count('heavy') >= 8)
+
+
+def failure():
+    """
+    A task that fails
+    """
+    raise Exception("Failure Test")
+
+
+def initialize(value):
+    """
+    A worker initializer
+    """
+    from arbiter.runner import worker_state
+
+    worker_state()['init'] = value
+
+
+def read_state(key):
+    """
+    Read a value from the worker's state
+    """
+    from arbiter.runner import worker_state
+
+    return worker_state()[key]
@@ -417,6 +417,158 @@ def test_context_manager():
     )
 
 
+def test_frozen():
+    """
+    use a frozen Scheduler in the context manager
+    """
+    from arbiter.compact import CountingGraph
+    from arbiter.scheduler import Scheduler
+
+    completed = set()
+    failed = set()
+    tasks = (
+        create_task('foo'),
+        create_task('bar', ('foo',)),
+        create_task('baz', ('bar', 'foo')),
+        create_task('bell', ('bar',)),
+        create_task('lorem', ()),
+        create_task('ipsum', ('lorem',)),
+        create_task('node'),
+        create_task('failed', ('fake',)),
+    )
+
+    scheduler = Scheduler(
+        tasks, completed=completed, failed=failed, frozen=True
+    )
+
+    with scheduler:
+        assert_true(isinstance(scheduler._graph, CountingGraph))
+        assert_equals(failed, frozenset(('failed',)))
+        assert_equals(scheduler.runnable, frozenset(('foo', 'lorem', 'node')))
+        assert_raises(TypeError, scheduler.add_task, create_task('new'))
+
+        scheduler.start_task('foo')
+        scheduler.end_task('foo')
+
+        assert_equals(completed, frozenset(('foo',)))
+        assert_equals(scheduler.runnable, frozenset(('bar', 'lorem', 'node')))
+
+        scheduler.start_task('bar')
+        scheduler.end_task('bar')
+
+        assert_equals(
+            scheduler.runnable, frozenset(('baz', 'bell', 'lorem', 'node'))
+        )
+
+        scheduler.start_task('lorem')
+        scheduler.end_task('lorem', False)
+
+        assert_equals(completed, frozenset(('foo', 'bar')))
+        assert_equals(failed, frozenset(('failed', 'lorem', 'ipsum')))
+
+        scheduler.start_task('baz')
+
+    assert_equals(completed, frozenset(('foo', 'bar')))
+    assert_equals(
+        failed,
+        frozenset(('failed', 'lorem', 'ipsum', 'baz', 'bell', 'node'))
+    )
+    assert_true(scheduler.is_finished())
+
+
+def test_frozen_order():
+    """
+    A frozen Scheduler starts tasks in the order they became runnable
+    """
+    from arbiter.scheduler import Scheduler
+    from arbiter.task import create_task_array
+
+    completed = set()
+
+    scheduler = Scheduler(
+        (
+            create_task('foo'),
+            create_task('bar', ('foo',)),
+            create_task_array(
+                None, 'abc', name='array', dependencies=('foo',)
+            ),
+            create_task('baz'),
+            create_task_array(None, (), name='empty', dependencies=('bar',)),
+            create_task('qux', ('empty',)),
+        ),
+        completed=completed,
+        frozen=True,
+    )
+
+    with scheduler:
+        assert_equals(scheduler.start_task().name, 'foo')
+        assert_equals(scheduler.start_task('baz').name, 'baz')
+        assert_equals(scheduler.start_task(), None)  # baz is running
+
+        scheduler.end_task('foo')
+        scheduler.end_task('baz')
+
+        started = [scheduler.start_task().name for _ in range(4)]
+
+        assert_equals(
+            started, ['bar', ('array', 0), ('array', 1), ('array', 2)]
+        )
+        assert_equals(scheduler.start_task(), None)
+
+        scheduler.end_task('bar')
+
+        # empty arrays complete as soon as they are runnable
+        assert_equals(scheduler.start_task().name, 'qux')
+        assert_true('empty' in completed)
+
+        for name in started[1:]:
+            scheduler.end_task(name)
+
+        scheduler.end_task('qux')
+
+        assert_true(scheduler.is_finished())
+
+    assert_equals(
+        completed,
+        frozenset(
+            ('foo', 'bar', 'baz', 'array', 'empty', 'qux') +
+            tuple(('array', index) for index in range(3))
+        )
+    )
+
+
+def test_frozen_build():
+    """
+    A frozen Scheduler builds its graph when entered
+    """
+    from arbiter.scheduler import Scheduler
+
+    failed = set()
+    tasks = (
+        create_task('foo'),
+        create_task('bar', ('foo',)),
+        create_task('baz', ('bar', 'foo')),
+        create_task('other'),
+        create_task('cycle', ('loop',)),
+        create_task('loop', ('cycle',)),
+        create_task('orphan', ('stub',)),
+    )
+
+    scheduler = Scheduler(tasks, failed=failed, frozen=True)
+
+    assert_equals(scheduler.runnable, frozenset())
+    assert_raises(KeyError, scheduler.restrict, ('stub',))
+    assert_equals(
+        scheduler.restrict(('bar', 'loop')),
+        frozenset(('baz', 'other', 'orphan')),
+    )
+    assert_raises(KeyError, scheduler.restrict, ('fake',))
+
+    with scheduler:
+        assert_equals(scheduler.runnable, frozenset(('foo',)))
+        assert_equals(failed, frozenset(('cycle', 'loop')))
+
+
 # def test_naming():
 #     """
 #     Names just need to be hashable and not be None.
@@ -434,3 +586,283 @@ def test_context_manager():
 #     scheduler.add_task(create_task(sum,))
 
 #     scheduler.
+
+
+def test_restrict():
+    """
+    Restrict a Scheduler to the tasks some targets need
+    """
+    from arbiter.scheduler import Scheduler
+
+    completed = set(('done',))
+    failed = set()
+
+    scheduler = Scheduler(
+        (
+            create_task('foo'),
+            create_task('bar', ('foo', 'done')),
+            create_task('baz', ('bar',)),
+            create_task('bell', ('foo',)),
+            create_task('lorem'),
+            create_task('ipsum', ('lorem',)),
+            create_task('orphan', ('fake',)),
+            create_task('broken', ('fake',)),
+            create_task('cycle', ('cycle',)),
+        ),
+        completed=completed,
+        failed=failed,
+    )
+
+    assert_raises(KeyError, scheduler.restrict, ('unknown',))
+    assert_raises(KeyError, scheduler.restrict, ('bar', 'fake'))  # a stub
+
+    dropped = scheduler.restrict(('bar', 'orphan', 'done', 'cycle'))
+
+    assert_equals(
+        dropped, frozenset(('baz', 'bell', 'lorem', 'ipsum', 'broken'))
+    )
+    assert_equals(scheduler.runnable, frozenset(('foo',)))
+
+    with scheduler:
+        assert_equals(failed, frozenset(('cycle', 'orphan')))
+
+        scheduler.end_task(scheduler.start_task().name)
+        scheduler.end_task(scheduler.start_task().name)
+
+        assert_true(scheduler.is_finished())
+
+    assert_equals(completed, frozenset(('done', 'foo', 'bar')))
+    assert_equals(failed, frozenset(('cycle', 'orphan')))
+
+
+def test_task_array():
+    """
+    Run a task array's elements through a Scheduler
+    """
+    from arbiter.scheduler import ConcurrentScheduler, Scheduler
+
+    for cls in (Scheduler, ConcurrentScheduler):
+        check_task_array(cls)
+
+
+def check_task_array(cls):
+    """
+    Run a task array's elements through a scheduler class
+    """
+    from arbiter.task import create_task_array
+
+    completed = set()
+    failed = set()
+
+    scheduler = cls(
+        (
+            create_task('foo'),
+            create_task_array(
+                None, 'abc', name='array', dependencies=('foo',)
+            ),
+            create_task('bar', ('array',)),
+            create_task_array(None, (), name='empty', dependencies=('bar',)),
+            create_task('baz', ('empty',)),
+        ),
+        completed=completed,
+        failed=failed,
+    )
+
+    with scheduler:
+        scheduler.end_task(scheduler.start_task('foo').name)
+
+        assert_equals(scheduler.runnable, frozenset(('array',)))
+
+        first = scheduler.start_task()
+        second = scheduler.start_task('array')
+        third = scheduler.start_task()
+
+        assert_equals(first.name, ('array', 0))
+        assert_equals(first.args, ('a',))
+        assert_equals(third.args, ('c',))
+        assert_equals(scheduler.start_task(), None)
+        assert_raises(ValueError, scheduler.start_task, 'array')
+        assert_false(scheduler.is_finished())
+
+        scheduler.end_task(second.name)
+        scheduler.end_task(third.name)
+
+        assert_false('array' in completed)
+        assert_equals(scheduler.start_task(), None)
+
+        scheduler.end_task(first.name)
+
+        assert_true('array' in completed)
+        assert_true(('array', 2) in completed)
+
+        scheduler.end_task(scheduler.start_task().name)
+
+        # empty arrays complete as soon as they are runnable
+        assert_equals(scheduler.start_task().name, 'baz')
+        assert_true('empty' in completed)
+
+    assert_equals(failed, frozenset(('baz',)))
+
+
+def test_task_array_failure():
+    """
+    A failing element fails its task array
+    """
+    from arbiter.scheduler import Scheduler
+    from arbiter.task import create_task_array
+
+    completed = set()
+    failed = set()
+
+    scheduler = Scheduler(
+        (
+            create_task_array(None, 'abc', name='array'),
+            create_task('bar', ('array',)),
+        ),
+        completed=completed,
+        failed=failed,
+    )
+
+    with scheduler:
+        first = scheduler.start_task()
+        second = scheduler.start_task()
+
+        scheduler.end_task(first.name, False)
+
+        assert_equals(failed, frozenset((first.name, 'array', 'bar')))
+        assert_equals(scheduler.start_task(), None)
+        assert_false(scheduler.is_finished())
+
+        scheduler.end_task(second.name)
+
+        assert_true(scheduler.is_finished())
+
+    assert_equals(completed, frozenset((second.name,)))
+
+    scheduler = Scheduler(
+        (create_task_array(None, 'abc', name='array'),), failed=failed
+    )
+
+    with scheduler:
+        running = scheduler.start_task()
+
+    assert_true(running.name in failed)
+
+
+def test_concurrent():
+    """
+    Drive a ConcurrentScheduler from many threads at once
+    """
+    for frozen in (False, True):
+        check_concurrent(frozen)
+
+
+def check_concurrent(frozen):
+    """
+    Drive a (possibly frozen) ConcurrentScheduler from many threads
+    """
+    from random import Random
+    from threading import Lock, Thread
+
+    from arbiter.scheduler import ConcurrentScheduler
+
+    random = Random(49)
+    tasks = []
+
+    for index in range(500):
+        dependencies = random.sample(range(index), min(index, 3))
+        tasks.append(create_task(index, dependencies))
+
+    doomed = frozenset(random.sample(range(500), 10))
+
+    completed = set()
+    failed = set()
+    started = []
+    lock = Lock()
+
+    scheduler = ConcurrentScheduler(
+        tasks, completed=completed, failed=failed, frozen=frozen
+    )
+
+    def work():
+        task = scheduler.next_task()
+
+        while task is not None:
+            with lock:
+                started.append(task.name)
+
+            for dependency in task.dependencies:
+                assert_true(dependency in scheduler.completed)
+
+            scheduler.end_task(task.name, task.name not in doomed)
+            task = scheduler.next_task()
+
+    with scheduler:
+        workers = [Thread(target=work) for _ in range(16)]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        assert_true(scheduler.is_finished())
+
+    assert_equals(len(started), len(set(started)))
+    assert_equals(completed & failed, frozenset())
+    assert_equals(completed | failed, frozenset(range(500)))
+    assert_true(doomed <= failed)
+    assert_equals(completed, frozenset(started) - doomed)
+
+
+def test_concurrent_arrays():
+    """
+    Hand out task array elements to many threads at once
+    """
+    from threading import Lock, Thread
+
+    from arbiter.scheduler import ConcurrentScheduler
+    from arbiter.task import create_task_array, Element
+
+    tasks = [create_task('foo')]
+
+    for index in range(20):
+        tasks.append(
+            create_task_array(
+                None, range(index), name=index, dependencies=('foo',)
+            )
+        )
+
+    tasks.append(create_task('bar', range(20)))
+
+    completed = set()
+    started = []
+    lock = Lock()
+
+    scheduler = ConcurrentScheduler(tasks, completed=completed)
+
+    def work():
+        task = scheduler.next_task()
+
+        while task is not None:
+            with lock:
+                started.append(task.name)
+
+            scheduler.end_task(task.name)
+            task = scheduler.next_task()
+
+    with scheduler:
+        workers = [Thread(target=work) for _ in range(16)]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+    elements = [name for name in started if isinstance(name, Element)]
+
+    assert_equals(len(elements), sum(range(20)))
+    assert_equals(len(elements), len(set(elements)))
+    assert_equals(started[-1], 'bar')
+    assert_true(frozenset(range(20)) <= completed)
@@ -0,0 +1,147 @@
+"""
+Tests for the serialize module.
+"""
+import os
+
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_pickle():
+    """
+    Round-trip objects through a PickleSerializer
+    """
+    from arbiter.serialize import PickleSerializer
+
+    serializer = PickleSerializer()
+    value = {'foo': [1, 2.5, None], 'bar': ('baz',)}
+
+    assert_equals(serializer.loads(serializer.dumps(value)), value)
+
+    payload = bytearray(b'x' * 100000)
+    frames = serializer.dumps(payload)
+
+    assert_equals(len(frames), 1)
+    assert_equals(serializer.loads(frames), payload)
+
+    frames = PickleSerializer(protocol=2).dumps(payload)
+
+    assert_equals(len(frames), 1)
+    assert_equals(PickleSerializer().loads(frames), payload)
+
+
+def test_optional():
+    """
+    Serializers with missing dependencies can't be created
+    """
+    from arbiter import serialize
+
+    for module, cls in (
+        ('cloudpickle', serialize.CloudPickleSerializer),
+        ('msgpack', serialize.MsgpackSerializer),
+        ('pyarrow', serialize.ArrowSerializer),
+    ):
+        if getattr(serialize, module) is None:
+            assert_raises(ImportError, cls)
+        else:
+            serializer = cls()
+            value = {'foo': [1, 2]}
+
+            assert_equals(serializer.loads(serializer.dumps(value)), value)
+
+
+def test_cloudpickle():
+    """
+    Serialize closures with cloudpickle
+    """
+    from arbiter import serialize
+
+    if serialize.cloudpickle is None:
+        raise SkipTest('cloudpickle is not installed')
+
+    serializer = serialize.CloudPickleSerializer()
+    offset = 3
+
+    function = serializer.loads(
+        serializer.dumps(lambda value: value + offset)
+    )
+
+    assert_equals(function(1), 4)
+
+
+def test_processes():
+    """
+    Run unpicklable tasks in processes with a serializer
+    """
+    from arbiter import serialize
+    from arbiter.profiler import Profiler
+    from arbiter.runner import Runner
+    from arbiter.task import Backend, create_task
+
+    if serialize.cloudpickle is None:
+        raise SkipTest('cloudpickle is not installed')
+
+    events = {}
+
+    def hook(event, name, value):
+        """
+        Record serialization events
+        """
+        if event in ('serialize', 'deserialize', 'task_bytes',
+                     'result_bytes'):
+            events.setdefault(event, {})[name] = value
+
+    offset = 3
+    parent = os.getpid()
+
+    foo = create_task(
+        lambda: (os.getpid(), offset), name='foo', backend=Backend.process
+    )
+    bar = create_task(
+        lambda value: value[0] != parent and value[1] + offset,
+        foo,
+        name='bar',
+        backend=Backend.process,
+        serializer=serialize.CloudPickleSerializer(),
+    )
+    baz = create_task(
+        check, bar, name='baz', backend=Backend.process,
+        serializer=serialize.PickleSerializer(),
+    )
+
+    with Runner(max_processes=2) as runner:
+        # without a serializer, lambdas can't be sent to processes
+        results = runner.run_tasks((foo, bar, baz))
+
+        assert_equals(results.failed, frozenset(('foo', 'bar', 'baz')))
+
+    profiler = Profiler()
+
+    with Runner(
+        max_processes=2, serializer=serialize.CloudPickleSerializer()
+    ) as runner:
+        results = runner.run_tasks(
+            (foo, bar, baz), hooks=(hook,), profiler=profiler
+        )
+
+    assert_equals(results.completed, frozenset(('foo', 'bar', 'baz')))
+
+    for event in ('serialize', 'deserialize', 'task_bytes', 'result_bytes'):
+        assert_equals(
+            frozenset(events[event]), frozenset(('foo', 'bar', 'baz'))
+        )
+
+    assert_true(events['task_bytes']['foo'] > 0)
+    assert_true(
+        all(timing.worker[0] != parent for timing in profiler.timings)
+    )
+
+
+def check(value):
+    """
+    Fail unless a value is truthy
+    """
+    if not value:
+        raise ValueError(value)
+
+    return value
@@ -0,0 +1,92 @@
+"""
+Tests for objects shared with forked workers.
+"""
+import os
+
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_registry():
+    """
+    Register and unregister shared objects
+    """
+    from arbiter.shared import register, shared, unregister
+
+    first = {'table': [1, 2, 3]}
+    second = {'table': [4, 5]}
+
+    assert_raises(KeyError, shared, 'table')
+
+    register(first)
+    register(second)
+
+    assert_true(shared('table') is second['table'])
+
+    unregister(first)  # replaced, so left alone
+
+    assert_true(shared('table') is second['table'])
+
+    unregister(second)
+
+    assert_raises(KeyError, shared, 'table')
+
+
+def test_fork_context():
+    """
+    Pools are told to fork where they can be
+    """
+    from arbiter.compat import POOL_CONTEXTS
+    from arbiter.shared import fork_context
+
+    context = fork_context()
+
+    if POOL_CONTEXTS:
+        assert_equals(context.get_start_method(), 'fork')
+    else:
+        assert_true(context is None)
+
+
+def test_runner():
+    """
+    Process workers inherit shared objects without serializing them
+    """
+    from arbiter.runner import Runner
+    from arbiter.shared import shared
+    from arbiter.task import Backend, create_task, TaskStore
+
+    table = list(range(100000))
+    objects = {
+        'table': table,
+        'offset': lambda value: value + 1,  # can't be pickled
+    }
+
+    tasks = [
+        create_task(inspect, name='process', backend=Backend.process),
+        create_task(inspect, name='thread', backend=Backend.thread),
+    ]
+    store = TaskStore()
+
+    with Runner(max_processes=2, shared=objects) as runner:
+        results = runner.run_tasks(tasks, store=store)
+
+    assert_equals(results.completed, frozenset(('process', 'thread')))
+
+    pid, identity, value = store.get('process')
+
+    assert_true(pid != os.getpid())
+    assert_equals(identity, id(table))  # the parent's object, forked
+    assert_equals(value, 100000)
+    assert_equals(store.get('thread'), (os.getpid(), id(table), 100000))
+
+    assert_raises(KeyError, shared, 'table')
+
+
+def inspect():
+    """
+    Look at the shared objects
+    """
+    from arbiter.shared import shared
+
+    table = shared('table')
+
+    return (os.getpid(), id(table), shared('offset')(table[-1]))
@@ -0,0 +1,463 @@
+"""
+Tests for the shared task stores.
+"""
+import os
+import pickle
+import shutil
+from tempfile import mkdtemp
+
+from nose.tools import assert_equals, assert_false, assert_raises, assert_true
+
+from arbiter.task import batchable
+
+
+def test_file_store():
+    """
+    Keep results in a FileStore
+    """
+    from arbiter.store import FileStore, Reference, resolve
+
+    with FileStore() as store:
+        directory = store.directory
+
+        assert_raises(KeyError, store.get, 'foo')
+
+        store.put('foo', [1, 2, 3])
+        store.put(('bar', 1), None)
+
+        assert_equals(store.get('foo'), [1, 2, 3])
+        assert_equals(store.get(('bar', 1)), None)
+
+        store.put('foo', 'replaced')
+
+        assert_equals(store.get('foo'), 'replaced')
+
+        reference = store.reference('foo')
+
+        assert_true(isinstance(reference, Reference))
+        assert_equals(resolve(reference), 'replaced')
+        assert_equals(resolve('foo'), 'foo')
+
+        # copies (e.g., in workers) share the directory but don't own it
+        copy = pickle.loads(pickle.dumps(reference))
+
+        assert_equals(resolve(copy), 'replaced')
+
+        copy.store.close()
+
+        assert_true(os.path.isdir(directory))
+
+    assert_false(os.path.exists(directory))
+
+
+def test_file_store_cache():
+    """
+    Recently read results are cached
+    """
+    from arbiter.store import FileStore
+
+    with FileStore() as store:
+        store.put('foo', [1, 2, 3])
+
+        assert_true(store.get('foo') is store.get('foo'))
+
+        uncached = FileStore(store.directory, cache_size=0)
+
+        assert_equals(uncached.get('foo'), [1, 2, 3])
+        assert_false(uncached.get('foo') is uncached.get('foo'))
+
+        first = store.get('foo')
+        store.put('foo', [4, 5])
+
+        assert_equals(store.get('foo'), [4, 5])
+        assert_equals(first, [1, 2, 3])
+
+
+def test_compressed_store():
+    """
+    Compress large results
+    """
+    from threading import Lock
+
+    from arbiter.store import (
+        _size_bound, CODECS, CompressedStore, FileStore,
+    )
+    from arbiter.task import TaskStore
+
+    inner = TaskStore()
+    store = CompressedStore(inner, threshold=1000)
+
+    store.put('small', [1, 2, 3])
+    store.put('large', [b'x' * 100] * 1000)
+
+    assert_equals(store.get('small'), [1, 2, 3])
+    assert_equals(store.get('large'), [b'x' * 100] * 1000)
+    assert_equals(inner.get('small'), [1, 2, 3])
+
+    compressed = inner.get('large')
+
+    assert_true(compressed.codec in CODECS)
+    assert_true(len(compressed.data) < 1000)
+
+    stats = store.stats
+
+    assert_equals(stats['compressed'], 1)
+    assert_true(stats['stored_bytes'] < stats['raw_bytes'])
+    assert_equals(frozenset(stats['codecs']), frozenset(CODECS))
+
+    for codec in CODECS:
+        assert_true(stats['codecs'][codec]['ratio'] > 1)
+        assert_true(stats['codecs'][codec]['speed'] > 0)
+
+    assert_raises(KeyError, store.get, 'fake')
+
+    # unpicklable results are stored as they are
+    lock = Lock()
+    store.put('lock', lock)
+
+    assert_true(store.get('lock') is lock)
+    assert_equals(store.stats['compressed'], 1)
+
+    # values which are certainly small aren't pickled to measure them
+    assert_true(_size_bound(None) < 100)
+    assert_true(_size_bound([1, 2.5, u'foo', b'bar', {'baz': ()}]) < 1000)
+    assert_true(_size_bound(lock) is None)
+    assert_true(_size_bound(list(range(10000))) is None)
+
+    for value in (
+        b'x' * 999, u'\u20ac' * 100, [2 ** 1000, 1.5, None, True],
+        {'foo': (1, 2), 'bar': frozenset((3,))}, (b'y' * 100,) * 5,
+    ):
+        assert_true(
+            _size_bound(value) >= len(pickle.dumps(value, -1))
+        )
+
+    assert_raises(ValueError, CompressedStore, codecs=('fake',))
+    assert_raises(ValueError, CompressedStore, codecs=())
+
+    # codecs are chosen by ratio, unless they are too slow
+    for min_speed, codec in ((0, 'bz2'), (float('inf'), 'zlib')):
+        store = CompressedStore(
+            threshold=0, codecs=('bz2', 'zlib'), min_speed=min_speed,
+            samples=0, resample=0,
+        )
+        store._stats = {'bz2': (10.0, 1e6), 'zlib': (4.0, 1e8)}
+
+        store.put('foo', b'foo' * 1000)
+
+        assert_equals(store.stats['codec'], codec)
+        assert_equals(store.get('foo'), b'foo' * 1000)
+
+    # compressed stores can be shared with workers
+    with FileStore() as files:
+        store = CompressedStore(files, threshold=0)
+        store.put('foo', 'bar')
+
+        copy = pickle.loads(pickle.dumps(store.reference('foo')))
+
+        assert_equals(copy.store.get('foo'), 'bar')
+
+
+def test_sqlite_store():
+    """
+    Keep results in a SQLite database
+    """
+    from arbiter.store import SQLiteStore
+
+    directory = mkdtemp()
+    path = os.path.join(directory, 'results.db')
+
+    try:
+        with SQLiteStore(path, batch_size=3, blob_threshold=1000) as store:
+            assert_raises(KeyError, store.get, 'foo')
+            assert_false('foo' in store)
+
+            store.put('foo', [1, 2, 3])
+            store.put(('bar', 1), b'raw bytes')
+
+            # buffered results are visible to the writer
+            assert_true('foo' in store)
+            assert_equals(store.get('foo'), [1, 2, 3])
+
+            other = SQLiteStore(path)
+
+            assert_false('foo' in other)
+
+            store.put('baz', b'x' * 5000)  # fills the batch
+
+            assert_equals(other.get('foo'), [1, 2, 3])
+            assert_equals(other.get(('bar', 1)), b'raw bytes')
+            assert_equals(other.get('baz'), b'x' * 5000)
+
+            store.put('foo', {'replaced': True})
+            store.flush()
+
+            assert_equals(other.get('foo'), {'replaced': True})
+
+            blob = store.open('baz')
+
+            assert_equals(blob.read(10), b'x' * 10)
+            assert_equals(len(blob.read()), 4990)
+            blob.close()
+
+            assert_raises(ValueError, store.open, 'foo')
+            assert_raises(KeyError, store.open, 'fake')
+
+            other.close()
+
+            copy = pickle.loads(pickle.dumps(store.reference('foo')))
+
+            assert_equals(copy.store.get('foo'), {'replaced': True})
+
+            store.put('qux', 'unflushed')
+
+        # results are durable
+        with SQLiteStore(path) as store:
+            assert_equals(store.get('qux'), 'unflushed')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_sqlite_processes():
+    """
+    Share a SQLite store between processes
+    """
+    from arbiter.runner import Runner
+    from arbiter.store import SQLiteStore
+    from arbiter.task import Backend, create_task
+
+    directory = mkdtemp()
+
+    try:
+        store = SQLiteStore(os.path.join(directory, 'results.db'))
+
+        tasks = [
+            create_task(
+                make_bytes, size, name=size, backend=Backend.process
+            )
+            for size in range(10)
+        ]
+        tasks.append(
+            create_task(
+                total, *tasks, name='total', backend=Backend.process
+            )
+        )
+
+        with Runner(max_processes=3) as runner:
+            results = runner.run_tasks(tasks, store=store, lazy=True)
+
+        assert_equals(len(results.completed), 11)
+        assert_equals(store.get('total'), 45)
+        assert_equals(store.get(3), b'xxx')
+
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_resume():
+    """
+    Resume an interrupted run from its stored results
+    """
+    from arbiter.store import SQLiteStore
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task
+
+    calls = []
+
+    def record(name, succeed=True):
+        """
+        Record that a task ran
+        """
+        calls.append(name)
+
+        if not succeed:
+            raise ValueError(name)
+
+        return name
+
+    directory = mkdtemp()
+    path = os.path.join(directory, 'results.db')
+
+    try:
+        foo = create_task(record, 'foo', name='foo')
+        bar = create_task(
+            record, 'bar', False, name='bar', dependencies=('foo',)
+        )
+        baz = create_task(record, 'baz', name='baz', dependencies=('bar',))
+
+        with SQLiteStore(path) as store:
+            results = run_tasks((foo, bar, baz), store=store)
+
+        assert_equals(results.completed, frozenset(('foo',)))
+        assert_equals(calls, ['foo', 'bar'])
+
+        bar = create_task(record, 'bar', name='bar', dependencies=('foo',))
+
+        with SQLiteStore(path) as store:
+            results = run_tasks((foo, bar, baz), store=store, resume=True)
+
+            assert_equals(store.get('baz'), 'baz')
+
+        assert_equals(results.completed, frozenset(('foo', 'bar', 'baz')))
+        assert_equals(calls, ['foo', 'bar', 'bar', 'baz'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_lazy():
+    """
+    Pass results between tasks by reference
+    """
+    from arbiter.base import task_loop
+    from arbiter.store import FileStore
+    from arbiter.sync import execute
+    from arbiter.task import create_task
+
+    sizes = {}
+
+    def measure(function, name):
+        """
+        Record how big a task is when pickled, then run it
+        """
+        sizes[name] = len(pickle.dumps(function))
+
+        return execute(function, name)
+
+    big = create_task(make_bytes, 1000000, name='big')
+    small = create_task(len, big, name='small')
+    broken = create_task(fail, name='broken')
+    blocked = create_task(len, broken, name='blocked')
+
+    with FileStore() as store:
+        results = task_loop(
+            (big, small, broken, blocked), measure, store=store, lazy=True
+        )
+
+        assert_equals(results.completed, frozenset(('big', 'small')))
+        assert_equals(results.failed, frozenset(('broken', 'blocked')))
+        assert_equals(store.get('small'), 1000000)
+        assert_equals(len(store.get('big')), 1000000)
+
+    assert_true(sizes['small'] < 10000)
+
+
+def test_lazy_processes():
+    """
+    Process workers resolve and store results themselves
+    """
+    from arbiter.runner import Runner
+    from arbiter.store import FileStore
+    from arbiter.task import Backend, create_task
+
+    big = create_task(
+        make_bytes, 100000, name='big', backend=Backend.process
+    )
+    small = create_task(len, big, name='small', backend=Backend.process)
+    pid = create_task(os.getpid, name='pid', backend=Backend.process)
+
+    with FileStore() as store:
+        with Runner(max_processes=2) as runner:
+            results = runner.run_tasks(
+                (big, small, pid), store=store, lazy=True
+            )
+
+        assert_equals(results.completed, frozenset(('big', 'small', 'pid')))
+        assert_equals(store.get('small'), 100000)
+        assert_true(store.get('pid') != os.getpid())
+
+    # a temporary store is used if none is given
+    with Runner(max_processes=2) as runner:
+        results = runner.run_tasks((big, small), lazy=True)
+
+    assert_equals(results.completed, frozenset(('big', 'small')))
+
+
+def test_lazy_array():
+    """
+    Task array results are passed by reference
+    """
+    from arbiter.runner import Runner
+    from arbiter.store import FileStore
+    from arbiter.task import Backend, create_task, create_task_array
+
+    sizes = create_task_array(
+        make_bytes, (1, 2, 3), name='sizes', backend=Backend.process
+    )
+    length = create_task(
+        join, sizes, name='total', backend=Backend.process
+    )
+
+    with FileStore() as store:
+        with Runner(max_processes=2) as runner:
+            results = runner.run_tasks(
+                (sizes, length), store=store, lazy=True
+            )
+
+        assert_true('sizes' in results.completed)
+        assert_equals(store.get(('sizes', 2)), b'xxx')
+        assert_equals(store.get('total'), b'xxxxxx')
+
+
+def test_lazy_batch():
+    """
+    Batched results are stored by the worker
+    """
+    from arbiter.runner import Runner
+    from arbiter.store import FileStore
+    from arbiter.task import Backend, create_task
+
+    tasks = [
+        create_task(lengths, make_bytes(size), name=size,
+                    backend=Backend.process)
+        for size in range(5)
+    ]
+    tasks.append(
+        create_task(
+            make_bytes, tasks[-1], name='last', backend=Backend.process
+        )
+    )
+
+    with FileStore() as store:
+        with Runner(max_processes=2) as runner:
+            results = runner.run_tasks(tasks, store=store, lazy=True)
+
+        assert_equals(len(results.completed), 6)
+        assert_equals(store.get(3), 3)
+        assert_equals(store.get('last'), b'xxxx')
+
+
+def make_bytes(size):
+    """
+    Make a (large) result
+    """
+    return b'x' * size
+
+
+def total(*values):
+    """
+    Add up the lengths of some values
+    """
+    return sum(len(value) for value in values)
+
+
+def join(values):
+    """
+    Join a list of results
+    """
+    return b''.join(values)
+
+
+@batchable(max_size=3)
+def lengths(values):
+    """
+    Measure a batch of values
+    """
+    return [len(value) for value in values]
+
+
+def fail():
+    """
+    A task that fails
+    """
+    raise Exception("Failure Test")
@@ -1,7 +1,7 @@
 """
 Tests for the synchronous task runner.
 """
-from nose.tools import assert_equals
+from nose.tools import assert_equals, assert_raises, assert_true
 
 
 def test_empty():
@@ -176,6 +176,179 @@ def test_with_data():
     assert_equals(data, [4, 5, 6, 2])
 
 
+def test_targets():
+    """
+    Only run the tasks needed for some targets.
+    """
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task
+
+    calls = []
+
+    def record(name):
+        """
+        Record that a task ran.
+        """
+        calls.append(name)
+
+    tasks = (
+        create_task(record, 'foo', name='foo'),
+        create_task(record, 'bar', name='bar', dependencies=('foo',)),
+        create_task(record, 'baz', name='baz', dependencies=('bar',)),
+        create_task(record, 'qux', name='qux', dependencies=('foo',)),
+        create_task(record, 'lorem', name='lorem'),
+    )
+
+    results = run_tasks(tasks, targets=('bar',))
+
+    assert_equals(results.completed, frozenset(('foo', 'bar')))
+    assert_equals(results.failed, frozenset())
+    assert_equals(calls, ['foo', 'bar'])
+
+    # unknown targets aren't silently ignored
+    assert_raises(KeyError, run_tasks, tasks, targets=('bar', 'fake'))
+    assert_raises(
+        KeyError, run_tasks, tasks[1:], targets=('foo',)  # foo is a stub
+    )
+    assert_equals(calls, ['foo', 'bar'])
+
+
+def test_task_array():
+    """
+    Run a task array, passing its results to a downstream task.
+    """
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task, create_task_array
+
+    offset = create_task(lambda: 10, name='offset')
+    array = create_task_array(
+        lambda value, extra: value + extra, range(5), offset, name='array'
+    )
+    total = create_task(sum, array, name='total')
+    broken = create_task_array(
+        lambda value: 1 // value, (1, 0, 2), name='broken'
+    )
+    blocked = create_task(sum, broken, name='blocked')
+
+    results = run_tasks((offset, array, total, broken, blocked))
+
+    assert_equals(
+        results.completed,
+        frozenset(
+            ['offset', 'array', 'total', ('broken', 0)] +
+            [('array', index) for index in range(5)]
+        ),
+    )
+    # once an element fails, the rest of the array isn't started
+    assert_equals(
+        results.failed, frozenset((('broken', 1), 'broken', 'blocked'))
+    )
+
+
+def test_task_array_resume():
+    """
+    Resume a run with a task array, profiling it.
+    """
+    from arbiter.profiler import Profiler
+    from arbiter.sync import run_tasks
+    from arbiter.task import create_task, create_task_array, TaskStore
+
+    calls = []
+
+    def record(value):
+        """
+        Record the call.
+        """
+        calls.append(value)
+
+        return value
+
+    first = create_task(lambda: 'first', name='first')
+    array = create_task_array(
+        lambda value, _: record(value), range(3), first, name='array'
+    )
+    total = create_task(sum, array, name='total')
+
+    store = TaskStore()
+    profiler = Profiler()
+
+    results = run_tasks((first, array, total), profiler=profiler, store=store)
+
+    assert_equals(calls, [0, 1, 2])
+    assert_true('array' in results.completed)
+
+    # the array's node times all of its elements
+    assert_equals(
+        [timing.name for timing in profiler.critical_path()],
+        ['first', 'array', 'total'],
+    )
+
+    results = run_tasks((first, array, total), store=store, resume=True)
+
+    assert_equals(calls, [0, 1, 2])
+    assert_equals(
+        results.completed, frozenset(('first', 'array', 'total'))
+    )
+
+
+def test_batchable():
+    """
+    Coalesce tasks with a batchable function into batches.
+    """
+    from arbiter.profiler import Profiler
+    from arbiter.sync import run_tasks
+    from arbiter.task import (
+        batchable, create_task, create_task_array, TaskStore,
+    )
+
+    calls = []
+
+    @batchable(max_size=4)
+    def double(values):
+        """
+        Double a batch of values.
+        """
+        calls.append(list(values))
+
+        return [value * 2 for value in values]
+
+    @batchable()
+    def broken(values):
+        """
+        Return too few results.
+        """
+        return values[1:]
+
+    @batchable()
+    def empty(values):
+        """
+        Return no sequence at all.
+        """
+        return None
+
+    tasks = [create_task(double, index, name=index) for index in range(6)]
+    tasks.append(create_task(max, *tasks, name='largest'))
+    tasks.append(create_task(double, tasks[-1], name='again'))
+    tasks.append(create_task_array(double, (1, 2), name='array'))
+    tasks.append(create_task(broken, 1, name='broken'))
+    tasks.append(create_task(empty, 1, name='empty'))
+
+    profiler = Profiler()
+    store = TaskStore()
+    results = run_tasks(tasks, profiler=profiler, store=store)
+
+    assert_equals(sorted(len(call) for call in calls), [1, 4, 4])
+    assert_equals(results.failed, frozenset(('broken', 'empty')))
+    assert_equals(
+        sorted(type(exc).__name__ for exc in results.exceptions),
+        ['TypeError', 'ValueError'],
+    )
+    assert_equals(store.get(5), 10)
+    assert_equals(store.get('again'), 20)
+    assert_equals(store.get(('array', 1)), 4)
+    assert_equals(len(profiler.timings), 12)
+
+
 def succeed():
     """
     A task that succeeds
@@ -17,3 +17,65 @@ def test_tasks_with_handler():
     )
 
     run_tasks((foo,))
+
+
+def test_task_array():
+    from arbiter.task import (
+        create_task, create_task_array, element, Element, TaskArray,
+    )
+
+    foo = create_task(len, [1, 2], name='foo')
+    array = create_task_array(
+        pow, range(1000000), 2, name='squares', dependencies=('bar',)
+    )
+
+    assert isinstance(array, TaskArray)
+    assert array.name == 'squares'
+    assert array.dependencies == frozenset(('bar',))
+    assert len(array.items) == 1000000
+
+    task = element(array, 7)
+
+    assert task.name == Element('squares', 7)
+    assert task.name == ('squares', 7)
+    assert repr(task.name) == repr(('squares', 7))
+    assert task.function(*task.args) == 49
+    assert task.dependencies == frozenset(('bar',))
+
+    # arrays can depend on tasks, and tasks on arrays
+    array = create_task_array(max, (value for value in (3, 4)), foo)
+
+    assert array.items == (3, 4)
+    assert array.dependencies == frozenset(('foo',))
+    assert array.name.startswith('max-')
+
+    total = create_task(sum, array)
+
+    assert total.dependencies == frozenset((array.name,))
+
+
+def test_batchable():
+    from arbiter.task import (
+        Batch, batchable, batch_size, create_task, Element, origin,
+    )
+
+    @batchable(max_size=8)
+    def double(values):
+        return [value * 2 for value in values]
+
+    assert double([1, 2]) == [2, 4]
+    assert batch_size(create_task(double, 1)) == 8
+    assert batch_size(create_task(double, 1, 2)) is None
+    assert batch_size(create_task(double, values=1)) is None
+    assert batch_size(create_task(len, 'foo')) is None
+
+    assert origin('foo') == 'foo'
+    assert origin(Element('foo', 3)) == 'foo'
+    assert origin(Batch((Element('foo', 3), 'bar'))) == 'foo'
+
+    try:
+        batchable(max_size=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('max_size must be positive')
@@ -0,0 +1,222 @@
+"""
+Tests for the threaded task runner.
+"""
+from nose.tools import assert_equals, assert_raises, assert_true
+
+
+def test_empty():
+    """
+    Solve no tasks (with self-scheduling threads)
+    """
+    from arbiter.threaded import run_tasks
+
+    results = run_tasks((), 2)
+
+    assert_equals(results.completed, frozenset())
+    assert_equals(results.failed, frozenset())
+
+
+def test_tree():
+    """
+    run a dependency tree (with self-scheduling threads)
+    """
+    from arbiter.task import create_task
+    from arbiter.threaded import run_tasks
+
+    a = create_task(lambda: 1, name='a')
+    b = create_task(lambda: 2, name='b')
+    c = create_task(add, a, b, name='c')
+    d = create_task(fail, name='d')
+    tasks = (
+        a, b, c, d,
+        create_task(add, c, d, name='e'),
+        create_task(add, c, name='f', dependencies=('missing',)),
+    )
+
+    store = {}
+    results = run_tasks(tasks, 4, store=Store(store))
+
+    assert_equals(results.completed, frozenset(('a', 'b', 'c')))
+    assert_equals(results.failed, frozenset(('d', 'e', 'f')))
+    assert_equals(len(results.exceptions), 1)
+    assert_equals(store['c'], 3)
+
+
+def test_stress():
+    """
+    Run a large random graph on many threads
+    """
+    from random import Random
+    from threading import Lock
+
+    from arbiter.task import create_task
+    from arbiter.threaded import run_tasks
+
+    random = Random(49)
+    order = []
+    lock = Lock()
+
+    def record(name, *values):
+        with lock:
+            order.append(name)
+
+        return sum(values) + 1
+
+    tasks = []
+
+    for index in range(1000):
+        dependencies = random.sample(tasks, min(index, 4))
+        tasks.append(create_task(record, index, *dependencies, name=index))
+
+    broken = create_task(fail, name='fail')
+    tasks.append(broken)
+    tasks.append(create_task(record, 'after', broken, tasks[999]))
+
+    hooked = []
+    results = run_tasks(
+        tasks, 16, hooks=(lambda *event: hooked.append(event),)
+    )
+
+    assert_equals(results.completed, frozenset(range(1000)))
+    assert_equals(len(results.failed), 2)
+
+    # every task ran once, after everything it depends on
+    assert_equals(sorted(order), list(range(1000)))
+
+    position = dict((name, index) for index, name in enumerate(order))
+
+    for task in tasks[:1000]:
+        for dependency in task.dependencies:
+            assert_true(position[dependency] < position[task.name])
+
+    finished = [event for event in hooked if event[0] == 'finished']
+    assert_equals(len(finished), 1001)
+
+
+def test_batchable():
+    """
+    Batchable tasks run on their own (with self-scheduling threads)
+    """
+    from arbiter.task import batchable, create_task
+    from arbiter.threaded import run_tasks
+
+    doubled = batchable(4)(lambda values: [value * 2 for value in values])
+
+    one = create_task(lambda: 1, name='one')
+    tasks = [one]
+    tasks.extend(create_task(doubled, one, name=index) for index in range(5))
+    tasks.append(create_task(batchable()(lambda values: None), 1, name='none'))
+
+    store = {}
+    results = run_tasks(tasks, 2, store=Store(store))
+
+    assert_equals(len(results.completed), 6)
+    assert_equals(results.failed, frozenset(('none',)))
+    assert_true(isinstance(results.exceptions[0], TypeError))
+    assert_equals(store[4], 2)
+
+
+def test_hooks():
+    """
+    Workers report how long they wait (with self-scheduling threads)
+    """
+    from threading import Event
+
+    from arbiter.task import create_task
+    from arbiter.threaded import run_tasks
+
+    waiting = Event()
+    hooked = []
+
+    def hook(event, name, value):
+        hooked.append((event, name, value))
+
+        if event == 'running':
+            waiting.set()
+
+    first = create_task(waiting.wait, 10, name='first')
+    second = create_task(lambda value: value, first, name='second')
+
+    results = run_tasks((first, second), 2, hooks=(hook,))
+
+    assert_equals(results.completed, frozenset(('first', 'second')))
+    assert_true(('running', None, 1) in hooked)
+    assert_true(('runnable', None, 1) in hooked)
+
+    events = set(event for event, _, _ in hooked)
+
+    for event in ('start_task', 'wait', 'collect', 'task', 'end_task'):
+        assert_true(event in events)
+
+
+def test_resume():
+    """
+    Resume skips stored results (with self-scheduling threads)
+    """
+    from arbiter.task import create_task
+    from arbiter.threaded import run_tasks
+
+    calls = []
+
+    def call(name, *dependencies):
+        calls.append(name)
+        return name
+
+    first = create_task(call, 'first', name='first')
+    second = create_task(call, 'second', first, name='second')
+
+    store = {'first': 'first'}
+    results = run_tasks(
+        (first, second), 2, store=Store(store), resume=True
+    )
+
+    assert_equals(results.completed, frozenset(('first', 'second')))
+    assert_equals(calls, ['second'])
+
+
+def test_store_failure():
+    """
+    A failing store stops the run (with self-scheduling threads)
+    """
+    from arbiter.task import create_task
+    from arbiter.threaded import run_tasks
+
+    class Broken(object):
+        def put(self, name, value):
+            raise IOError(name)
+
+    tasks = [create_task(lambda: 1, name=index) for index in range(10)]
+
+    assert_raises(IOError, run_tasks, tasks, 4, store=Broken())
+
+
+class Store(object):
+    """
+    A store backed by a dict.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def get(self, name):
+        return self.results[name]
+
+    def put(self, name, value):
+        self.results[name] = value
+
+    def __contains__(self, name):
+        return name in self.results
+
+
+def add(*values):
+    """
+    Add results.
+    """
+    return sum(values)
+
+
+def fail():
+    """
+    Fail.
+    """
+    raise ValueError('fail')